@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+自适应并发限制测试
+用假的调用结果和RTT驱动 AIMDLimiter 的 acquire / release：每轮加性增、RTT升高时保持上限、
+同一轮多个过载错误只减小一次，以及已拿到名额的等待者被取消时归还名额。不需要调用模型
+"""
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.image_utils import adaptive_limiter
+from web_serves.image_utils.adaptive_limiter import AIMDLimiter
+
+INITIAL_LIMIT = 4
+MAX_LIMIT = 10
+
+
+@contextmanager
+def limiter_config():
+    """固定限流器参数，不受 config.json 影响"""
+    replacements = {
+        "ADAPTIVE_CONCURRENCY_ENABLED": True,
+        "ADAPTIVE_CONCURRENCY_INITIAL_LIMIT": INITIAL_LIMIT,
+        "ADAPTIVE_CONCURRENCY_MIN_LIMIT": 1,
+        "ADAPTIVE_CONCURRENCY_DECREASE_FACTOR": 0.5,
+        "ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE": 2.0,
+    }
+    originals = {name: getattr(adaptive_limiter, name) for name in replacements}
+    for name, value in replacements.items():
+        setattr(adaptive_limiter, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(adaptive_limiter, name, value)
+
+
+async def complete(limiter: AIMDLimiter, rtt: float, error=None) -> None:
+    """获取名额，模拟耗时 rtt 秒的调用后归还"""
+    await limiter.acquire()
+    limiter.release(time.monotonic() - rtt, error)
+
+
+def test_additive_increase_per_round():
+    """RTT稳定时上限约每轮（上限次成功）加1"""
+    async def run():
+        limiter = AIMDLimiter("test", MAX_LIMIT)
+        for _ in range(INITIAL_LIMIT):
+            await complete(limiter, 0.1)
+        assert limiter.get_stats()["limit"] == INITIAL_LIMIT
+        await complete(limiter, 0.1)
+        stats = limiter.get_stats()
+        assert (stats["limit"], stats["increases"]) == (INITIAL_LIMIT + 1, 1)
+        for _ in range(200):
+            await complete(limiter, 0.1)
+        assert limiter.get_stats()["limit"] == MAX_LIMIT
+
+    with limiter_config():
+        asyncio.run(run())
+
+
+def test_hold_limit_when_rtt_rises():
+    """RTT超过近期最小RTT的 latency_tolerance 倍时上限保持不变"""
+    async def run():
+        limiter = AIMDLimiter("test", MAX_LIMIT)
+        await complete(limiter, 0.1)
+        limit = limiter.limit
+        for _ in range(20):
+            await complete(limiter, 0.5)
+        stats = limiter.get_stats()
+        assert limiter.limit == limit
+        assert stats["successes"] == 21
+        assert stats["rtt_min_seconds"] == 0.1
+
+    with limiter_config():
+        asyncio.run(run())
+
+
+def test_single_decrease_per_round():
+    """同一轮中已经发出的多个请求都因过载失败时上限只减半一次，之后发出的请求失败再减半"""
+    async def run():
+        limiter = AIMDLimiter("test", MAX_LIMIT)
+        started = [await limiter.acquire() for _ in range(INITIAL_LIMIT)]
+        for started_at in started:
+            limiter.release(started_at, asyncio.TimeoutError())
+        stats = limiter.get_stats()
+        assert (stats["limit"], stats["decreases"], stats["overloaded"]) == (INITIAL_LIMIT // 2, 1, INITIAL_LIMIT)
+
+        # 开始时间早于上次减小的请求属于上一轮，不再减小
+        await complete(limiter, 60, asyncio.TimeoutError())
+        assert limiter.get_stats()["limit"] == INITIAL_LIMIT // 2
+        await complete(limiter, 0, asyncio.TimeoutError())
+        assert limiter.get_stats()["limit"] == INITIAL_LIMIT // 4
+
+        # 与负载无关的错误和取消不调整上限
+        await complete(limiter, 0.1, ValueError("bad request"))
+        await complete(limiter, 0.1, asyncio.CancelledError())
+        stats = limiter.get_stats()
+        assert (stats["limit"], stats["decreases"], stats["errors"]) == (INITIAL_LIMIT // 4, 2, 1)
+        assert stats["overloaded"] == INITIAL_LIMIT + 2
+        assert stats["in_flight"] == 0
+
+    with limiter_config():
+        asyncio.run(run())
+
+
+def test_cancel_granted_waiter_returns_slot():
+    """等待者已被唤醒拿到名额、尚未恢复运行时被取消，名额归还给下一个等待者"""
+    async def run():
+        limiter = AIMDLimiter("test", MAX_LIMIT)
+        limiter.limit = 1.0
+        holder = await limiter.acquire()
+        granted = asyncio.ensure_future(limiter.acquire())
+        following = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.get_stats()["queued"] == 2
+
+        limiter.release(holder, asyncio.CancelledError())
+        assert limiter.in_flight == 1
+        granted.cancel()
+        await asyncio.gather(granted, return_exceptions=True)
+        started_at = await asyncio.wait_for(following, 1)
+        assert limiter.in_flight == 1
+        limiter.release(started_at)
+        assert limiter.get_stats()["in_flight"] == 0
+
+    with limiter_config():
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_additive_increase_per_round()
+    test_hold_limit_when_rtt_rises()
+    test_single_decrease_per_round()
+    test_cancel_granted_waiter_returns_slot()
+    print("OK")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+解析队列准入控制测试
+测试预估内存超出预算返回503、排队页数超限返回429、Retry-After 估算，以及凭证可以重复释放。
+不需要启动服务
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.config import ADMISSION_MAX_RETRY_AFTER
+from web_serves.utils.admission import AdmissionController, AdmissionRejected
+
+
+def make_controller(max_queued_pages=1000, max_memory_mb=1e9, parse_workers=2) -> AdmissionController:
+    controller = AdmissionController(enabled=True, max_concurrent_documents=2, max_queued_pages=max_queued_pages,
+                                     max_memory_mb=max_memory_mb, parse_workers=parse_workers)
+    controller.seconds_per_page = 2.0
+    return controller
+
+
+def expect_rejected(controller: AdmissionController, documents: int, pages: int) -> AdmissionRejected:
+    try:
+        controller.admit(documents, pages)
+    except AdmissionRejected as e:
+        return e
+    raise AssertionError(f"{documents} 个文档 {pages} 页应被拒绝")
+
+
+def test_memory_budget_rejects_with_503():
+    """已受理请求的预估内存加上新请求超出预算时返回503，不占用任何配额"""
+    memory_mb = AdmissionController.estimate_memory_mb(1, 10)
+    controller = make_controller(max_memory_mb=memory_mb * 1.5)
+    controller.admit(1, 10)
+    rejected = expect_rejected(controller, 1, 10)
+    stats = controller.get_stats()
+    assert rejected.status_code == 503
+    assert stats["rejected_memory"] == 1
+    assert stats["queued_pages"] == 10
+    assert stats["estimated_memory_mb"] == round(memory_mb, 1)
+
+
+def test_first_request_always_admitted():
+    """没有已受理的请求时，超出限额的单个大文档也会受理"""
+    controller = make_controller(max_queued_pages=10, max_memory_mb=1)
+    ticket = controller.admit(1, 500)
+    assert ticket.pages == 500
+    assert controller.get_stats()["admitted"] == 1
+
+
+def test_queued_pages_rejects_with_429():
+    """排队页数超过上限时返回429"""
+    controller = make_controller(max_queued_pages=100)
+    controller.admit(1, 80)
+    controller.admit(1, 20)
+    rejected = expect_rejected(controller, 1, 1)
+    assert rejected.status_code == 429
+    assert controller.get_stats()["rejected_queue_full"] == 1
+
+
+def test_retry_after_estimate():
+    """Retry-After = 排在前面的页数 × 每页秒数 / 解析进程数，至少1秒，不超过上限"""
+    controller = make_controller(max_queued_pages=100, parse_workers=2)
+    controller.admit(1, 80)
+    assert expect_rejected(controller, 1, 30).retry_after == 80
+
+    empty = make_controller()
+    assert empty.get_stats()["retry_after_estimate"] == 1
+
+    crowded = make_controller(max_queued_pages=10000)
+    crowded.admit(1, 5000)
+    assert crowded.get_stats()["retry_after_estimate"] == ADMISSION_MAX_RETRY_AFTER
+
+
+def test_release_twice():
+    """释放两次与释放一次效果相同；run 退出后再次 release（流式接口的清理）不会重复扣减"""
+    async def run():
+        controller = make_controller()
+        queued = controller.admit(1, 10)
+        controller.release(queued)
+        controller.release(queued)
+        stats = controller.get_stats()
+        assert (stats["queued_pages"], stats["estimated_memory_mb"]) == (0, 0)
+
+        started = controller.admit(2, 30)
+        other = controller.admit(1, 5)
+        async with controller.run(started):
+            assert controller.get_stats()["running_pages"] == 30
+        controller.release(started)
+        stats = controller.get_stats()
+        assert stats["running_pages"] == 0
+        assert stats["running_documents"] == 0
+        assert stats["queued_pages"] == 5
+        assert stats["scheduler"]["running_slots"] == 0
+        controller.release(other)
+        assert controller._admitted == 0
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_memory_budget_rejects_with_503()
+    test_first_request_always_admitted()
+    test_queued_pages_rejects_with_429()
+    test_retry_after_estimate()
+    test_release_twice()
+    print("OK")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF异步任务API接口测试
+测试 /jobs/pdf 提交任务、/jobs/{task_id} 查询状态、/jobs/{task_id}/result 获取结果
+"""
+import requests
+from pathlib import Path
+import time
+import sys
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+try:
+    from web_serves.config import SERVER_CONFIG
+    host = SERVER_CONFIG['host']
+    port = SERVER_CONFIG['port']
+    if host == "0.0.0.0":
+        host = "localhost"
+    API_BASE_URL = f"http://{host}:{port}"
+except (ImportError, KeyError):
+    API_BASE_URL = "http://localhost:8000"
+
+TEST_PDF_PATH = project_root / "assets" / "pdfs" / "simcse.pdf"
+POLL_INTERVAL = 3
+JOB_TIMEOUT = 2400
+
+
+def test_pdf_job():
+    """提交异步任务并轮询直到完成"""
+    print("=" * 60)
+    print("PDF异步任务API接口测试")
+    print("=" * 60)
+
+    pdf_path = Path(TEST_PDF_PATH)
+    if not pdf_path.exists():
+        print(f"❌ 测试PDF文件不存在: {pdf_path}")
+        return False
+
+    try:
+        with open(pdf_path, 'rb') as f:
+            files = {'file': (pdf_path.name, f, 'application/pdf')}
+            data = {'parse_images': 'false'}
+            start_time = time.time()
+            response = requests.post(f"{API_BASE_URL}/jobs/pdf", files=files, data=data, timeout=120)
+
+        submit_time = time.time() - start_time
+        if response.status_code != 202:
+            print(f"❌ 任务提交失败，状态码: {response.status_code}")
+            print(f"   响应内容: {response.text}")
+            return False
+
+        task_id = response.json()["task_id"]
+        print(f"✅ 任务已提交: {task_id} (耗时 {submit_time:.2f} 秒)")
+
+        deadline = time.time() + JOB_TIMEOUT
+        while time.time() < deadline:
+            status = requests.get(f"{API_BASE_URL}/jobs/{task_id}", timeout=30).json()
+            print(f"   ⏳ 状态: {status['status']}, 阶段: {status['stage']}, 进度: {status['progress']:.0%}")
+            if status["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(POLL_INTERVAL)
+
+        result = requests.get(f"{API_BASE_URL}/jobs/{task_id}/result", timeout=60)
+        if result.status_code != 200:
+            print(f"❌ 获取任务结果失败，状态码: {result.status_code}")
+            print(f"   响应内容: {result.text}")
+            return False
+
+        content = result.json()
+        print(f"✅ 任务完成，总耗时 {time.time() - start_time:.2f} 秒")
+        print(f"   Markdown长度: {len(content.get('markdown_content', ''))}")
+
+        # 不存在的任务应返回404
+        missing = requests.get(f"{API_BASE_URL}/jobs/not-exist-task", timeout=30)
+        if missing.status_code != 404:
+            print(f"❌ 不存在的任务应返回404，实际: {missing.status_code}")
+            return False
+        return True
+
+    except Exception as e:
+        print(f"❌ 测试过程中出错: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    result = test_pdf_job()
+    if result:
+        print("OK")
+    else:
+        print("FAIL")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF流式输出API接口测试
+测试 /upload/pdf/stream 按页序逐条返回NDJSON记录，以及无效输出格式返回400
+"""
+import json
+import requests
+from pathlib import Path
+import time
+import sys
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+try:
+    from web_serves.config import SERVER_CONFIG
+    host = SERVER_CONFIG['host']
+    port = SERVER_CONFIG['port']
+    if host == "0.0.0.0":
+        host = "localhost"
+    API_BASE_URL = f"http://{host}:{port}"
+except (ImportError, KeyError):
+    API_BASE_URL = "http://localhost:8000"
+
+TEST_PDF_PATH = project_root / "assets" / "pdfs" / "simcse.pdf"
+STREAM_TIMEOUT = 2400
+
+
+def test_pdf_stream():
+    """流式解析PDF，检查记录类型和页序"""
+    print("=" * 60)
+    print("PDF流式输出API接口测试")
+    print("=" * 60)
+
+    pdf_path = Path(TEST_PDF_PATH)
+    if not pdf_path.exists():
+        print(f"❌ 测试PDF文件不存在: {pdf_path}")
+        return False
+
+    try:
+        with open(pdf_path, 'rb') as f:
+            files = {'file': (pdf_path.name, f, 'application/pdf')}
+            data = {'use_cache': 'false'}
+            start_time = time.time()
+            response = requests.post(f"{API_BASE_URL}/upload/pdf/stream", files=files, data=data,
+                                     timeout=STREAM_TIMEOUT, stream=True)
+
+        if response.status_code != 200:
+            print(f"❌ 请求失败，状态码: {response.status_code}")
+            print(f"   响应内容: {response.text}")
+            return False
+
+        records = []
+        first_page_time = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            record = json.loads(line)
+            records.append(record)
+            if record["type"] == "page" and first_page_time is None:
+                first_page_time = time.time() - start_time
+                print(f"   📄 首页到达: {first_page_time:.2f} 秒")
+            if record["type"] == "error":
+                print(f"❌ 解析失败: {record['detail']}")
+                return False
+
+        types = [record["type"] for record in records]
+        pages = [record["page"] for record in records if record["type"] == "page"]
+        print(f"✅ 流式输出完成，总耗时 {time.time() - start_time:.2f} 秒，共 {len(pages)} 页")
+        if types[0] != "document" or types[-1] != "end":
+            print(f"❌ 记录顺序不正确: {types[:3]} ... {types[-3:]}")
+            return False
+        if pages != sorted(pages):
+            print(f"❌ 页面没有按页序输出: {pages}")
+            return False
+
+        # 无效的输出格式应返回400
+        with open(pdf_path, 'rb') as f:
+            files = {'file': (pdf_path.name, f, 'application/pdf')}
+            invalid = requests.post(f"{API_BASE_URL}/upload/pdf/stream", files=files,
+                                    data={'output_format': 'xml'}, timeout=60)
+        if invalid.status_code != 400:
+            print(f"❌ 无效的输出格式应返回400，实际: {invalid.status_code}")
+            return False
+        return True
+
+    except Exception as e:
+        print(f"❌ 测试过程中出错: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    result = test_pdf_stream()
+    if result:
+        print("OK")
+    else:
+        print("FAIL")
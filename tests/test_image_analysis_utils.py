@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图片分析工具测试
+测试 extract_json_array_content 把批量分析的模型输出对应到各图片：按 index 对应、按顺序对应、
+截断的数组、重复和越界的 index。对应错位会把一张图片的标题写到另一张图片上。
+以及 prepare_image_payload 在需要缩放时总是发送缩放后的图片，和每次请求只汇总输出一条预处理日志。不需要调用模型
+"""
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.image_utils import async_image_analysis
+from web_serves.image_utils.image_analysis_utils import extract_json_array_content, prepare_image_payload
+
+
+def item(title: str, index=None) -> dict:
+    result = {"title": title, "description": f"{title} description"}
+    if index is not None:
+        result["index"] = index
+    return result
+
+
+# (名称, 模型输出, 图片数, 期望的各图片标题，None 表示该图片没有结果)
+ARRAY_CASES = [
+    ("按index顺序", json.dumps([item("a", 1), item("b", 2)]), 2, ["a", "b"]),
+    ("index乱序按index对应", json.dumps([item("b", 2), item("c", 3), item("a", 1)]), 3, ["a", "b", "c"]),
+    ("没有index按出现顺序", json.dumps([item("a"), item("b")]), 2, ["a", "b"]),
+    ("代码块包裹", "```json\n" + json.dumps([item("a", 1), item("b", 2)]) + "\n```", 2, ["a", "b"]),
+    ("数组被截断，只取完整对象",
+     '[{"index": 1, "title": "a", "description": "a description"}, {"index": 2, "title": "b", "descr',
+     3, ["a", None, None]),
+    ("截断且没有index", '[{"title": "a", "description": "x"}, {"title": "b", "description": "y"}, {"tit',
+     3, ["a", "b", None]),
+    ("重复index只取第一个", json.dumps([item("a", 1), item("a2", 1)]), 2, ["a", None]),
+    ("按顺序对应的位置已被index占用时丢弃", json.dumps([item("b", 2), item("x")]), 2, [None, "b"]),
+    ("越界index按出现顺序对应", json.dumps([item("a", 1), item("b", 5)]), 2, ["a", "b"]),
+    ("越界且超出图片数时丢弃", json.dumps([item("a", 1), item("b", 2), item("c", 9)]), 2, ["a", "b"]),
+    ("index为0按出现顺序对应", json.dumps([item("a", 0)]), 1, ["a"]),
+    ("数字字符串index按index对应", json.dumps([item("b", "2"), item("a", 1)]), 2, ["a", "b"]),
+    ("非数字index按出现顺序对应", json.dumps([item("a", "first"), item("b", 2)]), 2, ["a", "b"]),
+    ("没有index的元素不占用带index元素的位置", json.dumps([item("x"), item("a", 1)]), 2, ["a", None]),
+    ("多于图片数的元素丢弃", json.dumps([item("a"), item("b"), item("c")]), 2, ["a", "b"]),
+    ("没有标题和描述的元素跳过", json.dumps([{"index": 1, "foo": "bar"}, item("b", 2)]), 2, [None, "b"]),
+    ("空输出", "", 2, [None, None]),
+    ("非JSON输出", "抱歉，我无法分析这些图片", 2, [None, None]),
+]
+
+
+def test_extract_json_array_content():
+    """逐个检查各种模型输出对应到的图片"""
+    for name, text, expected_count, expected_titles in ARRAY_CASES:
+        results = extract_json_array_content(text, expected_count)
+        titles = [result["title"] if result else None for result in results]
+        assert titles == expected_titles, f"{name}: {titles} != {expected_titles}"
+
+
+def test_extract_json_array_content_fields():
+    """结果只保留 title 和 description，缺失的字段为空字符串"""
+    results = extract_json_array_content(json.dumps([{"index": 1, "title": "a", "extra": 1}]), 1)
+    assert results == [{"title": "a", "description": ""}]
+
+
+def save_png(directory: str, image: Image.Image) -> str:
+    path = os.path.join(directory, "image.png")
+    image.save(path)
+    return path
+
+
+def test_prepare_image_payload_small_image():
+    """不需要缩放、重新编码后更大的图片发送原文件"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = save_png(temp_dir, Image.new("RGB", (64, 64), (255, 255, 255)))
+        payload = prepare_image_payload(path, 2048, "jpeg", 85)
+        with open(path, "rb") as f:
+            raw = f.read()
+    assert (payload.mime_format, payload.resized) == ("png", False)
+    assert base64.b64decode(payload.base64_data) == raw
+    assert payload.original_bytes == payload.sent_bytes == len(raw)
+
+
+def test_prepare_image_payload_resized_larger():
+    """需要缩放时即使缩放后的JPEG比高度压缩的原PNG更大，也发送缩放后的图片"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = save_png(temp_dir, Image.new("1", (4000, 3000), 1))
+        payload = prepare_image_payload(path, 2048, "jpeg", 85)
+    assert (payload.mime_format, payload.resized) == ("jpeg", True)
+    assert payload.sent_bytes > payload.original_bytes
+    with Image.open(io.BytesIO(base64.b64decode(payload.base64_data))) as sent:
+        assert sent.size == (2048, 1536)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_preprocess_totals_logged_once():
+    """同一请求内并发任务的预处理字节数汇总为一条日志，嵌套的统计计入外层"""
+    async def add(original_bytes: int, sent_bytes: int) -> None:
+        with async_image_analysis._track_preprocess():
+            await asyncio.sleep(0)
+            totals = async_image_analysis._preprocess_totals.get()
+            totals[0] += 1
+            totals[1] += original_bytes
+            totals[2] += sent_bytes
+
+    async def run():
+        with async_image_analysis._track_preprocess():
+            await asyncio.gather(add(1000, 400), add(500, 700), add(300, 300))
+        assert async_image_analysis._preprocess_totals.get() is None
+
+    handler = ListHandler()
+    root = logging.getLogger()
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    try:
+        asyncio.run(run())
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(level)
+    assert [m for m in handler.messages if m.startswith("图片预处理")] == [
+        "图片预处理 3 张图片: 1800 -> 1400 字节，节省 400 字节"
+    ]
+
+
+if __name__ == "__main__":
+    test_extract_json_array_content()
+    test_extract_json_array_content_fields()
+    test_prepare_image_payload_small_image()
+    test_prepare_image_payload_resized_larger()
+    test_preprocess_totals_logged_once()
+    print("OK")
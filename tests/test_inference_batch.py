@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量推理分组测试
+测试 pack_inference_batches 按解析方法分组、按页数预算拆分批次，
+以及 split_inference_results 把共享 doc_analyze 调用的结果拆回各文档。不需要MinerU模型
+"""
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.pdf_utils.inference_batch import pack_inference_batches, split_inference_results
+
+
+def test_mixed_parse_methods():
+    """不同解析方法的文档不进入同一批次，同一方法的文档保持原顺序"""
+    batches = pack_inference_batches([10, 20, 5, 15], ["txt", "ocr", "txt", "ocr"], 100)
+    assert batches == [[0, 2], [1, 3]]
+
+
+def test_split_on_page_budget():
+    """批次页数不超过预算，超出时开始新批次；待推理页数为0的文档不参与分组"""
+    batches = pack_inference_batches([40, 40, 0, 30, 10], ["txt"] * 5, 100)
+    assert batches == [[0, 1], [3, 4]]
+
+
+def test_document_larger_than_budget():
+    """单个文档超过页数预算时独占一个批次，不拆分到多个批次"""
+    batches = pack_inference_batches([30, 500, 20], ["txt"] * 3, 100)
+    assert batches == [[0], [1], [2]]
+
+
+def test_budget_disabled():
+    """预算小于等于0时每个文档单独一批"""
+    assert pack_inference_batches([1, 2, 3], ["txt"] * 3, 0) == [[0], [1], [2]]
+
+
+def test_split_results_per_document():
+    """按每个文档的子PDF数量把推理结果拆回各文档，各列表保持一一对应"""
+    batch = pack_inference_batches([3, 8, 2], ["txt", "ocr", "txt"], 100)[0]
+    sub_pdfs = {0: ["d0-run0", "d0-run1"], 2: ["d2-run0"]}
+    sent = [sub_pdf for doc_index in batch for sub_pdf in sub_pdfs[doc_index]]
+    inference = (
+        [f"model:{name}" for name in sent],
+        [f"images:{name}" for name in sent],
+        [f"doc:{name}" for name in sent],
+        ["ch"] * len(sent),
+        [False] * len(sent),
+    )
+    per_document = split_inference_results(inference, [len(sub_pdfs[doc_index]) for doc_index in batch])
+
+    assert batch == [0, 2]
+    assert per_document[0][0] == ["model:d0-run0", "model:d0-run1"]
+    assert per_document[0][2] == ["doc:d0-run0", "doc:d0-run1"]
+    assert per_document[1] == (["model:d2-run0"], ["images:d2-run0"], ["doc:d2-run0"], ["ch"], [False])
+
+
+if __name__ == "__main__":
+    test_mixed_parse_methods()
+    test_split_on_page_budget()
+    test_document_larger_than_budget()
+    test_budget_disabled()
+    test_split_results_per_document()
+    print("OK")
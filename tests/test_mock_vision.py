@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地模拟视觉模型服务测试
+启动 utils/mock_vision_server.py，用 local_mock 提供商跑图片分析和Markdown图片处理全流程，
+输出吞吐量和错误数，不调用付费API
+"""
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from PIL import Image
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.image_utils.async_image_analysis import AsyncImageAnalysis
+from web_serves.markdown_utils.markdown_image_processor import MarkdownImageProcessor
+
+MOCK_PORT = 18601
+MOCK_ROOT = f"http://127.0.0.1:{MOCK_PORT}"
+IMAGE_COUNT = 40
+
+
+def start_mock_server() -> subprocess.Popen:
+    """启动模拟服务：时延中位数100毫秒，5%的请求返回500"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "utils.mock_vision_server", "--port", str(MOCK_PORT),
+         "--median-ms", "100", "--error-rate", "0.05"],
+        cwd=project_root
+    )
+    for _ in range(50):
+        try:
+            if requests.get(f"{MOCK_ROOT}/v1/models", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("模拟服务启动失败")
+
+
+def make_images(directory: Path) -> list:
+    """生成内容各不相同的测试图片，避免被去重合并"""
+    paths = []
+    for i in range(IMAGE_COUNT):
+        path = directory / f"image_{i}.png"
+        Image.new("RGB", (64, 64), ((i * 37) % 256, (i * 91) % 256, (i * 53) % 256)).save(path)
+        paths.append(path)
+    return paths
+
+
+async def test_analyze_multiple_images(image_paths: list) -> bool:
+    """测试 AsyncImageAnalysis 在模拟服务上的吞吐量和错误数"""
+    requests.post(f"{MOCK_ROOT}/stats/reset", timeout=5)
+    analyzer = AsyncImageAnalysis(provider="local_mock", base_url=f"{MOCK_ROOT}/v1", max_concurrent=10, use_cache=False)
+    started = time.monotonic()
+    results = await analyzer.analyze_multiple_images([{"local_image_path": str(path)} for path in image_paths])
+    elapsed = time.monotonic() - started
+    errors = [result for result in results if result.get("error")]
+    stats = requests.get(f"{MOCK_ROOT}/stats", timeout=5).json()
+    print(f"[图片分析] {len(results)} 张图片，耗时 {elapsed:.2f} 秒，{len(results) / elapsed:.1f} 张/秒，"
+          f"失败 {len(errors)} 张，模拟服务统计: {stats}")
+    if errors:
+        print(f"❌ 图片分析失败: {errors[0]}")
+        return False
+    print("✅ 图片分析全部成功")
+    return True
+
+
+async def test_process_markdown(image_paths: list, directory: Path) -> bool:
+    """测试 MarkdownImageProcessor 以模拟服务同时作为视觉模型和上传接口的完整流程"""
+    markdown = "\n\n".join(f"![]({path.name})" for path in image_paths)
+    async with MarkdownImageProcessor(provider="local_mock", base_url=f"{MOCK_ROOT}/v1",
+                                      api_base_url=MOCK_ROOT, use_cache=False) as processor:
+        updated = await processor.process_markdown_content(markdown, str(directory))
+    replaced = updated.count(f"{MOCK_ROOT}/uploads/images/")
+    print(f"[Markdown处理] 替换为远程地址的图片: {replaced}/{len(image_paths)}")
+    if replaced != len(image_paths) or "模拟图片" not in updated:
+        print("❌ Markdown处理结果不完整")
+        return False
+    print("✅ Markdown处理成功")
+    return True
+
+
+def test_mock_vision() -> bool:
+    process = start_mock_server()
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            directory = Path(temp_dir)
+            image_paths = make_images(directory)
+            success_analysis = asyncio.run(test_analyze_multiple_images(image_paths))
+            success_markdown = asyncio.run(test_process_markdown(image_paths, directory))
+        return success_analysis and success_markdown
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    result = test_mock_vision()
+    if result:
+        print("OK")
+    else:
+        print("FAIL")
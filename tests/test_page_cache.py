@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+页级缓存拼装测试
+页级缓存按页面内容复用，同一页在新文档中的位置可能与首次解析时不同，
+assemble_pipeline_pages 输出的 page_idx 和模型输出的 page_no 应为该页在新文档中的页码。
+不需要MinerU模型
+"""
+import copy
+import sys
+import tempfile
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.pdf_utils.mineru_parse import assemble_pipeline_pages
+
+
+def make_fragment(page_idx: int, text: str) -> dict:
+    """构造与页级缓存条目相同结构的页面结果"""
+    return {
+        'storage': 'blob',
+        'page_info': {'page_idx': page_idx, 'page_size': [612, 792], 'para_blocks': [{'type': 'text', 'text': text}]},
+        'model': {'layout_dets': [], 'page_info': {'page_no': page_idx, 'width': 612, 'height': 792}},
+        'images': {},
+        'files': {}
+    }
+
+
+def test_cached_pages_renumbered_at_new_index():
+    """首次解析时位于第5页和第0页的缓存页，在新文档中位于第1页和第2页"""
+    first_document = {5: make_fragment(5, "reused from page 5"), 0: make_fragment(0, "reused from page 0")}
+    plan = {
+        'fragments': [
+            make_fragment(0, "new page"),
+            copy.deepcopy(first_document[5]),
+            copy.deepcopy(first_document[0]),
+        ],
+        'missing_pages': [],
+        'runs': [],
+        'page_keys': None,
+    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_info, model_list = assemble_pipeline_pages(plan, None, None, temp_dir, lambda *args, **kwargs: None)
+
+    assert [page['page_idx'] for page in pdf_info] == [0, 1, 2]
+    assert [model['page_info']['page_no'] for model in model_list] == [0, 1, 2]
+    assert [page['para_blocks'][0]['text'] for page in pdf_info] == ["new page", "reused from page 5",
+                                                                      "reused from page 0"]
+
+
+if __name__ == "__main__":
+    test_cached_pages_renumbered_at_new_index()
+    print("OK")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+单飞锁和内容寻址存储测试
+测试 single_flight 跨进程互斥、锁文件被前一个持锁者删除后按 inode 重新加锁、等待超时后直接执行，
+以及多个进程并发写入同一内容时 BlobStore 只留下一个完整文件。不需要MinerU模型
+"""
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.pdf_utils import parse_lock
+from web_serves.pdf_utils.blob_store import BlobStore
+from web_serves.pdf_utils.parse_lock import single_flight
+
+KEY = "pdf_parse_v2_test"
+HOLD_SECONDS = 0.5
+
+
+def hold_lock(lock_dir: str, log_path: str, ready) -> None:
+    """子进程：持锁一段时间，在锁内写入开始和结束标记"""
+    with single_flight(lock_dir, KEY):
+        ready.set()
+        with open(log_path, "a") as f:
+            f.write("child-start\n")
+        time.sleep(HOLD_SECONDS)
+        with open(log_path, "a") as f:
+            f.write("child-end\n")
+
+
+def store_blob(root: str, src_path: str, rounds: int) -> str:
+    """子进程：反复保存同一个文件和同样的内容"""
+    store = BlobStore(root)
+    digests = set()
+    with open(src_path, "rb") as f:
+        data = f.read()
+    for _ in range(rounds):
+        digests.add(store.put_file(src_path))
+        digests.add(store.put_bytes(data))
+    assert len(digests) == 1
+    return digests.pop()
+
+
+def test_lock_across_processes():
+    """另一个进程持锁时等待，持锁者结束后再执行，锁内的操作不交错，结束后不残留锁文件"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lock_dir = os.path.join(temp_dir, "locks")
+        log_path = os.path.join(temp_dir, "log.txt")
+        ready = multiprocessing.Event()
+        child = multiprocessing.Process(target=hold_lock, args=(lock_dir, log_path, ready))
+        child.start()
+        try:
+            assert ready.wait(10)
+            waits = []
+            started = time.monotonic()
+            with single_flight(lock_dir, KEY, on_wait=lambda: waits.append(True)) as waited:
+                elapsed = time.monotonic() - started
+                with open(log_path, "a") as f:
+                    f.write("parent\n")
+        finally:
+            child.join(10)
+
+        assert waited and waits == [True]
+        assert elapsed >= HOLD_SECONDS / 2
+        assert Path(log_path).read_text().split() == ["child-start", "child-end", "parent"]
+        assert os.listdir(lock_dir) == []
+
+
+class RacingFcntl:
+    """
+    模拟持锁者释放时删除锁文件、紧接着另一个进程创建新锁文件并加锁的竞争：
+    第一次加锁前替换锁文件，拿到的是已删除文件上的锁，single_flight 应按 inode 发现并重新打开
+    """
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self.real = parse_lock.fcntl
+        self.LOCK_EX = self.real.LOCK_EX
+        self.LOCK_NB = self.real.LOCK_NB
+        self.calls = 0
+        self.other_fd = None
+
+    def flock(self, fd, operation):
+        self.calls += 1
+        if self.calls == 1:
+            os.remove(self.lock_path)
+            self.other_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self.real.flock(self.other_fd, self.LOCK_EX)
+            threading.Timer(HOLD_SECONDS, self.release_other).start()
+        return self.real.flock(fd, operation)
+
+    def release_other(self):
+        os.remove(self.lock_path)
+        os.close(self.other_fd)
+
+
+def test_lock_rechecks_inode():
+    """拿到已被删除的锁文件上的锁时重新打开，等新的持锁者释放后才执行"""
+    real_fcntl = parse_lock.fcntl
+    with tempfile.TemporaryDirectory() as lock_dir:
+        lock_path = os.path.join(lock_dir, f"{KEY}.lock")
+        racing = RacingFcntl(lock_path)
+        parse_lock.fcntl = racing
+        try:
+            started = time.monotonic()
+            with single_flight(lock_dir, KEY) as waited:
+                elapsed = time.monotonic() - started
+                assert os.path.exists(lock_path)
+        finally:
+            parse_lock.fcntl = real_fcntl
+        assert waited
+        assert racing.calls > 2
+        assert elapsed >= HOLD_SECONDS / 2
+        assert os.listdir(lock_dir) == []
+
+
+def test_lock_timeout_runs_without_lock():
+    """等待超时后不持锁直接执行，退出时不删除其他持锁者的锁文件"""
+    with tempfile.TemporaryDirectory() as lock_dir:
+        lock_path = os.path.join(lock_dir, f"{KEY}.lock")
+        holder = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        parse_lock.fcntl.flock(holder, parse_lock.fcntl.LOCK_EX)
+        try:
+            started = time.monotonic()
+            with single_flight(lock_dir, KEY, timeout=0.3) as waited:
+                elapsed = time.monotonic() - started
+            assert waited
+            assert 0.3 <= elapsed < 5
+            assert os.path.exists(lock_path)
+        finally:
+            os.close(holder)
+
+
+def test_lock_without_key():
+    """key 为空时不加锁"""
+    with tempfile.TemporaryDirectory() as lock_dir:
+        with single_flight(os.path.join(lock_dir, "locks"), None) as waited:
+            assert not waited
+        assert os.listdir(lock_dir) == []
+
+
+def test_concurrent_blob_writers():
+    """多个进程并发保存相同内容，只留下一个内容完整的文件，没有残留的临时文件"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = os.path.join(temp_dir, "blobs")
+        src_path = os.path.join(temp_dir, "image.bin")
+        data = os.urandom(3 * 1024 * 1024)
+        with open(src_path, "wb") as f:
+            f.write(data)
+
+        with multiprocessing.Pool(4) as pool:
+            digests = pool.starmap(store_blob, [(root, src_path, 5)] * 4)
+
+        expected = hashlib.sha256(data).hexdigest()
+        store = BlobStore(root)
+        assert set(digests) == {expected}
+        assert store.stats() == {"blob_count": 1, "blob_bytes": len(data)}
+        with open(store.path_for(expected), "rb") as f:
+            assert hashlib.sha256(f.read()).hexdigest() == expected
+        assert [name for name in os.listdir(root) if name.startswith(".tmp-")] == []
+
+
+if __name__ == "__main__":
+    test_lock_across_processes()
+    test_lock_rechecks_inode()
+    test_lock_timeout_runs_without_lock()
+    test_lock_without_key()
+    test_concurrent_blob_writers()
+    print("OK")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多提供商路由测试
+测试 ProviderRouter 的熔断器状态转换（关闭 -> 摘除 -> 半开探测）、探测失败时冷却时间加倍、
+record_cancelled 清除探测标记、全部目标被摘除时仍能选出目标，以及路由开启时的缓存标识。不需要调用模型
+"""
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.image_utils import provider_router
+from web_serves.image_utils.provider_router import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    ProviderRouter,
+    RouteTarget
+)
+
+THRESHOLD = 3
+COOLDOWN = 10.0
+MAX_COOLDOWN = 30.0
+
+
+@contextmanager
+def router_config():
+    """固定熔断参数，不受 config.json 影响"""
+    replacements = {
+        "PROVIDER_ROUTING_FAILURE_THRESHOLD": THRESHOLD,
+        "PROVIDER_ROUTING_COOLDOWN": COOLDOWN,
+        "PROVIDER_ROUTING_MAX_COOLDOWN": MAX_COOLDOWN,
+    }
+    originals = {name: getattr(provider_router, name) for name in replacements}
+    for name, value in replacements.items():
+        setattr(provider_router, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(provider_router, name, value)
+
+
+def make_router():
+    primary = RouteTarget("test_primary", "model-a", "key", "http://primary", cooldown=COOLDOWN)
+    backup = RouteTarget("test_backup", "model-b", "key", "http://backup", cooldown=COOLDOWN)
+    return ProviderRouter([primary, backup]), primary, backup
+
+
+def eject(router: ProviderRouter, target: RouteTarget) -> None:
+    for _ in range(THRESHOLD):
+        router.record_failure(target)
+
+
+def pick(router: ProviderRouter, exclude=None) -> RouteTarget:
+    """在事件循环中选择目标（路由器按事件循环读取提供商的并发占用）"""
+    async def run():
+        return router.pick(exclude=exclude)
+    return asyncio.run(run())
+
+
+def end_cooldown(target: RouteTarget) -> None:
+    target.open_until = time.monotonic() - 1
+
+
+def test_open_after_consecutive_failures():
+    """连续失败达到阈值后摘除，摘除期间只选其他目标；成功会清零连续失败计数"""
+    with router_config():
+        router, primary, backup = make_router()
+        router.record_failure(primary)
+        router.record_success(primary)
+        for _ in range(THRESHOLD - 1):
+            router.record_failure(primary)
+        assert primary.state == BREAKER_CLOSED
+
+        router.record_failure(primary)
+        assert (primary.state, primary.ejections) == (BREAKER_OPEN, 1)
+        assert primary.open_until > time.monotonic() + COOLDOWN - 1
+        assert all(pick(router) is backup for _ in range(20))
+
+
+def test_half_open_probe():
+    """冷却结束后转为半开，只放行一个探测请求；探测成功后恢复"""
+    with router_config():
+        router, primary, backup = make_router()
+        eject(router, primary)
+        end_cooldown(primary)
+
+        probe = pick(router, exclude={backup.key})
+        assert probe is primary
+        assert (primary.state, primary.probing) == (BREAKER_HALF_OPEN, True)
+        # 探测进行中时不再放行其他请求
+        assert all(pick(router) is backup for _ in range(20))
+
+        router.record_success(primary)
+        assert (primary.state, primary.probing, primary.cooldown) == (BREAKER_CLOSED, False, COOLDOWN)
+
+
+def test_probe_failure_doubles_cooldown():
+    """探测失败时再次摘除，冷却时间加倍，不超过上限"""
+    with router_config():
+        router, primary, backup = make_router()
+        eject(router, primary)
+        for expected in (COOLDOWN * 2, MAX_COOLDOWN, MAX_COOLDOWN):
+            end_cooldown(primary)
+            assert pick(router, exclude={backup.key}) is primary
+            router.record_failure(primary)
+            assert (primary.state, primary.cooldown) == (BREAKER_OPEN, expected)
+            assert primary.open_until > time.monotonic() + expected - 1
+        assert primary.ejections == 4
+
+
+def test_cancelled_probe_allows_new_probe():
+    """探测请求被取消时不计入成败，目标保持半开并允许重新探测"""
+    with router_config():
+        router, primary, backup = make_router()
+        eject(router, primary)
+        end_cooldown(primary)
+        assert pick(router, exclude={backup.key}) is primary
+
+        router.record_cancelled(primary)
+        assert (primary.state, primary.probing, primary.failures) == (BREAKER_HALF_OPEN, False, THRESHOLD)
+        assert pick(router, exclude={backup.key}) is primary
+        assert primary.probing
+
+
+def test_all_targets_ejected():
+    """全部目标被摘除时选择冷却最先结束的目标，不完全停止服务"""
+    with router_config():
+        router, primary, backup = make_router()
+        eject(router, primary)
+        eject(router, backup)
+        primary.open_until = time.monotonic() + 100
+        backup.open_until = time.monotonic() + 5
+        assert pick(router) is backup
+        assert pick(router, exclude={backup.key}) is backup
+        assert backup.state == BREAKER_OPEN
+
+
+def test_cache_identity():
+    """缓存标识由全部目标决定，与目标顺序无关"""
+    router, primary, backup = make_router()
+    assert router.cache_identity() == ("routed", "test_backup/model-b,test_primary/model-a")
+    assert ProviderRouter([backup, primary]).cache_identity() == router.cache_identity()
+
+
+if __name__ == "__main__":
+    test_open_after_consecutive_failures()
+    test_half_open_probe()
+    test_probe_failure_doubles_cooldown()
+    test_cancelled_probe_allows_new_probe()
+    test_all_targets_ejected()
+    test_cache_identity()
+    print("OK")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+公平调度器测试
+测试 FairScheduler 按虚拟完成时间放行、租户并发上限、交互请求的保留名额和排队中取消，
+以及解析准入的名额不超过解析进程数。不需要启动服务
+"""
+import asyncio
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.utils import scheduler as scheduler_module
+from web_serves.utils.admission import AdmissionController
+from web_serves.utils.scheduler import FairScheduler, ScheduleKey, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+PRIORITY_CLASSES = {
+    PRIORITY_INTERACTIVE: {"weight": 8, "reserved_ratio": 0.25},
+    PRIORITY_BULK: {"weight": 1, "reserved_ratio": 0},
+}
+
+
+@contextmanager
+def scheduler_config(tenants=None):
+    """固定调度器使用的优先级和租户配置，不受 config.json 影响"""
+    replacements = {
+        "SCHEDULER_ENABLED": True,
+        "SCHEDULER_PRIORITY_CLASSES": PRIORITY_CLASSES,
+        "SCHEDULER_TENANTS": tenants or {},
+    }
+    originals = {name: getattr(scheduler_module, name) for name in replacements}
+    for name, value in replacements.items():
+        setattr(scheduler_module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(scheduler_module, name, value)
+
+
+def bulk(tenant: str) -> ScheduleKey:
+    return ScheduleKey(tenant, PRIORITY_BULK)
+
+
+def interactive(tenant: str) -> ScheduleKey:
+    return ScheduleKey(tenant, PRIORITY_INTERACTIVE)
+
+
+async def grant_order(scheduler: FairScheduler, holder_key: ScheduleKey, requests: list) -> list:
+    """先占住全部名额，再让 requests 中的请求依次排队，释放后返回它们被放行的顺序"""
+    holder = await scheduler.acquire(holder_key, slots=scheduler.capacity)
+    order = []
+
+    async def run(name, key, cost):
+        grant = await scheduler.acquire(key, cost=cost)
+        order.append(name)
+        scheduler.release(grant)
+
+    tasks = []
+    for name, key, cost in requests:
+        tasks.append(asyncio.ensure_future(run(name, key, cost)))
+        await asyncio.sleep(0)
+    scheduler.release(holder)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_finish_tag_ordering():
+    """代价小的流不排在代价大的流后面；交互请求权重高，先于同时排队的批量请求"""
+    async def run():
+        scheduler = FairScheduler("test", 1, "max_concurrent_documents", 1)
+        by_cost = await grant_order(scheduler, bulk("holder"), [
+            ("a1", bulk("a"), 100),
+            ("a2", bulk("a"), 100),
+            ("b1", bulk("b"), 10),
+            ("b2", bulk("b"), 10),
+        ])
+        by_weight = await grant_order(scheduler, bulk("holder"), [
+            ("bulk", bulk("a"), 10),
+            ("interactive", interactive("b"), 10),
+        ])
+        return by_cost, by_weight
+
+    with scheduler_config():
+        by_cost, by_weight = asyncio.run(run())
+    assert by_cost == ["b1", "b2", "a1", "a2"]
+    assert by_weight == ["interactive", "bulk"]
+
+
+def test_tenant_limit():
+    """租户达到并发上限时跳过该租户，后排队的其他租户先放行"""
+    async def run():
+        scheduler = FairScheduler("test", 3, "max_concurrent_documents", 1)
+        first = await scheduler.acquire(bulk("a"))
+        second = asyncio.ensure_future(scheduler.acquire(bulk("a")))
+        await asyncio.sleep(0)
+        other = await asyncio.wait_for(scheduler.acquire(bulk("b")), 1)
+        stats = scheduler.get_stats()
+        assert not second.done()
+        assert stats["tenants"]["a"] == {"running": 1, "queued": 1}
+        scheduler.release(first)
+        grant = await asyncio.wait_for(second, 1)
+        scheduler.release(grant)
+        scheduler.release(other)
+
+    with scheduler_config():
+        asyncio.run(run())
+
+
+def test_tenant_limit_override():
+    """scheduler.tenants 中单独配置的上限覆盖默认上限"""
+    with scheduler_config({"vip": {"max_concurrent_documents": 3}}):
+        scheduler = FairScheduler("test", 4, "max_concurrent_documents", 1)
+        assert scheduler._tenant_limit("vip") == 3
+        assert scheduler._tenant_limit("other") == 1
+
+
+def test_reserved_interactive_slots():
+    """批量请求不能占用交互请求的保留名额，交互请求在批量请求排队时仍能立即开始"""
+    async def run():
+        scheduler = FairScheduler("test", 4, "max_concurrent_documents", 4)
+        bulk_grants = [await asyncio.wait_for(scheduler.acquire(bulk(f"t{i}")), 1) for i in range(3)]
+        queued_bulk = asyncio.ensure_future(scheduler.acquire(bulk("t3")))
+        await asyncio.sleep(0)
+        assert not queued_bulk.done()
+        grant = await asyncio.wait_for(scheduler.acquire(interactive("user")), 1)
+        assert scheduler.get_stats()["running_by_priority"] == {PRIORITY_BULK: 3, PRIORITY_INTERACTIVE: 1}
+        assert scheduler._reserved(PRIORITY_INTERACTIVE) == 1
+        for held in bulk_grants + [grant]:
+            scheduler.release(held)
+        scheduler.release(await asyncio.wait_for(queued_bulk, 1))
+
+    with scheduler_config():
+        asyncio.run(run())
+
+
+def test_cancel_while_queued():
+    """排队中被取消的请求移出队列、不占用名额，后面的请求正常放行"""
+    async def run():
+        scheduler = FairScheduler("test", 1, "max_concurrent_documents", 1)
+        holder = await scheduler.acquire(bulk("a"))
+        cancelled = asyncio.ensure_future(scheduler.acquire(bulk("b"), cost=1))
+        waiting = asyncio.ensure_future(scheduler.acquire(bulk("c"), cost=50))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert scheduler.get_stats()["queued"] == 1
+        scheduler.release(holder)
+        grant = await asyncio.wait_for(waiting, 1)
+        stats = scheduler.get_stats()
+        assert stats["running_slots"] == 1
+        assert stats["tenants"] == {"c": {"running": 1, "queued": 0}}
+        scheduler.release(grant)
+        scheduler.release(grant)
+        assert scheduler.get_stats()["running_slots"] == 0
+
+    with scheduler_config():
+        asyncio.run(run())
+
+
+def test_admission_slots_capped_at_parse_workers():
+    """解析名额不超过解析进程数，批量请求按实际占用的名额统计运行中的文档数"""
+    async def run():
+        controller = AdmissionController(enabled=True, max_concurrent_documents=4, max_queued_pages=1000,
+                                         max_memory_mb=1e9, parse_workers=2)
+        assert controller.scheduler.capacity == 2
+        ticket = controller.admit(documents=5, pages=50, key=bulk("importer"))
+        async with controller.run(ticket):
+            stats = controller.get_stats()
+            assert stats["limits"]["max_concurrent_documents"] == 2
+            # 交互请求保留1个名额，批量请求只占1个
+            assert stats["running_documents"] == 1
+            assert stats["scheduler"]["running_slots"] == 1
+        assert controller.get_stats()["running_documents"] == 0
+
+    with scheduler_config():
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_finish_tag_ordering()
+    test_tenant_limit()
+    test_tenant_limit_override()
+    test_reserved_interactive_slots()
+    test_cancel_while_queued()
+    test_admission_slots_capped_at_parse_workers()
+    print("OK")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分片解析与单飞锁测试
+同一个大PDF的分片解析和批量解析并发进行时，单飞锁在事件循环中等待，不占用解析进程，
+分片解析不会排在等锁的解析任务后面；后到的请求直接复用先到者写入的缓存。
+解析进程池用只有2个名额的线程执行器代替，MinerU解析函数用记录调用的假函数代替，不需要模型
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.pdf_utils import sharded_parse
+from web_serves.pdf_utils.mineru_parse import generate_pdf_cache_key
+
+WORKERS = 2
+TOTAL_PAGES = 400
+SHARD_SECONDS = 0.3
+# 锁等待超时设得较短：如果分片排在等锁的解析任务后面，测试会在超时后才完成
+LOCK_TIMEOUT = 5
+PDF_SHA256 = "a" * 64
+
+
+class FakeParser:
+    """模拟解析进程池和MinerU解析函数，记录每种解析的调用次数"""
+
+    def __init__(self):
+        self.cache = {}
+        self.slots = None
+        self.shard_calls = 0
+        self.whole_parses = 0
+
+    async def run_in_parse_executor(self, func, *args, **kwargs):
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(WORKERS)
+        async with self.slots:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    def restore_from_cache(self, cache_key, *args):
+        if cache_key not in self.cache:
+            return None
+        return {"md_path": None, "md_content": self.cache[cache_key], "page_routing": None}
+
+    def parse_pdf_shard(self, pdf_file_path, shard_dir, shard_index, start_page, end_page, *args):
+        self.shard_calls += 1
+        time.sleep(SHARD_SECONDS)
+        return {"shard_index": shard_index, "start_page": start_page, "end_page": end_page, "routing": []}
+
+    def merge_pdf_shards(self, pdf_file_path, md_output_path, shard_dir, shards, method, web_images_dir, cache_key,
+                         *args):
+        self.cache[cache_key] = "merged"
+        return "merged"
+
+    def mineru_multi_pdf2md(self, pdf_file_paths, coalesce_parses=True, content_sha256_list=None, backend="pipeline",
+                            method="auto", lang="ch", **kwargs):
+        # 解析进程中不加锁：事件循环已持有锁，这里只查缓存
+        assert coalesce_parses is False
+        results = []
+        for path, digest in zip(pdf_file_paths, content_sha256_list):
+            cache_key = generate_pdf_cache_key(b"", backend, method, lang, 0, None, content_digest=digest,
+                                               text_fast_path=sharded_parse.uses_text_fast_path(backend, method))
+            if cache_key not in self.cache:
+                self.whole_parses += 1
+                self.cache[cache_key] = "whole"
+            results.append({"file_path": path, "md_path": None, "md_content": self.cache[cache_key]})
+        return results
+
+
+@contextmanager
+def patched_sharded_parse(parser: FakeParser, lock_dir: str):
+    """把 sharded_parse 中的进程池、解析函数和配置替换为测试用的值"""
+    replacements = {
+        "run_in_parse_executor": parser.run_in_parse_executor,
+        "restore_from_cache": parser.restore_from_cache,
+        "parse_pdf_shard": parser.parse_pdf_shard,
+        "merge_pdf_shards": parser.merge_pdf_shards,
+        "mineru_multi_pdf2md": parser.mineru_multi_pdf2md,
+        "classify_pdf_method": lambda pdf_file_path: "txt",
+        "_count_pdf_file_pages": lambda pdf_file_path: TOTAL_PAGES,
+        "PARSE_LOCK_DIR": lock_dir,
+        "PARSE_LOCK_TIMEOUT": LOCK_TIMEOUT,
+        "PARSE_MAX_WORKERS": WORKERS,
+        "SHARDING_ENABLED": True,
+        "SHARD_MIN_DOCUMENT_PAGES": 200,
+        "SHARD_MIN_PAGES": 50,
+    }
+    originals = {name: getattr(sharded_parse, name) for name in replacements}
+    for name, value in replacements.items():
+        setattr(sharded_parse, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(sharded_parse, name, value)
+
+
+async def run_concurrent_requests(pdf_path: str, output_dir: str):
+    """先开始分片解析，持锁后再发起相同PDF的单文档和批量解析请求"""
+    sharded = asyncio.ensure_future(sharded_parse.parse_pdf_file(pdf_path, output_dir, content_sha256=PDF_SHA256))
+    await asyncio.sleep(0.05)
+    duplicate = asyncio.ensure_future(sharded_parse.parse_pdf_file(pdf_path, output_dir, content_sha256=PDF_SHA256))
+    batch = asyncio.ensure_future(sharded_parse.parse_pdf_files([pdf_path], output_dir, content_sha256_list=[PDF_SHA256]))
+    return await asyncio.gather(sharded, duplicate, batch)
+
+
+def test_concurrent_requests_for_same_large_pdf():
+    """两个请求并发解析同一个大PDF：分片解析很快完成，其他请求复用缓存，不重复解析"""
+    parser = FakeParser()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = str(Path(temp_dir) / "large.pdf")
+        Path(pdf_path).write_bytes(b"%PDF-1.4")
+        with patched_sharded_parse(parser, str(Path(temp_dir) / "locks")):
+            started = time.monotonic()
+            sharded, duplicate, batch = asyncio.run(run_concurrent_requests(pdf_path, temp_dir))
+            elapsed = time.monotonic() - started
+
+    print(f"并发解析耗时 {elapsed:.2f} 秒，分片调用 {parser.shard_calls} 次，整篇解析 {parser.whole_parses} 次")
+    assert elapsed < LOCK_TIMEOUT / 2
+    assert parser.shard_calls == WORKERS
+    assert parser.whole_parses == 0
+    assert sharded["md_content"] == "merged"
+    assert duplicate["md_content"] == "merged"
+    assert batch[0]["md_content"] == "merged"
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_for_same_large_pdf()
+    print("OK")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文本快速通道测试
+用 reportlab 生成小PDF，检查 route_pdf_pages 对纯文本页、扫描页、图文页、双栏页和矢量图形较多的页
+给出的通道和原因，以及文本通道页面结果是否符合 union_make 读取的 middle_json 结构。不需要MinerU模型
+"""
+import io
+import sys
+from pathlib import Path
+
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from web_serves.pdf_utils.text_fast_path import (
+    BLOCK_DISCARDED,
+    BLOCK_TEXT,
+    BLOCK_TITLE,
+    SPAN_TEXT,
+    route_pdf_pages,
+    summarize_routing,
+    text_page_model
+)
+
+WIDTH, HEIGHT = A4
+LEFT = 72
+BODY_SIZE = 11
+BODY_LINES = [
+    "The quick brown fox jumps over the lazy dog while the farmer watches from the",
+    "porch and wonders whether the harvest will come in before the autumn rain sets",
+    "in across the valley and floods the lower fields near the old stone bridge again.",
+]
+
+
+def draw_text_page(c: canvas.Canvas, title: str = "Introduction") -> None:
+    """标题、两段正文和页脚页码"""
+    c.setFont("Helvetica-Bold", 20)
+    c.drawString(LEFT, HEIGHT - 100, title)
+    c.setFont("Helvetica", BODY_SIZE)
+    y = HEIGHT - 140
+    for _ in range(2):
+        for line in BODY_LINES:
+            c.drawString(LEFT, y, line)
+            y -= BODY_SIZE * 1.3
+        y -= BODY_SIZE * 2
+    c.setFont("Helvetica", 9)
+    c.drawString(WIDTH / 2, 20, "1")
+
+
+def draw_image(c: canvas.Canvas, x: float, y: float, width: float, height: float) -> None:
+    image = Image.new("RGB", (200, 280), (235, 235, 225))
+    for i in range(0, 200, 7):
+        for j in range(0, 280, 3):
+            image.putpixel((i, j), (40, 40, 40))
+    c.drawImage(ImageReader(image), x, y, width, height)
+
+
+def make_pdf(*draw_pages) -> bytes:
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    for draw_page in draw_pages:
+        draw_page(c)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def text_only_page(c: canvas.Canvas) -> None:
+    draw_text_page(c)
+
+
+def scanned_page(c: canvas.Canvas) -> None:
+    """整页图片，没有文本层"""
+    draw_image(c, 0, 0, WIDTH, HEIGHT)
+
+
+def image_page(c: canvas.Canvas) -> None:
+    """有文本层，但大半页是图片"""
+    draw_text_page(c)
+    draw_image(c, LEFT, 80, WIDTH - 2 * LEFT, HEIGHT / 2)
+
+
+def two_column_page(c: canvas.Canvas) -> None:
+    """两栏正文，同一行的左右两栏之间有大段水平间隔"""
+    c.setFont("Helvetica", BODY_SIZE)
+    y = HEIGHT - 100
+    for index in range(30):
+        c.drawString(LEFT, y, f"Left column line {index} of the body text")
+        c.drawString(WIDTH / 2 + 20, y, f"Right column line {index} of the body")
+        y -= BODY_SIZE * 1.4
+
+
+def vector_graphics_page(c: canvas.Canvas) -> None:
+    """有文本层，另有由大量路径组成的图表"""
+    draw_text_page(c)
+    for index in range(60):
+        x = LEFT + index * 7
+        c.line(x, 100, x, 100 + (index * 37) % 200)
+
+
+def route(*draw_pages):
+    return route_pdf_pages(make_pdf(*draw_pages))
+
+
+def test_route_reasons():
+    """各类页面分到的通道和原因"""
+    routing, text_pages = route(text_only_page, scanned_page, image_page, two_column_page, vector_graphics_page)
+    assert [(d["page"], d["route"], d["reason"]) for d in routing] == [
+        (0, "text", "text_layer"),
+        (1, "model", "no_text_layer"),
+        (2, "model", "images"),
+        (3, "model", "complex_layout"),
+        (4, "model", "vector_graphics"),
+    ]
+    assert list(text_pages) == [0]
+
+    text_only, scanned, image, _, vector = routing
+    assert text_only["chars"] > 100 and text_only["image_coverage"] == 0 and text_only["path_objects"] == 0
+    assert scanned["chars"] == 0 and scanned["image_coverage"] > 0.9
+    assert 0.1 < image["image_coverage"] < 0.9
+    assert vector["path_objects"] >= 60
+
+    assert summarize_routing(routing) == {"text_pages": 1, "model_pages": 4, "pages": routing}
+    assert summarize_routing(None) is None
+
+
+def check_block(block: dict, block_type: str) -> None:
+    """union_make 读取的块字段：type、bbox、lines -> spans 的 type 和 content"""
+    assert block["type"] == block_type
+    assert len(block["bbox"]) == 4 and block["bbox"][0] < block["bbox"][2] and block["bbox"][1] < block["bbox"][3]
+    assert block["lines"]
+    for line in block["lines"]:
+        assert len(line["bbox"]) == 4
+        for span in line["spans"]:
+            assert span["type"] == SPAN_TEXT and span["content"].strip()
+
+
+def test_text_page_structure():
+    """文本通道页面结果：标题块、按行距合并的段落、页脚丢弃块，以及 page_idx 和 page_size"""
+    _, text_pages = route(scanned_page, text_only_page)
+    page_info = text_pages[1]
+
+    assert page_info["page_idx"] == 1
+    assert page_info["page_size"] == [round(WIDTH, 2), round(HEIGHT, 2)]
+    assert page_info["preproc_blocks"] is page_info["para_blocks"]
+    assert page_info["images"] == page_info["tables"] == page_info["interline_equations"] == []
+
+    title, *paragraphs = page_info["para_blocks"]
+    check_block(title, BLOCK_TITLE)
+    assert title["level"] == 1
+    assert title["lines"][0]["spans"][0]["content"] == "Introduction"
+
+    assert len(paragraphs) == 2
+    for paragraph in paragraphs:
+        check_block(paragraph, BLOCK_TEXT)
+        assert [line["spans"][0]["content"] for line in paragraph["lines"]] == BODY_LINES
+    assert [block["index"] for block in page_info["para_blocks"]] == [0, 1, 2]
+    # 块按从上到下的阅读顺序排列
+    tops = [block["bbox"][1] for block in page_info["para_blocks"]]
+    assert tops == sorted(tops)
+
+    assert len(page_info["discarded_blocks"]) == 1
+    check_block(page_info["discarded_blocks"][0], BLOCK_DISCARDED)
+    assert page_info["discarded_blocks"][0]["lines"][0]["spans"][0]["content"] == "1"
+
+
+def test_text_page_model():
+    """*_model.json 中的占位条目与页面结果的页码和尺寸一致"""
+    _, text_pages = route(text_only_page)
+    model = text_page_model(text_pages[0])
+    assert model == {
+        "layout_dets": [],
+        "page_info": {"page_no": 0, "width": round(WIDTH, 2), "height": round(HEIGHT, 2)},
+        "route": "text"
+    }
+
+
+if __name__ == "__main__":
+    test_route_reasons()
+    test_text_page_structure()
+    test_text_page_model()
+    print("OK")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地模拟视觉模型服务 - OpenAI兼容的 /v1/chat/completions 桩服务
+
+不调用付费API即可压测和回归测试图片分析流程（AsyncImageAnalysis、MarkdownImageProcessor）：
+1. 时延按配置的分布生成：fixed / uniform / exponential / lognormal；
+2. 按 error_rate 返回 error_status，并发超过 max_concurrent 或速率超过 requests_per_second 时返回429（带 Retry-After）；
+3. 第 n 个请求的时延和是否出错只由 seed 和 n 决定，同样的请求序列得到同样的结果；
+   标题和描述由图片内容摘要生成，同一张图片总是得到同样的结果；
+4. 一个请求包含多张图片时按批量分析的格式返回JSON数组；
+5. 同时提供 /upload/image 和 /uploads/images/{文件名}，MarkdownImageProcessor 的 api_base_url 指向本服务时可离线跑完整流程；
+6. GET /stats 返回请求数、错误数、限流数和并发峰值，POST /stats/reset 清零。
+
+默认参数取自 config.json 的 mock_vision_server，命令行参数可以覆盖。使用 local_mock 提供商时，
+AsyncImageAnalysis 在未设置 LOCAL_MOCK_BASE_URL 时默认连接本服务。
+
+使用示例：
+    python -m utils.mock_vision_server --median-ms 200 --error-rate 0.05 --max-concurrent 8
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from web_serves.config import MOCK_VISION_SERVER_CONFIG, MOCK_VISION_HOST, MOCK_VISION_PORT
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+@dataclass
+class MockSettings:
+    """模拟服务参数"""
+    distribution: str = "lognormal"
+    median_ms: float = 800
+    sigma: float = 0.5
+    error_rate: float = 0.0
+    error_status: int = 500
+    max_concurrent: int = 0
+    requests_per_second: float = 0
+    retry_after_seconds: float = 1
+    seed: int = 42
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "MockSettings":
+        latency = config.get("latency", {})
+        return cls(
+            distribution=latency.get("distribution", cls.distribution),
+            median_ms=float(latency.get("median_ms", cls.median_ms)),
+            sigma=float(latency.get("sigma", cls.sigma)),
+            error_rate=float(config.get("error_rate", cls.error_rate)),
+            error_status=int(config.get("error_status", cls.error_status)),
+            max_concurrent=int(config.get("max_concurrent", cls.max_concurrent)),
+            requests_per_second=float(config.get("requests_per_second", cls.requests_per_second)),
+            retry_after_seconds=float(config.get("retry_after_seconds", cls.retry_after_seconds)),
+            seed=int(config.get("seed", cls.seed)),
+        )
+
+
+class MockVisionService:
+    """模拟视觉模型服务的状态和请求处理"""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.reset()
+
+    def reset(self) -> None:
+        self._sequence = 0
+        self._in_flight = 0
+        self._tokens = float(self.settings.requests_per_second or 0)
+        self._token_time = time.monotonic()
+        self.stats = {"requests": 0, "completed": 0, "errors": 0, "throttled": 0, "images": 0, "peak_concurrency": 0}
+
+    def latency_seconds(self, rng: random.Random) -> float:
+        """按配置的分布生成一次时延（秒），median_ms 为中位数"""
+        median = self.settings.median_ms / 1000
+        distribution = self.settings.distribution
+        if distribution == "fixed":
+            return median
+        if distribution == "uniform":
+            return rng.uniform(0, 2 * median)
+        if distribution == "exponential":
+            return rng.expovariate(math.log(2) / median) if median > 0 else 0.0
+        return rng.lognormvariate(math.log(median), self.settings.sigma) if median > 0 else 0.0
+
+    def _take_token(self) -> bool:
+        """令牌桶限速，requests_per_second 为0时不限速"""
+        rate = self.settings.requests_per_second
+        if rate <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(rate, self._tokens + (now - self._token_time) * rate)
+        self._token_time = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _throttled(self) -> web.Response:
+        self.stats["throttled"] += 1
+        return web.json_response(
+            {"error": {"message": "Rate limit exceeded (mock)", "type": "rate_limit_error", "code": "rate_limit"}},
+            status=429,
+            headers={"Retry-After": str(self.settings.retry_after_seconds)}
+        )
+
+    @staticmethod
+    def _image_digests(messages: List[Dict[str, Any]]) -> List[str]:
+        """取出请求中每张图片的摘要（data URL 按内容，在线图片按地址）"""
+        digests = []
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, list):
+                continue
+            for part in content:
+                if part.get("type") == "image_url":
+                    url = part.get("image_url", {}).get("url", "")
+                    digests.append(hashlib.sha256(url.encode()).hexdigest()[:8])
+        return digests
+
+    @staticmethod
+    def _analysis(digest: str) -> Dict[str, str]:
+        return {"title": f"模拟图片{digest}", "description": f"本地模拟服务为图片 {digest} 生成的描述"}
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        self._sequence += 1
+        self.stats["requests"] += 1
+        # 第 n 个请求的随机数只由 seed 和 n 决定
+        rng = random.Random(self.settings.seed * 1_000_003 + self._sequence)
+        if self.settings.max_concurrent and self._in_flight >= self.settings.max_concurrent:
+            return self._throttled()
+        if not self._take_token():
+            return self._throttled()
+
+        body = await request.json()
+        digests = self._image_digests(body.get("messages", []))
+        self.stats["images"] += len(digests)
+        self._in_flight += 1
+        self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self._in_flight)
+        try:
+            await asyncio.sleep(self.latency_seconds(rng))
+            if rng.random() < self.settings.error_rate:
+                self.stats["errors"] += 1
+                return web.json_response(
+                    {"error": {"message": "Injected error (mock)", "type": "server_error"}},
+                    status=self.settings.error_status
+                )
+        finally:
+            self._in_flight -= 1
+
+        if len(digests) > 1:
+            content = json.dumps([{"index": i + 1, **self._analysis(d)} for i, d in enumerate(digests)], ensure_ascii=False)
+        else:
+            content = json.dumps(self._analysis(digests[0] if digests else "none"), ensure_ascii=False)
+        self.stats["completed"] += 1
+        return web.json_response({
+            "id": f"chatcmpl-mock-{self._sequence}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock-vision"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "mock-vision", "object": "model", "owned_by": "local"}]})
+
+    async def upload_image(self, request: web.Request) -> web.Response:
+        """模拟 /upload/image，只读取上传内容，不保存文件"""
+        reader = await request.multipart()
+        filename = "image.png"
+        async for part in reader:
+            if part.name == "file":
+                filename = part.filename or filename
+                await part.read()
+        saved_filename = f"{uuid.uuid4().hex}{('.' + filename.rsplit('.', 1)[-1]) if '.' in filename else ''}"
+        return web.json_response({"message": "文件上传成功", "file_info": {"saved_filename": saved_filename}})
+
+    async def uploaded_image(self, request: web.Request) -> web.Response:
+        return web.Response(status=200)
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.stats, "in_flight": self._in_flight,
+                                  "settings": {f.name: getattr(self.settings, f.name) for f in fields(self.settings)}})
+
+    async def reset_stats(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"message": "统计已清零"})
+
+
+def create_app(settings: Optional[MockSettings] = None) -> web.Application:
+    """创建模拟服务的 aiohttp 应用，settings 为None时使用 config.json 中的参数"""
+    service = MockVisionService(settings or MockSettings.from_config(MOCK_VISION_SERVER_CONFIG))
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app["service"] = service
+    app.router.add_post("/v1/chat/completions", service.chat_completions)
+    app.router.add_get("/v1/models", service.models)
+    app.router.add_post("/upload/image", service.upload_image)
+    app.router.add_get("/uploads/images/{filename}", service.uploaded_image)
+    app.router.add_get("/stats", service.get_stats)
+    app.router.add_post("/stats/reset", service.reset_stats)
+    return app
+
+
+def main():
+    defaults = MockSettings.from_config(MOCK_VISION_SERVER_CONFIG)
+    parser = argparse.ArgumentParser(description="本地模拟视觉模型服务（OpenAI兼容）")
+    parser.add_argument("--host", default=MOCK_VISION_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=MOCK_VISION_PORT, help="监听端口")
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default=defaults.distribution, help="时延分布")
+    parser.add_argument("--median-ms", type=float, default=defaults.median_ms, help="时延中位数（毫秒）")
+    parser.add_argument("--sigma", type=float, default=defaults.sigma, help="lognormal 分布的 sigma")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="返回错误的比例")
+    parser.add_argument("--error-status", type=int, default=defaults.error_status, help="注入错误的状态码")
+    parser.add_argument("--max-concurrent", type=int, default=defaults.max_concurrent, help="超过该并发返回429，0为不限")
+    parser.add_argument("--rps", type=float, default=defaults.requests_per_second, help="每秒请求数上限，0为不限")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after_seconds, help="429响应的 Retry-After（秒）")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="随机数种子")
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        distribution=args.distribution,
+        median_ms=args.median_ms,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        max_concurrent=args.max_concurrent,
+        requests_per_second=args.rps,
+        retry_after_seconds=args.retry_after,
+        seed=args.seed,
+    )
+    print(f"模拟视觉模型服务: http://{args.host}:{args.port}/v1  参数: {settings}")
+    web.run_app(create_app(settings), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
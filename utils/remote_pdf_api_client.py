@@ -8,7 +8,7 @@ import requests
 from pathlib import Path
 import time
 import json
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
 
 
 class ApiClient:
@@ -20,14 +20,30 @@ class ApiClient:
     DEFAULT_TIMEOUT_PDF = 2400  # 秒 (PDF处理可能需要更长时间)
     DEFAULT_PROVIDER = "zhipu"  # 默认AI提供商
 
-    def __init__(self, base_url: str = "http://localhost:10001"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:10001",
+        client_id: Optional[str] = None,
+        api_key: Optional[str] = None,
+        priority: Optional[str] = None,
+    ):
         """
         初始化ApiClient。
 
         Args:
             base_url (str): API的基础URL (例如 "http://localhost:10001")。
+            client_id (Optional[str]): 客户端标识，作为 X-Client-Id 请求头，服务端按租户公平调度。
+            api_key (Optional[str]): API密钥，作为 X-API-Key 请求头，优先于 client_id 标识租户。
+            priority (Optional[str]): 调度优先级 interactive / bulk，作为 X-Priority 请求头，默认由接口决定。
         """
         self.base_url = base_url.rstrip("/")  # 确保没有末尾的斜杠
+        self.headers = {}
+        if client_id:
+            self.headers["X-Client-Id"] = client_id
+        if api_key:
+            self.headers["X-API-Key"] = api_key
+        if priority:
+            self.headers["X-Priority"] = priority
 
     def _get_content_type(self, file_path: Path) -> str:
         """根据文件扩展名获取Content-Type。"""
@@ -145,7 +161,7 @@ class ApiClient:
             print(f"   🔄 最大并发数: {max_concurrent}")
 
             response = requests.post(
-                upload_url, files=files_to_send, data=data, timeout=timeout
+                upload_url, files=files_to_send, data=data, headers=self.headers, timeout=timeout
             )
             print(f"   📊 响应状态: {response.status_code}")
 
@@ -195,6 +211,7 @@ class ApiClient:
         parse_images: bool = False,
         max_concurrent: int = 5,
         use_cache: bool = True, 
+        artifact_policy: Optional[str] = None,
         timeout: int = DEFAULT_TIMEOUT_PDF,
     ) -> Optional[Dict]:
         """
@@ -208,6 +225,7 @@ class ApiClient:
             parse_images (bool): 是否处理PDF中的图片。
             max_concurrent (int): AI并发处理数。
             use_cache (bool): 是否使用缓存功能。
+            artifact_policy (Optional[str]): 辅助文件策略 (none, minimal, debug)，为None时使用服务端默认策略。
             timeout (int): 请求超时时间（秒）。
 
         Returns:
@@ -235,6 +253,8 @@ class ApiClient:
                     "max_concurrent": max_concurrent,
                     "use_cache": use_cache,  # 添加缓存参数
                 }
+                if artifact_policy:
+                    data["artifact_policy"] = artifact_policy
 
                 upload_url = f"{self.base_url}/upload/pdf"
                 print(f"   📤 上传文件: {pdf_path.name} 到 {upload_url}")
@@ -247,7 +267,7 @@ class ApiClient:
 
                 start_time = time.time()
                 response = requests.post(
-                    upload_url, files=files, data=data, timeout=timeout
+                    upload_url, files=files, data=data, headers=self.headers, timeout=timeout
                 )
                 end_time = time.time()
 
@@ -289,6 +309,7 @@ class ApiClient:
         parse_images: bool = False,
         max_concurrent: int = 5,
         use_cache: bool = True,  # 新增缓存参数
+        artifact_policy: Optional[str] = None,
         timeout: int = DEFAULT_TIMEOUT_PDF,
     ) -> Optional[Dict]:
         """
@@ -302,6 +323,7 @@ class ApiClient:
             parse_images (bool): 是否处理PDF中的图片。
             max_concurrent (int): AI并发处理数。
             use_cache (bool): 是否使用缓存功能。
+            artifact_policy (Optional[str]): 辅助文件策略 (none, minimal, debug)，为None时使用服务端默认策略。
             timeout (int): 请求超时时间（秒）。
 
         Returns:
@@ -341,6 +363,8 @@ class ApiClient:
                 "max_concurrent": max_concurrent,
                 "use_cache": use_cache,  # 添加缓存参数
             }
+            if artifact_policy:
+                data["artifact_policy"] = artifact_policy
 
             upload_url = f"{self.base_url}/upload/pdfs"
             print(f"📤 正在上传 {len(files_to_send)} 个PDF到 {upload_url}")
@@ -353,7 +377,7 @@ class ApiClient:
 
             start_time = time.time()
             response = requests.post(
-                upload_url, files=files_to_send, data=data, timeout=timeout
+                upload_url, files=files_to_send, data=data, headers=self.headers, timeout=timeout
             )
             end_time = time.time()
 
@@ -393,6 +417,212 @@ class ApiClient:
                 except Exception:
                     pass
 
+    def submit_pdf_job(
+        self,
+        pdf_path: Path,
+        provider: str = DEFAULT_PROVIDER,
+        backend: str = "pipeline",
+        method: str = "auto",
+        parse_images: bool = False,
+        max_concurrent: int = 5,
+        use_cache: bool = True,
+        artifact_policy: Optional[str] = None,
+        timeout: int = DEFAULT_TIMEOUT_IMAGE,
+    ) -> Optional[str]:
+        """
+        提交PDF异步解析任务到 /jobs/pdf 接口，上传完成后立即返回task_id。
+
+        Args:
+            pdf_path (Path): 要上传的PDF文件的绝对路径。
+            其余参数同 upload_pdf，timeout 只需覆盖上传时间。
+
+        Returns:
+            Optional[str]: 如果成功，返回task_id，否则返回None。
+        """
+        if not pdf_path.is_file():
+            print(f"❌ PDF文件不存在或不是一个文件: {pdf_path}")
+            return None
+
+        try:
+            with open(pdf_path, "rb") as f:
+                files = {"file": (pdf_path.name, f, "application/pdf")}
+                data = {
+                    "provider": provider,
+                    "backend": backend,
+                    "method": method,
+                    "parse_images": parse_images,
+                    "max_concurrent": max_concurrent,
+                    "use_cache": use_cache,
+                }
+                if artifact_policy:
+                    data["artifact_policy"] = artifact_policy
+                submit_url = f"{self.base_url}/jobs/pdf"
+                print(f"   📤 提交任务: {pdf_path.name} 到 {submit_url}")
+                response = requests.post(
+                    submit_url, files=files, data=data, headers=self.headers, timeout=timeout
+                )
+
+            if response.status_code == 202:
+                task_id = response.json().get("task_id")
+                print(f"✅ 任务已提交: {task_id}")
+                return task_id
+            else:
+                print(f"❌ 任务提交失败: {response.status_code}")
+                if response.status_code in (429, 503) and "Retry-After" in response.headers:
+                    print(f"   ⏳ 服务端解析队列繁忙，建议 {response.headers['Retry-After']} 秒后重试")
+                try:
+                    print(f"   错误详情: {response.json()}")
+                except json.JSONDecodeError:
+                    print(f"   响应内容: {response.text}")
+                return None
+
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 请求失败: {e}")
+            return None
+
+    def get_job_status(self, task_id: str) -> Optional[Dict]:
+        """
+        查询异步任务的状态和进度。
+
+        Args:
+            task_id (str): 提交任务时返回的task_id。
+
+        Returns:
+            Optional[Dict]: 任务状态字典，任务不存在或请求失败时返回None。
+        """
+        try:
+            response = requests.get(f"{self.base_url}/jobs/{task_id}", timeout=30)
+            if response.status_code == 200:
+                return response.json()
+            print(f"❌ 查询任务状态失败: {response.status_code}")
+            return None
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 请求失败: {e}")
+            return None
+
+    def wait_for_job_result(
+        self, task_id: str, poll_interval: float = 3.0, timeout: int = DEFAULT_TIMEOUT_PDF
+    ) -> Optional[Dict]:
+        """
+        轮询等待异步任务完成并返回结果（格式与 upload_pdf / upload_multiple_pdfs 相同）。
+
+        Args:
+            task_id (str): 提交任务时返回的task_id。
+            poll_interval (float): 轮询间隔（秒）。
+            timeout (int): 最长等待时间（秒）。
+
+        Returns:
+            Optional[Dict]: 任务成功时返回结果，失败或超时返回None。
+        """
+        result_url = f"{self.base_url}/jobs/{task_id}/result"
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                response = requests.get(result_url, timeout=60)
+            except requests.exceptions.RequestException as e:
+                print(f"❌ 请求失败: {e}")
+                return None
+
+            if response.status_code == 200:
+                print(f"✅ 任务完成: {task_id}")
+                return response.json()
+            if response.status_code == 202:
+                status = response.json()
+                print(f"   ⏳ 任务进行中: {status.get('stage')} ({status.get('progress', 0):.0%})")
+                time.sleep(poll_interval)
+                continue
+
+            print(f"❌ 任务失败: {response.status_code}")
+            try:
+                print(f"   错误详情: {response.json()}")
+            except json.JSONDecodeError:
+                print(f"   响应内容: {response.text}")
+            return None
+
+        print(f"❌ 等待任务超时 (超过 {timeout} 秒)")
+        return None
+
+    def stream_pdf(
+        self,
+        pdf_path: Path,
+        backend: str = "pipeline",
+        method: str = "auto",
+        use_cache: bool = True,
+        artifact_policy: Optional[str] = None,
+        timeout: int = DEFAULT_TIMEOUT_PDF,
+    ) -> Iterator[Dict]:
+        """
+        上传PDF到 /upload/pdf/stream 接口，边解析边逐条返回NDJSON记录。
+
+        记录类型: document（任务信息）、start（总页数）、page（一页的Markdown，按页序）、
+        markdown（缓存命中时的Markdown分块）、end（结束，包含 page_routing）、error（解析失败）。
+
+        Args:
+            pdf_path (Path): 要上传的PDF文件的绝对路径。
+            backend, method, use_cache, artifact_policy: 同 upload_pdf。
+            timeout (int): 两条记录之间的最长等待时间（秒）。
+
+        Yields:
+            Dict: 解析记录。请求失败时不产出任何记录。
+        """
+        if not pdf_path.is_file():
+            print(f"❌ PDF文件不存在或不是一个文件: {pdf_path}")
+            return
+
+        try:
+            with open(pdf_path, "rb") as f:
+                files = {"file": (pdf_path.name, f, "application/pdf")}
+                data = {
+                    "backend": backend,
+                    "method": method,
+                    "use_cache": use_cache,
+                    "output_format": "ndjson",
+                }
+                if artifact_policy:
+                    data["artifact_policy"] = artifact_policy
+                stream_url = f"{self.base_url}/upload/pdf/stream"
+                print(f"   📤 上传文件: {pdf_path.name} 到 {stream_url}")
+                response = requests.post(
+                    stream_url, files=files, data=data, headers=self.headers, timeout=timeout, stream=True
+                )
+
+            with response:
+                if response.status_code != 200:
+                    print(f"❌ PDF处理失败: {response.status_code}")
+                    try:
+                        print(f"   错误详情: {response.json()}")
+                    except json.JSONDecodeError:
+                        print(f"   响应内容: {response.text}")
+                    return
+                for line in response.iter_lines(decode_unicode=True):
+                    if line:
+                        yield json.loads(line)
+
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 请求失败: {e}")
+            return
+
+    def get_queue_stats(self) -> Optional[Dict]:
+        """
+        获取解析队列统计信息（排队请求数、排队页数、解析中文档数、预估内存和限额）。
+
+        Returns:
+            Optional[Dict]: 如果成功，返回队列统计信息，否则返回None。
+        """
+        try:
+            url = f"{self.base_url}/upload/queue/stats"
+            print(f"📊 获取解析队列统计信息: {url}")
+
+            response = requests.get(url, timeout=30)
+            if response.status_code == 200:
+                return response.json().get("queue_stats")
+            print(f"❌ 获取解析队列统计信息失败: {response.status_code}")
+            return None
+
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 请求失败: {e}")
+            return None
+
     def get_cache_stats(self) -> Optional[Dict]:
         """
         获取PDF解析缓存统计信息。
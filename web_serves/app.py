@@ -4,19 +4,50 @@
 主应用入口文件
 """
 import time
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-import time
+from fastapi.responses import HTMLResponse, JSONResponse
 
 from web_serves.config import API_CONFIG, BASE_DIR, CORS_CONFIG, SERVER_CONFIG
-from web_serves.routers import image_upload, pdf_processing
+from web_serves.routers import image_upload, pdf_processing, pdf_jobs, progress
+from web_serves.utils.job_manager import job_manager
+from web_serves.utils.admission import admission_controller
+from web_serves.image_utils.client_registry import close_shared_clients
+from web_serves.utils.progress import progress_broker, set_progress_sink
+from web_serves.pdf_utils.mineru_parse import migrate_pdf_cache, gc_pdf_cache_blobs
+from web_serves.pdf_utils.parse_executor import (
+    start_parse_executor,
+    shutdown_parse_executor,
+    warm_up_parse_executor,
+    get_parse_readiness
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建解析进程池并在后台预热模型，关闭时释放进程池和共享的视觉模型客户端"""
+    progress_broker.bind_loop(asyncio.get_running_loop())
+    set_progress_sink(progress_broker.publish_threadsafe)
+    # 清理旧格式（前8KB哈希）的缓存条目，只在首次启动新版本时执行
+    await asyncio.to_thread(migrate_pdf_cache)
+    # 后台回收已过期缓存条目遗留的图片和辅助文件
+    gc_task = asyncio.create_task(asyncio.to_thread(gc_pdf_cache_blobs))
+    start_parse_executor()
+    warmup_task = asyncio.create_task(warm_up_parse_executor())
+    yield
+    warmup_task.cancel()
+    gc_task.cancel()
+    await job_manager.shutdown()
+    await close_shared_clients()
+    shutdown_parse_executor(wait=False)
 
 
 # 创建FastAPI应用实例
-app = FastAPI(**API_CONFIG)
+app = FastAPI(**API_CONFIG, lifespan=lifespan)
 
 # 添加 CORS 中间件
 app.add_middleware(CORSMiddleware, **CORS_CONFIG)
@@ -24,8 +55,22 @@ app.add_middleware(CORSMiddleware, **CORS_CONFIG)
 # 健康检查端点
 @app.get("/health")
 async def health_check():
-    """健康检查端点"""
-    return {"status": "healthy", "timestamp": int(time.time())}
+    """
+    健康检查端点
+
+    解析进程尚未完成模型预热（或预热失败）时返回503，
+    便于负载均衡只把流量转发到已就绪的实例。admission 字段给出解析队列深度。
+    """
+    readiness = get_parse_readiness()
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content={
+            "status": "healthy" if readiness["ready"] else readiness["status"],
+            "timestamp": int(time.time()),
+            "parse_workers": readiness,
+            "admission": admission_controller.get_stats()
+        }
+    )
 
 # 挂载静态文件
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
@@ -120,6 +165,8 @@ async def debug_config():
 # 注册路由
 app.include_router(image_upload.router)
 app.include_router(pdf_processing.router)
+app.include_router(pdf_jobs.router)
+app.include_router(progress.router)
 
 
 if __name__ == "__main__":
@@ -64,6 +64,209 @@ DEFAULT_MAX_CONCURRENT_AI = AI_SERVICES_CONFIG.get("default_max_concurrent_ai",
 TITLE_MAX_LENGTH = AI_SERVICES_CONFIG.get("title_max_length", 20)
 DESCRIPTION_MAX_LENGTH = AI_SERVICES_CONFIG.get("description_max_length", 100)
 
+# 视觉模型客户端配置：每个提供商一个应用级共享客户端，连接池保持长连接
+VISION_CLIENTS_CONFIG = CONFIG.get("vision_clients", {})
+# 每个客户端连接池的最大连接数和保持的空闲长连接数
+VISION_MAX_CONNECTIONS = int(VISION_CLIENTS_CONFIG.get("max_connections", 64))
+VISION_MAX_KEEPALIVE_CONNECTIONS = int(VISION_CLIENTS_CONFIG.get("max_keepalive_connections", 32))
+# 空闲长连接的保留时间（秒）
+VISION_KEEPALIVE_EXPIRY = float(VISION_CLIENTS_CONFIG.get("keepalive_expiry", 60))
+# 单次模型调用的超时时间（秒）
+VISION_TIMEOUT = float(VISION_CLIENTS_CONFIG.get("timeout_seconds", 120))
+# 每个提供商所有请求共享的最大并发调用数，default 用于未单独配置的提供商
+VISION_PROVIDER_MAX_CONCURRENT = VISION_CLIENTS_CONFIG.get("provider_max_concurrent", {"default": 8})
+
+# 自适应并发：在 min_limit 和 provider_max_concurrent 之间按 AIMD 调整每个提供商的并发上限
+ADAPTIVE_CONCURRENCY_CONFIG = CONFIG.get("adaptive_concurrency", {})
+ADAPTIVE_CONCURRENCY_ENABLED = ADAPTIVE_CONCURRENCY_CONFIG.get("enabled", True)
+ADAPTIVE_CONCURRENCY_INITIAL_LIMIT = int(ADAPTIVE_CONCURRENCY_CONFIG.get("initial_limit", 4))
+ADAPTIVE_CONCURRENCY_MIN_LIMIT = int(ADAPTIVE_CONCURRENCY_CONFIG.get("min_limit", 1))
+# 遇到429、5xx或超时时上限乘以该系数
+ADAPTIVE_CONCURRENCY_DECREASE_FACTOR = float(ADAPTIVE_CONCURRENCY_CONFIG.get("decrease_factor", 0.5))
+# RTT 超过近期最小RTT的该倍数时不再增加上限
+ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE = float(ADAPTIVE_CONCURRENCY_CONFIG.get("latency_tolerance", 2.0))
+# 计算近期最小RTT使用的样本数
+ADAPTIVE_CONCURRENCY_RTT_WINDOW = max(1, int(ADAPTIVE_CONCURRENCY_CONFIG.get("rtt_window", 100)))
+
+# 图片分析重试：指数退避 + 随机抖动，每张图片有总的截止时间
+IMAGE_RETRY_CONFIG = CONFIG.get("image_retry", {})
+IMAGE_RETRY_MAX_ATTEMPTS = max(1, int(IMAGE_RETRY_CONFIG.get("max_attempts", 3)))
+IMAGE_RETRY_BASE_DELAY = float(IMAGE_RETRY_CONFIG.get("base_delay_seconds", 0.5))
+IMAGE_RETRY_MAX_DELAY = float(IMAGE_RETRY_CONFIG.get("max_delay_seconds", 8))
+# 可重试的HTTP状态码，超时和连接失败总是可重试
+IMAGE_RETRY_STATUS_CODES = set(IMAGE_RETRY_CONFIG.get("retryable_status_codes", [408, 429, 500, 502, 503, 504]))
+# 单张图片（或一批图片）分析的截止时间（秒），包括所有重试
+IMAGE_RETRY_DEADLINE = float(IMAGE_RETRY_CONFIG.get("deadline_seconds", 180))
+
+# 对冲请求：调用超过近期 p95 时延仍未返回时，向备用提供商或备用模型发出同样的请求
+IMAGE_HEDGING_CONFIG = CONFIG.get("image_hedging", {})
+IMAGE_HEDGING_ENABLED = IMAGE_HEDGING_CONFIG.get("enabled", False)
+# 备用提供商，为空时使用主提供商
+IMAGE_HEDGING_PROVIDER = IMAGE_HEDGING_CONFIG.get("provider", "")
+# 备用模型，为空时使用备用提供商的默认模型（与主提供商相同时必须配置）
+IMAGE_HEDGING_MODEL = IMAGE_HEDGING_CONFIG.get("model", "")
+IMAGE_HEDGING_PERCENTILE = float(IMAGE_HEDGING_CONFIG.get("latency_percentile", 0.95))
+# 时延样本少于该数量时不对冲
+IMAGE_HEDGING_MIN_SAMPLES = int(IMAGE_HEDGING_CONFIG.get("min_samples", 20))
+# 发出对冲请求前的最短等待时间（秒）
+IMAGE_HEDGING_MIN_DELAY = float(IMAGE_HEDGING_CONFIG.get("min_delay_seconds", 1.0))
+
+# 多提供商路由：按权重、健康状况和实时时延把图片分析分散到多个提供商和模型
+PROVIDER_ROUTING_CONFIG = CONFIG.get("provider_routing", {})
+PROVIDER_ROUTING_ENABLED = PROVIDER_ROUTING_CONFIG.get("enabled", False)
+# 参与路由的目标：[{"provider": "zhipu", "model": "", "weight": 1}, ...]，model 为空时使用提供商的默认模型
+PROVIDER_ROUTING_TARGETS = PROVIDER_ROUTING_CONFIG.get("targets", [])
+# 熔断：连续失败达到该次数时摘除目标
+PROVIDER_ROUTING_FAILURE_THRESHOLD = max(1, int(PROVIDER_ROUTING_CONFIG.get("failure_threshold", 5)))
+# 摘除后的冷却时间（秒），再次熔断时加倍，不超过 max_cooldown_seconds
+PROVIDER_ROUTING_COOLDOWN = float(PROVIDER_ROUTING_CONFIG.get("cooldown_seconds", 30))
+PROVIDER_ROUTING_MAX_COOLDOWN = float(PROVIDER_ROUTING_CONFIG.get("max_cooldown_seconds", 600))
+
+# 本地模拟视觉模型服务（utils/mock_vision_server.py）：local_mock 提供商的默认地址，用于离线压测和回归测试
+MOCK_VISION_SERVER_CONFIG = CONFIG.get("mock_vision_server", {})
+MOCK_VISION_HOST = MOCK_VISION_SERVER_CONFIG.get("host", "127.0.0.1")
+MOCK_VISION_PORT = int(MOCK_VISION_SERVER_CONFIG.get("port", 18600))
+MOCK_VISION_BASE_URL = f"http://{MOCK_VISION_HOST}:{MOCK_VISION_PORT}/v1"
+
+# 图片分析结果缓存：按图片内容摘要、提供商、模型、提示词和细节级别缓存标题和描述
+IMAGE_ANALYSIS_CACHE_CONFIG = CONFIG.get("image_analysis_cache", {})
+IMAGE_ANALYSIS_CACHE_ENABLED = IMAGE_ANALYSIS_CACHE_CONFIG.get("enabled", True)
+# 缓存条目的过期时间（秒）
+IMAGE_ANALYSIS_CACHE_TTL = int(IMAGE_ANALYSIS_CACHE_CONFIG.get("ttl_seconds", 30 * 24 * 3600))
+# 缓存占用磁盘的上限（MB），超出后淘汰最近最少使用的条目
+IMAGE_ANALYSIS_CACHE_SIZE_LIMIT_MB = int(IMAGE_ANALYSIS_CACHE_CONFIG.get("size_limit_mb", 1024))
+
+# 图片去重：同一文档中内容相同的图片只分析、上传一次，结果分发给所有引用
+IMAGE_DEDUP_CONFIG = CONFIG.get("image_dedup", {})
+IMAGE_DEDUP_ENABLED = IMAGE_DEDUP_CONFIG.get("enabled", True)
+# 是否按感知哈希（dHash）把近似重复的图片（如重新压缩的logo、水印）归为一组
+IMAGE_DEDUP_PERCEPTUAL = IMAGE_DEDUP_CONFIG.get("perceptual", False)
+# 感知哈希的最大汉明距离（64位），不超过该距离视为近似重复
+IMAGE_DEDUP_HAMMING_THRESHOLD = int(IMAGE_DEDUP_CONFIG.get("hamming_threshold", 4))
+# 是否跨文档复用已上传图片的地址（按内容摘要记录，复用前确认远程文件仍存在）
+IMAGE_DEDUP_REUSE_UPLOADS = IMAGE_DEDUP_CONFIG.get("reuse_uploads", True)
+
+# 图片预处理：发送给视觉模型前按模型实际使用的分辨率缩放并重新编码
+IMAGE_PREPROCESS_CONFIG = CONFIG.get("image_preprocess", {})
+IMAGE_PREPROCESS_ENABLED = IMAGE_PREPROCESS_CONFIG.get("enabled", True)
+# 重新编码的格式：jpeg 或 webp
+IMAGE_PREPROCESS_FORMAT = IMAGE_PREPROCESS_CONFIG.get("format", "jpeg").lower()
+IMAGE_PREPROCESS_QUALITY = int(IMAGE_PREPROCESS_CONFIG.get("quality", 85))
+# 各细节级别下长边的最大像素数，超出时等比缩小
+IMAGE_PREPROCESS_MAX_SIDE = IMAGE_PREPROCESS_CONFIG.get("max_side", {"low": 512, "high": 2048})
+# 按提供商覆盖 max_side，如 {"zhipu": {"low": 1024, "high": 1024}}
+IMAGE_PREPROCESS_PROVIDER_MAX_SIDE = IMAGE_PREPROCESS_CONFIG.get("provider_max_side", {})
+# 预处理线程池大小（缩放和编码在线程中执行，不阻塞事件循环）
+IMAGE_PREPROCESS_WORKERS = max(1, int(IMAGE_PREPROCESS_CONFIG.get("workers", 4)))
+
+# 批量图片分析：一次模型调用分析多张图片，要求模型返回JSON数组
+IMAGE_BATCHING_CONFIG = CONFIG.get("image_batching", {})
+IMAGE_BATCHING_ENABLED = IMAGE_BATCHING_CONFIG.get("enabled", True)
+# 每个提供商单次调用的最大图片数，实际批大小在 1 到该值之间自适应，default 用于未单独配置的提供商
+IMAGE_BATCHING_MAX_IMAGES = IMAGE_BATCHING_CONFIG.get("max_images_per_call", {"default": 4, "zhipu": 1})
+# 每张图片的最大输出token数，批量调用的 max_tokens 按图片数累加
+IMAGE_BATCHING_MAX_TOKENS_PER_IMAGE = int(IMAGE_BATCHING_CONFIG.get("max_tokens_per_image", 300))
+
+# PDF解析执行器配置（进程池）
+PARSE_EXECUTOR_CONFIG = CONFIG.get("parse_executor", {})
+PARSE_MAX_WORKERS = max(1, int(PARSE_EXECUTOR_CONFIG.get("max_workers", 2)))
+PARSE_MP_START_METHOD = PARSE_EXECUTOR_CONFIG.get("mp_start_method", "spawn")
+PARSE_PRELOAD_MODELS = PARSE_EXECUTOR_CONFIG.get("preload_models", True)
+PARSE_PRELOAD_LANGS = PARSE_EXECUTOR_CONFIG.get("preload_langs", ["ch"])
+PARSE_WARMUP_TIMEOUT = PARSE_EXECUTOR_CONFIG.get("warmup_timeout", 1800)
+
+# 页级解析缓存配置
+PAGE_CACHE_CONFIG = CONFIG.get("page_cache", {})
+PAGE_CACHE_ENABLED = PAGE_CACHE_CONFIG.get("enabled", True)
+PAGE_CACHE_RENDER_SCALE = PAGE_CACHE_CONFIG.get("render_scale", 1.0)
+
+# 批量推理配置：多个文档的待解析页合并到同一次 doc_analyze 调用
+BATCH_INFERENCE_CONFIG = CONFIG.get("batch_inference", {})
+BATCH_INFERENCE_ENABLED = BATCH_INFERENCE_CONFIG.get("enabled", True)
+# 每次 doc_analyze 调用的最大页数
+BATCH_PAGE_BUDGET = int(BATCH_INFERENCE_CONFIG.get("page_budget", 256))
+
+# 解析辅助文件（*_model.json / *_origin.pdf / *_layout.pdf）配置
+ARTIFACTS_CONFIG = CONFIG.get("artifacts", {})
+# 默认策略：none（不写）、minimal（只写紧凑的 model.json）、debug（全部写出）
+ARTIFACT_DEFAULT_POLICY = ARTIFACTS_CONFIG.get("default_policy", "none")
+
+# 大文档分片解析配置：按页段拆分到多个解析进程并行解析
+SHARDING_CONFIG = CONFIG.get("sharding", {})
+SHARDING_ENABLED = SHARDING_CONFIG.get("enabled", True)
+# 页数达到该值的文档才分片
+SHARD_MIN_DOCUMENT_PAGES = int(SHARDING_CONFIG.get("min_document_pages", 200))
+# 每个分片的最少页数，分片数不超过解析进程数
+SHARD_MIN_PAGES = int(SHARDING_CONFIG.get("min_shard_pages", 50))
+# 每个分片两侧额外解析的上下文页数，保证分片边界的跨页合并与整篇解析一致
+SHARD_CONTEXT_PAGES = int(SHARDING_CONFIG.get("context_pages", 1))
+
+# 流式输出配置：按页窗口解析，每个窗口完成后立即逐页输出Markdown
+STREAMING_CONFIG = CONFIG.get("streaming", {})
+# 每个解析窗口的页数，窗口按页序提交到解析进程池，同时运行的窗口数不超过解析进程数
+STREAM_WINDOW_PAGES = max(1, int(STREAMING_CONFIG.get("window_pages", 32)))
+
+# 原生文本页快速通道配置：method=auto 时文本层干净的页直接提取文本，不经过版面分析和OCR模型
+TEXT_FAST_PATH_CONFIG = CONFIG.get("text_fast_path", {})
+TEXT_FAST_PATH_ENABLED = TEXT_FAST_PATH_CONFIG.get("enabled", True)
+# 走文本通道的页至少包含的字符数（不含空白）
+TEXT_FAST_PATH_MIN_CHARS = int(TEXT_FAST_PATH_CONFIG.get("min_chars", 50))
+# 乱码字符（替换符、私有区字符、控制字符）的最大比例
+TEXT_FAST_PATH_MAX_GARBLED_RATIO = float(TEXT_FAST_PATH_CONFIG.get("max_garbled_ratio", 0.02))
+# 图片对象覆盖页面面积的最大比例
+TEXT_FAST_PATH_MAX_IMAGE_COVERAGE = float(TEXT_FAST_PATH_CONFIG.get("max_image_coverage", 0.1))
+# 路径对象（表格线、矢量图表）的最大数量
+TEXT_FAST_PATH_MAX_PATH_OBJECTS = int(TEXT_FAST_PATH_CONFIG.get("max_path_objects", 30))
+# 数学符号字符的最大比例，超过时交给模型做公式识别
+TEXT_FAST_PATH_MAX_FORMULA_RATIO = float(TEXT_FAST_PATH_CONFIG.get("max_formula_ratio", 0.01))
+
+# 解析队列准入控制：限制同时解析的文档数、排队页数和预估内存，超出时返回429/503和Retry-After
+ADMISSION_CONFIG = CONFIG.get("admission", {})
+ADMISSION_ENABLED = ADMISSION_CONFIG.get("enabled", True)
+# 同时解析的最大文档数（批量请求按文档数占用，超过上限时按上限计），实际生效值不超过 parse_executor.max_workers
+ADMISSION_MAX_CONCURRENT_DOCUMENTS = int(ADMISSION_CONFIG.get("max_concurrent_documents", 4))
+# 已受理但尚未开始解析的最大页数，超出时返回429
+ADMISSION_MAX_QUEUED_PAGES = int(ADMISSION_CONFIG.get("max_queued_pages", 2000))
+# 已受理请求（排队中和解析中）的预估内存上限，超出时返回503；应低于 ecosystem.config.js 中的 max_memory_restart
+ADMISSION_MAX_ESTIMATED_MEMORY_MB = float(ADMISSION_CONFIG.get("max_estimated_memory_gb", 40)) * 1024
+# 每个文档的基础内存估算（MB）
+ADMISSION_BASE_MEMORY_MB = float(ADMISSION_CONFIG.get("base_memory_mb", 512))
+# 每页的内存估算（MB）
+ADMISSION_MEMORY_PER_PAGE_MB = float(ADMISSION_CONFIG.get("memory_per_page_mb", 24))
+# 还没有解析记录时估算Retry-After所用的每页解析秒数
+ADMISSION_INITIAL_SECONDS_PER_PAGE = float(ADMISSION_CONFIG.get("initial_seconds_per_page", 1.0))
+# Retry-After 的最大秒数
+ADMISSION_MAX_RETRY_AFTER = int(ADMISSION_CONFIG.get("max_retry_after_seconds", 300))
+
+# 公平调度配置：解析和图片分析前按优先级和租户（X-API-Key / X-Client-Id 请求头）加权公平排队
+SCHEDULER_CONFIG = CONFIG.get("scheduler", {})
+SCHEDULER_ENABLED = SCHEDULER_CONFIG.get("enabled", True)
+# 是否允许客户端通过 X-Priority 请求头指定优先级
+SCHEDULER_ALLOW_PRIORITY_HEADER = SCHEDULER_CONFIG.get("allow_priority_header", True)
+# 优先级：weight 为权重，reserved_ratio 为该优先级保留、其他优先级不能占用的名额比例
+SCHEDULER_PRIORITY_CLASSES = SCHEDULER_CONFIG.get("priority_classes", {
+    "interactive": {"weight": 8, "reserved_ratio": 0.25},
+    "bulk": {"weight": 1, "reserved_ratio": 0}
+})
+# 单个租户同时解析的最大文档数
+SCHEDULER_TENANT_MAX_CONCURRENT_DOCUMENTS = int(SCHEDULER_CONFIG.get("tenant_max_concurrent_documents", 2))
+# 单个租户同时进行的最大图片分析数
+SCHEDULER_TENANT_MAX_CONCURRENT_IMAGES = int(SCHEDULER_CONFIG.get("tenant_max_concurrent_images", 8))
+# 所有请求共享的图片分析（视觉模型调用）名额
+SCHEDULER_IMAGE_ANALYSIS_SLOTS = int(SCHEDULER_CONFIG.get("image_analysis_slots", 16))
+# 按租户覆盖：{"client:xxx": {"weight": 2, "max_concurrent_documents": 4, "max_concurrent_images": 16}}
+SCHEDULER_TENANTS = SCHEDULER_CONFIG.get("tenants", {})
+
+# 相同PDF并发解析的单飞锁配置
+PARSE_LOCK_CONFIG = CONFIG.get("parse_lock", {})
+# 等待同一cache key的解析完成的最长时间（秒），超时后不再等待，自行解析
+PARSE_LOCK_TIMEOUT = PARSE_LOCK_CONFIG.get("timeout_seconds", 3600)
+
+# 异步任务配置
+JOBS_CONFIG = CONFIG.get("jobs", {})
+JOB_RESULT_TTL = JOBS_CONFIG.get("result_ttl_seconds", 86400)
+JOB_MAX_RECORDS = JOBS_CONFIG.get("max_records", 10000)
+
 # 文件设置（新增）
 FILE_SETTINGS_CONFIG = CONFIG.get("file_settings", {})
 MAX_FILENAME_LENGTH = FILE_SETTINGS_CONFIG.get("max_filename_length", 50)
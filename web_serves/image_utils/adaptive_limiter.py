@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+自适应并发限制 - 按提供商用 AIMD（加性增、乘性减）调整视觉模型调用的并发上限
+
+固定的并发数设高了会被提供商限流（429），设低了又用不满提供商的吞吐。每个提供商一个限流器：
+1. 调用成功且往返时延（RTT）不超过近期最小RTT的 latency_tolerance 倍时，上限每轮（约等于上限次成功）加1；
+2. RTT 明显升高说明提供商已在排队，上限保持不变；
+3. 429、5xx、超时或连接失败时上限乘以 decrease_factor；同一轮中已经发出的请求再失败不重复减小，
+   避免一次限流把上限连续减到最小值。
+
+上限在 min_limit 和 vision_clients.provider_max_concurrent 之间，当前上限和观测到的RTT见 get_stats。
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+import openai
+
+from web_serves.config import (
+    ADAPTIVE_CONCURRENCY_ENABLED,
+    ADAPTIVE_CONCURRENCY_INITIAL_LIMIT,
+    ADAPTIVE_CONCURRENCY_MIN_LIMIT,
+    ADAPTIVE_CONCURRENCY_DECREASE_FACTOR,
+    ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE,
+    ADAPTIVE_CONCURRENCY_RTT_WINDOW
+)
+
+# RTT 指数滑动平均的权重
+RTT_EWMA_ALPHA = 0.2
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """429、5xx、超时和连接失败说明提供商过载，需要降低并发"""
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                          asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class AIMDLimiter:
+    """单个提供商的自适应并发限流器，只在事件循环线程中使用"""
+
+    def __init__(self, name: str, max_limit: int):
+        """
+        初始化限流器
+
+        Args:
+            name: 提供商名称
+            max_limit: 并发上限的最大值
+        """
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = min(self.max_limit, max(1, ADAPTIVE_CONCURRENCY_MIN_LIMIT))
+        if ADAPTIVE_CONCURRENCY_ENABLED:
+            initial = ADAPTIVE_CONCURRENCY_INITIAL_LIMIT
+            self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        else:
+            self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._rtts: Deque[float] = deque(maxlen=ADAPTIVE_CONCURRENCY_RTT_WINDOW)
+        self._rtt_ewma: Optional[float] = None
+        self._last_decrease = 0.0
+        self._counters = {"successes": 0, "overloaded": 0, "errors": 0, "increases": 0, "decreases": 0}
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self) -> float:
+        """等待并发名额，返回开始时间（传给 release）"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # 已经拿到名额后被取消，归还名额
+                    self.in_flight -= 1
+                    self._wake()
+                raise
+        return time.monotonic()
+
+    def release(self, started_at: float, error: Optional[BaseException] = None) -> None:
+        """
+        归还名额并根据调用结果调整上限
+
+        Args:
+            started_at: acquire 返回的开始时间
+            error: 调用抛出的异常，成功时为None
+        """
+        self.in_flight -= 1
+        if error is None:
+            self._on_success(time.monotonic() - started_at)
+        elif isinstance(error, asyncio.CancelledError):
+            # 截止时间到达或对冲请求胜出后被取消，与提供商负载无关
+            pass
+        elif is_overload_error(error):
+            self._on_overload(started_at)
+        else:
+            # 其他错误（如请求参数错误）与提供商负载无关，不调整上限
+            self._counters["errors"] += 1
+        self._wake()
+
+    def _on_success(self, rtt: float) -> None:
+        self._counters["successes"] += 1
+        self._rtts.append(rtt)
+        self._rtt_ewma = rtt if self._rtt_ewma is None else self._rtt_ewma + RTT_EWMA_ALPHA * (rtt - self._rtt_ewma)
+        if not ADAPTIVE_CONCURRENCY_ENABLED or self.limit >= self.max_limit:
+            return
+        if rtt > min(self._rtts) * ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE:
+            return
+        previous = int(self.limit)
+        self.limit = min(float(self.max_limit), self.limit + 1.0 / max(1.0, self.limit))
+        if int(self.limit) > previous:
+            self._counters["increases"] += 1
+
+    def _on_overload(self, started_at: float) -> None:
+        self._counters["overloaded"] += 1
+        if not ADAPTIVE_CONCURRENCY_ENABLED or started_at < self._last_decrease:
+            return
+        self.limit = max(float(self.min_limit), self.limit * ADAPTIVE_CONCURRENCY_DECREASE_FACTOR)
+        self._last_decrease = time.monotonic()
+        self._counters["decreases"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取当前上限、占用、排队数和观测到的RTT"""
+        return {
+            "adaptive": ADAPTIVE_CONCURRENCY_ENABLED,
+            "limit": int(self.limit),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queued": sum(1 for waiter in self._waiters if not waiter.done()),
+            "rtt_ewma_seconds": round(self._rtt_ewma, 3) if self._rtt_ewma is not None else None,
+            "rtt_min_seconds": round(min(self._rtts), 3) if self._rtts else None,
+            **self._counters,
+        }
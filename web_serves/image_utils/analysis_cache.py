@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图片分析结果缓存 - 持久化视觉模型生成的标题和描述
+
+PDF解析结果有缓存，但图片分析每次都会重新调用视觉模型，重复上传同一文档仍要付出全部的模型延迟和费用。
+本模块用 diskcache 缓存 {title, description}，key 由图片内容的SHA256、提供商、模型、提示词摘要和细节级别组成：
+同一张图片出现在不同文档中也能命中，更换模型或提示词后自然失效。
+条目按 ttl_seconds 过期，磁盘占用超过 size_limit_mb 时淘汰最近最少使用的条目。
+"""
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+import diskcache as dc
+
+from web_serves.config import (
+    IMAGE_ANALYSIS_CACHE_TTL,
+    IMAGE_ANALYSIS_CACHE_SIZE_LIMIT_MB
+)
+from web_serves.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 图片分析缓存目录，与PDF解析缓存分开，清理解析缓存不会丢失已生成的图片描述
+ANALYSIS_CACHE_DIR = os.path.join(os.path.expanduser("."), ".cache", "remote_pdf_parse_serve_image_analysis")
+analysis_cache = dc.Cache(
+    ANALYSIS_CACHE_DIR,
+    size_limit=IMAGE_ANALYSIS_CACHE_SIZE_LIMIT_MB * 1024 ** 2,
+    eviction_policy="least-recently-used"
+)
+
+ANALYSIS_CACHE_KEY_PREFIX = "img_analysis_v1_"
+# 命中和未命中计数，保存在缓存中以便多个进程共享
+HITS_KEY = "__image_analysis_hits__"
+MISSES_KEY = "__image_analysis_misses__"
+# 只缓存这些字段，不缓存错误结果
+CACHED_FIELDS = ("title", "description")
+
+
+def hash_image_file(image_path: str) -> str:
+    """分块计算图片文件内容的SHA256"""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_analysis_cache_key(image_sha256: str, provider: str, model: str, prompt: str, detail: str) -> str:
+    """
+    生成图片分析缓存key
+
+    参数:
+        image_sha256: 图片内容的SHA256
+        provider: 提供商
+        model: 视觉模型名称
+        prompt: 提示词（只取摘要）
+        detail: 图像细节级别
+
+    返回:
+        缓存key
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    params = f"provider={provider}_model={model}_prompt={prompt_hash}_detail={detail}"
+    return f"{ANALYSIS_CACHE_KEY_PREFIX}{image_sha256}_{hashlib.md5(params.encode()).hexdigest()}"
+
+
+def get_cached_analysis(cache_key: str) -> Optional[Dict[str, Any]]:
+    """读取缓存的分析结果，未命中或读取失败时返回None"""
+    try:
+        result = analysis_cache.get(cache_key)
+        analysis_cache.incr(HITS_KEY if result is not None else MISSES_KEY)
+        return dict(result) if result is not None else None
+    except Exception as e:
+        logger.warning(f"图片分析缓存读取失败: {e}")
+        return None
+
+
+def save_analysis(cache_key: str, result: Dict[str, Any]) -> None:
+    """保存分析结果，带 error 的结果不缓存"""
+    if not isinstance(result, dict) or result.get("error"):
+        return
+    try:
+        analysis_cache.set(
+            cache_key,
+            {field: result.get(field, "") for field in CACHED_FIELDS},
+            expire=IMAGE_ANALYSIS_CACHE_TTL
+        )
+    except Exception as e:
+        logger.warning(f"图片分析缓存保存失败: {e}")
+
+
+def clear_analysis_cache() -> bool:
+    """清理图片分析缓存，返回是否成功"""
+    try:
+        analysis_cache.clear()
+        return True
+    except Exception as e:
+        logger.warning(f"图片分析缓存清理失败: {e}")
+        return False
+
+
+def get_analysis_cache_stats() -> Dict[str, Any]:
+    """获取图片分析缓存统计信息"""
+    try:
+        hits = analysis_cache.get(HITS_KEY, 0)
+        misses = analysis_cache.get(MISSES_KEY, 0)
+        return {
+            "cache_size": len(analysis_cache) - sum(int(key in analysis_cache) for key in (HITS_KEY, MISSES_KEY)),
+            "cache_directory": ANALYSIS_CACHE_DIR,
+            "disk_usage": analysis_cache.volume(),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    except Exception as e:
+        logger.warning(f"获取图片分析缓存统计信息失败: {e}")
+        return {}
@@ -6,16 +6,74 @@ import asyncio
 import time
 import json
 import logging
-from typing import Dict, Any, List, Union, Optional
+import math
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Union, Optional, Callable, Set, Tuple
 from PIL import Image
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
 
-from web_serves.config import app_config
-from web_serves.image_utils.prompts import get_image_analysis_prompt
-from web_serves.image_utils.image_analysis_utils import extract_json_content, image_to_base64_async
+from web_serves.config import (
+    app_config,
+    IMAGE_ANALYSIS_CACHE_ENABLED,
+    IMAGE_PREPROCESS_ENABLED,
+    IMAGE_BATCHING_ENABLED,
+    IMAGE_BATCHING_MAX_TOKENS_PER_IMAGE,
+    IMAGE_RETRY_DEADLINE,
+    IMAGE_HEDGING_ENABLED,
+    IMAGE_HEDGING_PROVIDER,
+    IMAGE_HEDGING_MODEL,
+    MOCK_VISION_BASE_URL
+)
+from web_serves.image_utils.prompts import get_image_analysis_prompt, get_batch_image_analysis_prompt
+from web_serves.image_utils.batch_analysis import batch_sizes, record_batch, record_single
+from web_serves.image_utils.resilience import call_with_retry, hedged_call, hedge_delay, record_latency
+from web_serves.image_utils.provider_router import get_provider_router
+from web_serves.image_utils.image_analysis_utils import (
+    extract_json_content,
+    extract_json_array_content,
+    image_to_base64_async,
+    prepare_image_payload_async,
+    get_max_side
+)
+from web_serves.image_utils.client_registry import get_vision_client, provider_slot
+from web_serves.image_utils.analysis_cache import (
+    hash_image_file,
+    make_analysis_cache_key,
+    get_cached_analysis,
+    save_analysis
+)
+from web_serves.utils.scheduler import ScheduleKey, image_scheduler
 load_dotenv()
 
+# 正在进行的分析（缓存key -> 结果Future），并发处理的多个文档包含同一张图片时只调用一次模型
+_inflight_analyses: Dict[str, asyncio.Future] = {}
+
+# 当前请求的图片预处理统计 [图片数, 原始字节数, 发送字节数]，同一请求内并发的分析任务共享
+_preprocess_totals: ContextVar[Optional[List[int]]] = ContextVar("preprocess_totals", default=None)
+
+
+@contextmanager
+def _track_preprocess():
+    """汇总一次请求中所有图片的预处理字节数，结束时输出一条日志；已在汇总中时沿用外层的统计"""
+    if _preprocess_totals.get() is not None:
+        yield
+        return
+    totals = [0, 0, 0]
+    token = _preprocess_totals.set(totals)
+    try:
+        yield
+    finally:
+        _preprocess_totals.reset(token)
+        image_count, original_bytes, sent_bytes = totals
+        if image_count:
+            logging.info(
+                f"图片预处理 {image_count} 张图片: {original_bytes} -> {sent_bytes} 字节，"
+                f"节省 {original_bytes - sent_bytes} 字节"
+            )
+
 
 class AsyncImageAnalysis:
     """
@@ -50,6 +108,15 @@ class AsyncImageAnalysis:
             "base_url_env": "OPENAI_API_BASE",
             "model_env": "OPENAI_VISION_MODEL",
             "default_models": ["gpt-4-vision-preview", "gpt-4o"]
+        },
+        # 本地模拟服务（utils/mock_vision_server.py），未设置环境变量时使用默认密钥和地址，用于离线压测
+        "local_mock": {
+            "api_key_env": "LOCAL_MOCK_API_KEY",
+            "base_url_env": "LOCAL_MOCK_BASE_URL",
+            "model_env": "LOCAL_MOCK_VISION_MODEL",
+            "default_models": ["mock-vision"],
+            "default_api_key": "local-mock",
+            "default_base_url": MOCK_VISION_BASE_URL
         }
     }
 
@@ -61,17 +128,22 @@ class AsyncImageAnalysis:
         vision_model: str = None,
         prompt: Optional[str] = None,
         max_concurrent: int = 5,
+        schedule_key: Optional[ScheduleKey] = None,
+        use_cache: bool = True,
     ):
         """
         初始化图像分析器
         
         Args:
-            provider: API提供商，支持 'guiji', 'zhipu', 'volces', 'openai'
+            provider: API提供商，支持 'guiji', 'zhipu', 'volces', 'openai', 'local_mock'
             api_key: API密钥，如果不提供则从环境变量读取
             base_url: API基础URL，如果不提供则从环境变量读取
             vision_model: 视觉模型名称，如果不提供则从环境变量或默认值读取
             prompt: 自定义提示词
-            max_concurrent: 最大并发数
+            max_concurrent: 单次 analyze_multiple_images 中同时分析的最大图片数；
+                对提供商的总并发由所有请求共享的自适应限流器控制（见 adaptive_limiter.py）
+            schedule_key: 调度键（租户和优先级），模型调用在全局图片分析调度器中按该键公平排队
+            use_cache: 是否读写图片分析结果缓存（本地图片按内容摘要缓存）
         """
         self.provider = provider.lower()
         
@@ -81,12 +153,12 @@ class AsyncImageAnalysis:
         config = self.PROVIDER_CONFIGS[self.provider]
         
         # 获取API密钥
-        self.api_key = api_key or os.getenv(config["api_key_env"])
+        self.api_key = api_key or os.getenv(config["api_key_env"]) or config.get("default_api_key")
         if not self.api_key:
             raise ValueError(f"API密钥未提供，请设置 {config['api_key_env']} 环境变量，或传入api_key参数。")
 
         # 获取基础URL
-        self.base_url = base_url or os.getenv(config["base_url_env"])
+        self.base_url = base_url or os.getenv(config["base_url_env"]) or config.get("default_base_url")
         if not self.base_url:
             raise ValueError(f"基础URL未提供，请设置 {config['base_url_env']} 环境变量，或传入base_url参数。")
         
@@ -99,12 +171,11 @@ class AsyncImageAnalysis:
         print(f"API基础URL: {self.base_url}")
         print(f"视觉模型: {self.vision_model}")
         
-        self.client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
+        # 应用级共享客户端，连接池在请求之间复用长连接
+        self.client = get_vision_client(self.provider, self.api_key, self.base_url)
 
-        # 设置提示词
+        # 设置提示词，自定义提示词无法改写为批量形式，不使用批量分析
+        self._custom_prompt = bool(prompt)
         if prompt:
             self._prompt = prompt
         else:
@@ -113,8 +184,12 @@ class AsyncImageAnalysis:
                 description_max_length=app_config.ai_services.description_max_length
             )
         
-        # 设置并发限制
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max(1, max_concurrent)
+        self.schedule_key = schedule_key
+        self._hedge_target = self._resolve_hedge_target()
+        # 开启 provider_routing 时模型调用由全局路由器分散到多个提供商，provider 只决定提示词和图片缩放尺寸
+        self._router = get_provider_router(self.PROVIDER_CONFIGS)
+        self.use_cache = use_cache and IMAGE_ANALYSIS_CACHE_ENABLED
 
     async def analyze_image(
         self,
@@ -124,6 +199,7 @@ class AsyncImageAnalysis:
         detail: str = "low",
         prompt: str = None,
         temperature: float = 0.1,
+        image_sha256: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         异步分析图像并返回描述信息。
@@ -135,69 +211,353 @@ class AsyncImageAnalysis:
             detail: 图像细节级别，'low'或'high'
             prompt: 自定义提示词
             temperature: 模型温度参数
+            image_sha256: 本地图片内容的SHA256，调用方已计算时传入，避免重复读取文件
 
         Returns:
             包含title和description的字典
         """
-        async with self.semaphore:  # 限制并发
-            # 基本参数检查
-            if not image_url and not local_image_path:
-                raise ValueError("必须提供一个图像来源：image_url或local_image_path")
-            if image_url and local_image_path:
-                raise ValueError("只能提供一个图像来源：image_url或local_image_path")
-
-            # 处理图像来源
-            final_image_url = image_url
-            image_format = "jpeg"  # 默认格式
-            
-            if local_image_path:
-                # 简化图片格式处理
-                try:
-                    # 在异步环境中处理PIL操作
-                    loop = asyncio.get_event_loop()
-                    def get_image_format():
-                        with Image.open(local_image_path) as img:
-                            return img.format.lower() if img.format else "jpeg"
-                    
-                    image_format = await loop.run_in_executor(None, get_image_format)
-                except Exception as e:
-                    logging.warning(f"无法打开或识别图片格式 {local_image_path}: {e}, 使用默认jpeg")
-
-                base64_image = await image_to_base64_async(local_image_path)
-                final_image_url = f"data:image/{image_format};base64,{base64_image}"
-
+        # 基本参数检查
+        if not image_url and not local_image_path:
+            raise ValueError("必须提供一个图像来源：image_url或local_image_path")
+        if image_url and local_image_path:
+            raise ValueError("只能提供一个图像来源：image_url或local_image_path")
+
+        # 单独调用时按一次请求汇总预处理字节数；由 analyze_multiple_images 调用时计入整批的统计
+        with _track_preprocess():
             model_to_use = model or self.vision_model
             prompt_text = prompt or self._prompt
 
+            # 本地图片先查缓存，命中时不做base64编码也不调用模型
+            cache_key, cached_result = await self._lookup_cache(local_image_path, image_sha256, model_to_use, prompt_text, detail)
+            if cached_result is not None:
+                return cached_result
+
+            if cache_key is None:
+                return await self._request_analysis(image_url, local_image_path, model_to_use, prompt_text, detail, temperature)
+
+            # 其他文档正在分析同一张图片时等待其结果，不重复调用模型
+            loop = asyncio.get_running_loop()
+            pending = _inflight_analyses.get(cache_key)
+            if pending is not None and pending.get_loop() is loop:
+                return dict(await asyncio.shield(pending))
+
+            future = loop.create_future()
+            _inflight_analyses[cache_key] = future
             try:
-                response = await self.client.chat.completions.create(
-                    model=model_to_use,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image_url",
-                                    "image_url": {"url": final_image_url, "detail": detail},
-                                },
-                                {"type": "text", "text": prompt_text},
-                            ],
-                        }
-                    ],
-                    temperature=temperature,
-                    max_tokens=300,
+                analysis_result = await self._request_analysis(
+                    image_url, local_image_path, model_to_use, prompt_text, detail, temperature
                 )
+                await asyncio.to_thread(save_analysis, cache_key, analysis_result)
+                future.set_result(analysis_result)
+                return analysis_result
+            finally:
+                if not future.done():
+                    future.set_result({"error": "图片分析被取消", "title": "", "description": ""})
+                if _inflight_analyses.get(cache_key) is future:
+                    del _inflight_analyses[cache_key]
 
-                # 解析结果
-                result_content = response.choices[0].message.content
-                analysis_result = extract_json_content(result_content)
+    async def _lookup_cache(
+        self,
+        local_image_path: Optional[str],
+        image_sha256: Optional[str],
+        model_to_use: str,
+        prompt_text: str,
+        detail: str,
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """查询图片分析缓存，返回 (缓存key, 缓存结果)；不使用缓存时缓存key为None"""
+        if not local_image_path or not self.use_cache:
+            return None, None
+        try:
+            image_sha256 = image_sha256 or await asyncio.to_thread(hash_image_file, local_image_path)
+        except OSError as e:
+            logging.warning(f"计算图片摘要失败 {local_image_path}: {e}, 不使用缓存")
+            return None, None
+        # 开启路由时实际调用的提供商和模型由路由器选择，缓存key使用路由目标集合而不是实例的提供商和模型
+        provider, model = self._router.cache_identity() if self._router is not None else (self.provider, model_to_use)
+        cache_key = make_analysis_cache_key(image_sha256, provider, model, prompt_text, detail)
+        return cache_key, await asyncio.to_thread(get_cached_analysis, cache_key)
+
+    async def _build_image_url(self, image_url: Optional[str], local_image_path: Optional[str], detail: str) -> str:
+        """在线图片直接返回URL，本地图片编码为 data URL"""
+        # 处理图像来源
+        final_image_url = image_url
+        
+        if local_image_path and IMAGE_PREPROCESS_ENABLED:
+            # 缩放到模型实际使用的分辨率并重新编码，不为模型会丢弃的像素付出带宽和编码开销
+            payload = await prepare_image_payload_async(local_image_path, get_max_side(self.provider, detail))
+            final_image_url = f"data:image/{payload.mime_format};base64,{payload.base64_data}"
+            totals = _preprocess_totals.get()
+            if totals is not None:
+                totals[0] += 1
+                totals[1] += payload.original_bytes
+                totals[2] += payload.sent_bytes
+            logging.debug(
+                f"图片预处理 {os.path.basename(local_image_path)}: {payload.original_bytes} -> {payload.sent_bytes} 字节"
+                f"{'（已缩放）' if payload.resized else ''}"
+            )
+        elif local_image_path:
+            image_format = "jpeg"  # 默认格式
+            # 简化图片格式处理
+            try:
+                # 在异步环境中处理PIL操作
+                loop = asyncio.get_event_loop()
+                def get_image_format():
+                    with Image.open(local_image_path) as img:
+                        return img.format.lower() if img.format else "jpeg"
                 
-                return analysis_result
+                image_format = await loop.run_in_executor(None, get_image_format)
+            except Exception as e:
+                logging.warning(f"无法打开或识别图片格式 {local_image_path}: {e}, 使用默认jpeg")
+
+            base64_image = await image_to_base64_async(local_image_path)
+            final_image_url = f"data:image/{image_format};base64,{base64_image}"
+
+        return final_image_url
+
+    async def _call_model(
+        self,
+        target: Tuple[AsyncOpenAI, str, str],
+        content: List[Dict[str, Any]],
+        temperature: float,
+        max_tokens: int,
+        cost: float,
+        started: Optional[asyncio.Event] = None,
+    ) -> str:
+        """按租户公平排队、占用提供商的并发名额后调用一次模型，返回输出文本"""
+        client, provider, model_to_use = target
+        # 先按租户公平排队，再占用提供商的全局并发名额
+        async with image_scheduler.slot(self.schedule_key, cost=cost), provider_slot(provider):
+            if started is not None:
+                started.set()
+            start_time = time.monotonic()
+            response = await client.chat.completions.create(
+                model=model_to_use,
+                messages=[{"role": "user", "content": content}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            record_latency(provider, model_to_use, time.monotonic() - start_time)
+        return response.choices[0].message.content
+
+    async def _complete(
+        self,
+        content: List[Dict[str, Any]],
+        model_to_use: str,
+        temperature: float,
+        max_tokens: int,
+        cost: float = 1.0,
+        hedge: bool = True,
+    ) -> str:
+        """按重试策略调用模型；开启对冲时，调用超过近期p95时延后向备用提供商或模型发出同样的请求"""
+        deadline_at = time.monotonic() + IMAGE_RETRY_DEADLINE
+        started = asyncio.Event()
+
+        def attempt(target: Tuple[AsyncOpenAI, str, str], started_event: Optional[asyncio.Event] = None):
+            return lambda: call_with_retry(
+                lambda: self._call_model(target, content, temperature, max_tokens, cost, started_event),
+                deadline_at,
+                f"{target[1]}/{target[2]} 图片分析"
+            )
 
+        if self._router is not None:
+            # 每次尝试由路由器选择目标，重试时优先转移到本次还没有失败过的提供商
+            failed: Set[str] = set()
+
+            async def routed_call() -> str:
+                route = self._router.pick(exclude=failed, image_count=int(cost))
+                client = get_vision_client(route.provider, route.api_key, route.base_url)
+                try:
+                    result_content = await self._call_model(
+                        (client, route.provider, route.model), content, temperature, max_tokens, cost, started
+                    )
+                except asyncio.CancelledError:
+                    self._router.record_cancelled(route)
+                    raise
+                except Exception:
+                    self._router.record_failure(route)
+                    failed.add(route.key)
+                    raise
+                self._router.record_success(route)
+                return result_content
+
+            primary = lambda: call_with_retry(routed_call, deadline_at, "多提供商路由图片分析")
+        else:
+            primary = attempt((self.client, self.provider, model_to_use), started)
+        hedge_target = self._hedge_target if hedge else None
+        if hedge_target is None or hedge_target[1:] == (self.provider, model_to_use):
+            return await primary()
+        delay = hedge_delay(self.provider, model_to_use)
+        if delay is None:
+            return await primary()
+        return await hedged_call(primary, attempt(hedge_target), delay, started)
+
+    def _resolve_hedge_target(self) -> Optional[Tuple[AsyncOpenAI, str, str]]:
+        """返回对冲请求使用的 (客户端, 提供商, 模型)，未开启或备用提供商未配置时返回None"""
+        if not IMAGE_HEDGING_ENABLED:
+            return None
+        provider = (IMAGE_HEDGING_PROVIDER or self.provider).lower()
+        if provider == self.provider:
+            return (self.client, provider, IMAGE_HEDGING_MODEL) if IMAGE_HEDGING_MODEL else None
+        config = self.PROVIDER_CONFIGS.get(provider)
+        api_key = (os.getenv(config["api_key_env"]) or config.get("default_api_key")) if config else None
+        base_url = (os.getenv(config["base_url_env"]) or config.get("default_base_url")) if config else None
+        if not api_key or not base_url:
+            logging.warning(f"对冲提供商 {provider} 未配置API密钥或基础URL，不使用对冲请求")
+            return None
+        model_to_use = IMAGE_HEDGING_MODEL or os.getenv(config["model_env"]) or config["default_models"][0]
+        return get_vision_client(provider, api_key, base_url), provider, model_to_use
+
+    async def _request_analysis(
+        self,
+        image_url: Optional[str],
+        local_image_path: Optional[str],
+        model_to_use: str,
+        prompt_text: str,
+        detail: str,
+        temperature: float,
+    ) -> Dict[str, Any]:
+        """编码图片并调用视觉模型，失败时返回带 error 的结果"""
+        final_image_url = await self._build_image_url(image_url, local_image_path, detail)
+
+        try:
+            start_time = time.monotonic()
+            result_content = await self._complete(
+                [
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": final_image_url, "detail": detail},
+                    },
+                    {"type": "text", "text": prompt_text},
+                ],
+                model_to_use,
+                temperature,
+                max_tokens=300,
+            )
+            record_single(time.monotonic() - start_time)
+
+            # 解析结果
+            analysis_result = extract_json_content(result_content)
+            
+            return analysis_result
+
+        except Exception as e:
+            # 错误处理
+            logging.error(f"API调用失败: {e}")
+            return {"error": f"API调用失败: {str(e)}", "title": "", "description": ""}
+
+    async def _request_batch_analysis(
+        self,
+        image_sources: List[Dict[str, Any]],
+        model_to_use: str,
+        detail: str,
+        temperature: float,
+    ) -> List[Optional[Dict[str, Any]]]:
+        """一次调用分析多张图片，返回与图片一一对应的结果，模型没有返回结果的位置为None"""
+        image_count = len(image_sources)
+        start_time = time.monotonic()
+        try:
+            image_urls = await asyncio.gather(*[
+                self._build_image_url(source.get("image_url"), source.get("local_image_path"), detail)
+                for source in image_sources
+            ])
+            content = [{"type": "image_url", "image_url": {"url": url, "detail": detail}} for url in image_urls]
+            content.append({"type": "text", "text": get_batch_image_analysis_prompt(
+                image_count,
+                title_max_length=app_config.ai_services.title_max_length,
+                description_max_length=app_config.ai_services.description_max_length
+            )})
+            # 批量请求只重试不对冲，备用提供商的单次图片数上限可能不同
+            result_content = await self._complete(
+                content,
+                model_to_use,
+                temperature,
+                max_tokens=IMAGE_BATCHING_MAX_TOKENS_PER_IMAGE * image_count,
+                cost=image_count,
+                hedge=False,
+            )
+            results = extract_json_array_content(result_content, image_count)
+        except Exception as e:
+            logging.warning(f"批量分析调用失败（{image_count}张图片）: {e}, 改为逐张分析")
+            results = [None] * image_count
+        elapsed = time.monotonic() - start_time
+
+        returned = sum(result is not None for result in results)
+        if returned == image_count:
+            batch_sizes.on_complete(self.provider)
+        else:
+            batch_sizes.on_incomplete(self.provider)
+        record_batch(image_count, returned, elapsed)
+        logging.info(
+            f"批量分析 {image_count} 张图片，返回 {returned} 张，耗时 {elapsed:.2f} 秒"
+            f"（每张 {elapsed / image_count:.2f} 秒），节省 {max(0, returned - 1)} 次调用"
+        )
+        return results
+
+    async def _analyze_batched(
+        self,
+        image_sources: List[Dict[str, Any]],
+        model_to_use: str,
+        detail: str,
+        temperature: float,
+        on_result: Optional[Callable[[int, Dict[str, Any]], None]],
+    ) -> List[Dict[str, Any]]:
+        """批量模式：先查缓存，未命中的图片按自适应批大小打包调用，缺失结果的图片逐张重新分析"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(image_sources)
+
+        def finish(index: int, result: Dict[str, Any]) -> None:
+            results[index] = result
+            if on_result:
+                on_result(index, result)
+
+        lookups = await asyncio.gather(*[
+            self._lookup_cache(source.get("local_image_path"), source.get("image_sha256"), model_to_use, self._prompt, detail)
+            for source in image_sources
+        ])
+        pending = deque()
+        for index, (cache_key, cached_result) in enumerate(lookups):
+            if cached_result is not None:
+                finish(index, cached_result)
+            else:
+                pending.append((index, cache_key))
+
+        async def analyze_one(index: int, cache_key: Optional[str]) -> None:
+            source = image_sources[index]
+            try:
+                result = await self._request_analysis(
+                    source.get("image_url"), source.get("local_image_path"), model_to_use, self._prompt, detail, temperature
+                )
             except Exception as e:
-                # 错误处理
-                logging.error(f"API调用失败: {e}")
-                return {"error": f"API调用失败: {str(e)}", "title": "", "description": ""}
+                result = {"error": f"处理第{index+1}张图像时出错: {str(e)}", "title": "图片处理出错", "description": "图片处理出错"}
+            if cache_key:
+                await asyncio.to_thread(save_analysis, cache_key, result)
+            finish(index, result)
+
+        async def worker() -> None:
+            # 每批开始前读取当前批大小，同一文档内也能根据前面批次的结果调整
+            while pending:
+                batch = [pending.popleft() for _ in range(min(batch_sizes.current(self.provider), len(pending)))]
+                if len(batch) == 1:
+                    await analyze_one(*batch[0])
+                    # 批大小退到1后，单张成功时逐步恢复，重新尝试批量调用
+                    if not results[batch[0][0]].get("error"):
+                        batch_sizes.on_complete(self.provider)
+                    continue
+                batch_results = await self._request_batch_analysis(
+                    [image_sources[index] for index, _ in batch], model_to_use, detail, temperature
+                )
+                missing = []
+                for (index, cache_key), result in zip(batch, batch_results):
+                    if result is None:
+                        missing.append(analyze_one(index, cache_key))
+                        continue
+                    if cache_key:
+                        await asyncio.to_thread(save_analysis, cache_key, result)
+                    finish(index, result)
+                await asyncio.gather(*missing)
+
+        workers = min(self.max_concurrent, math.ceil(len(pending) / batch_sizes.current(self.provider)))
+        await asyncio.gather(*[worker() for _ in range(workers)])
+        return results
 
     async def analyze_multiple_images(
         self,
@@ -206,54 +566,73 @@ class AsyncImageAnalysis:
         detail: str = "low",
         prompt: str = None,
         temperature: float = 0.1,
+        on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
     ) -> List[Dict[str, Any]]:
         """
         批量异步分析多张图像。
 
         Args:
-            image_sources: 图像源列表，每个元素为包含image_url或local_image_path的字典
+            image_sources: 图像源列表，每个元素为包含image_url或local_image_path的字典，
+                本地图片可附带已计算的 image_sha256
             model: 使用的视觉模型
             detail: 图像细节级别
             prompt: 自定义提示词
             temperature: 模型温度参数
+            on_result: 可选回调，每张图像分析完成时以(序号, 分析结果)调用，用于上报进度
 
         Returns:
             包含所有图像分析结果的列表
         """
-        tasks = []
-        for source in image_sources:
-            task = self.analyze_image(
-                image_url=source.get("image_url"),
-                local_image_path=source.get("local_image_path"),
-                model=model,
-                detail=detail,
-                prompt=prompt,
-                temperature=temperature,
-            )
-            tasks.append(task)
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # 处理异常
-        processed_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                processed_results.append({
-                    "error": f"处理第{i+1}张图像时出错: {str(result)}",
-                    "title": "图片处理出错",
-                    "description": "图片处理出错"
-                })
-                print(f"处理第{i+1}张图像时出错: {str(result)}")
-            else:
-                processed_results.append(result)
-        
-        return processed_results
+        # 整批图片（包括批量调用和逐张调用）的预处理字节数汇总为一条日志
+        with _track_preprocess():
+            model_to_use = model or self.vision_model
+            if (IMAGE_BATCHING_ENABLED and not prompt and not self._custom_prompt
+                    and len(image_sources) > 1 and batch_sizes.limit(self.provider) > 1):
+                return await self._analyze_batched(image_sources, model_to_use, detail, temperature, on_result)
+
+            # 只限制本批次同时进行的图片数，对提供商的总并发由全局限流控制
+            batch_limit = asyncio.Semaphore(self.max_concurrent)
+
+            async def analyze_and_report(index: int, source: Dict[str, Any]) -> Dict[str, Any]:
+                async with batch_limit:
+                    result = await self.analyze_image(
+                        image_url=source.get("image_url"),
+                        local_image_path=source.get("local_image_path"),
+                        model=model,
+                        detail=detail,
+                        prompt=prompt,
+                        temperature=temperature,
+                        image_sha256=source.get("image_sha256"),
+                    )
+                if on_result:
+                    on_result(index, result)
+                return result
+
+            tasks = [analyze_and_report(i, source) for i, source in enumerate(image_sources)]
+
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+            # 处理异常
+            processed_results = []
+            for i, result in enumerate(results):
+                if isinstance(result, Exception):
+                    processed_results.append({
+                        "error": f"处理第{i+1}张图像时出错: {str(result)}",
+                        "title": "图片处理出错",
+                        "description": "图片处理出错"
+                    })
+                    print(f"处理第{i+1}张图像时出错: {str(result)}")
+                else:
+                    processed_results.append(result)
+
+            return processed_results
 
     async def close(self):
         """
-        关闭异步客户端连接
+        释放分析器。客户端由 client_registry 在应用生命周期内共享，这里不关闭连接，
+        应用关闭时由 close_shared_clients 统一释放
         """
-        await self.client.close()
+        self.client = None
 
     async def __aenter__(self):
         """异步上下文管理器入口"""
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量图片分析 - 自适应批大小和调用统计
+
+逐张分析时每张图片都是一次模型调用，完整的提示词重复发送，图片多的文档主要耗在单次调用开销和提供商的速率限制上。
+批量模式把多张图片放进同一个多模态请求，要求模型按顺序返回JSON数组（见 prompts.get_batch_image_analysis_prompt）。
+
+每个提供商的批大小在 1 到 image_batching.max_images_per_call 之间自适应：
+整批成功时加1，返回结果不完整或调用失败时减半（提供商限制单次图片数、输出被截断时会很快退到可用的大小）。
+缺失结果的图片由调用方逐张重新分析。
+"""
+from collections import Counter
+from typing import Any, Dict
+
+from web_serves.config import IMAGE_BATCHING_MAX_IMAGES
+
+
+class AdaptiveBatchSize:
+    """按提供商自适应的批大小，只在事件循环线程中使用"""
+
+    def __init__(self):
+        self._sizes: Dict[str, int] = {}
+
+    @staticmethod
+    def limit(provider: str) -> int:
+        """提供商单次调用的最大图片数"""
+        return max(1, int(IMAGE_BATCHING_MAX_IMAGES.get(provider, IMAGE_BATCHING_MAX_IMAGES.get("default", 4))))
+
+    def current(self, provider: str) -> int:
+        """当前批大小，初始为上限"""
+        return self._sizes.get(provider, self.limit(provider))
+
+    def on_complete(self, provider: str) -> None:
+        """整批都返回了结果，批大小加1"""
+        self._sizes[provider] = min(self.limit(provider), self.current(provider) + 1)
+
+    def on_incomplete(self, provider: str) -> None:
+        """部分结果缺失或调用失败，批大小减半"""
+        self._sizes[provider] = max(1, self.current(provider) // 2)
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {provider: {"current": size, "limit": self.limit(provider)} for provider, size in self._sizes.items()}
+
+
+batch_sizes = AdaptiveBatchSize()
+
+# 本进程累计的批量调用统计
+_stats: Counter = Counter()
+_seconds: Counter = Counter()
+
+
+def record_batch(image_count: int, returned: int, seconds: float) -> None:
+    """
+    记录一次批量调用
+
+    参数:
+        image_count: 请求中的图片数
+        returned: 模型返回了结果的图片数
+        seconds: 调用耗时（秒）
+    """
+    _stats["batches"] += 1
+    _stats["batched_images"] += image_count
+    _stats["fallback_images"] += image_count - returned
+    # 返回结果的图片如果逐张分析需要 returned 次调用，批量只用了1次
+    _stats["calls_saved"] += max(0, returned - 1)
+    _seconds["batched"] += seconds
+
+
+def record_single(seconds: float) -> None:
+    """记录一次逐张分析的调用"""
+    _stats["single_calls"] += 1
+    _seconds["single"] += seconds
+
+
+def get_batching_stats() -> Dict[str, Any]:
+    """获取调用节省数、每张图片的平均耗时和各提供商当前批大小"""
+    batched_images = _stats["batched_images"]
+    single_calls = _stats["single_calls"]
+    return {
+        **{key: _stats[key] for key in ("batches", "batched_images", "fallback_images", "calls_saved", "single_calls")},
+        "seconds_per_image_batched": round(_seconds["batched"] / batched_images, 3) if batched_images else None,
+        "seconds_per_image_single": round(_seconds["single"] / single_calls, 3) if single_calls else None,
+        "batch_sizes": batch_sizes.get_stats(),
+    }
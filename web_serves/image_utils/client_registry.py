@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+视觉模型客户端注册表 - 应用生命周期内共享的提供商客户端和并发限制
+
+每个文档都新建 AsyncOpenAI 客户端时，每次都要重新建立TLS连接，处理完又全部关闭。
+本模块按 (提供商, base_url, API密钥) 缓存 AsyncOpenAI 客户端，底层 httpx 连接池保持长连接；
+上传图片用的 aiohttp 会话同样共享。每个提供商一个全局自适应限流器（见 adaptive_limiter.py），
+所有请求对该提供商的并发调用总数按调用结果在 min_limit 和 provider_max_concurrent 之间调整。
+
+客户端和限流器都绑定创建时的事件循环：在新的事件循环中（如脚本多次 asyncio.run）使用时会重新创建。
+应用关闭时调用 close_shared_clients 释放连接。
+"""
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import aiohttp
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from web_serves.image_utils.adaptive_limiter import AIMDLimiter
+
+from web_serves.config import (
+    VISION_MAX_CONNECTIONS,
+    VISION_MAX_KEEPALIVE_CONNECTIONS,
+    VISION_KEEPALIVE_EXPIRY,
+    VISION_TIMEOUT,
+    VISION_PROVIDER_MAX_CONCURRENT
+)
+from web_serves.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_clients: Dict[Tuple[str, str, str], AsyncOpenAI] = {}
+_limiters: Dict[str, AIMDLimiter] = {}
+_upload_session: Optional[aiohttp.ClientSession] = None
+
+
+def _bind_current_loop() -> None:
+    """事件循环变化时丢弃旧循环上的客户端和限流器（旧循环已关闭，无法再复用）"""
+    global _loop, _upload_session
+    loop = asyncio.get_running_loop()
+    if loop is not _loop:
+        _loop = loop
+        _clients.clear()
+        _limiters.clear()
+        _upload_session = None
+
+
+def get_provider_concurrency(provider: str) -> int:
+    """返回提供商的全局最大并发调用数（自适应上限的最大值）"""
+    return max(1, int(VISION_PROVIDER_MAX_CONCURRENT.get(provider, VISION_PROVIDER_MAX_CONCURRENT.get("default", 8))))
+
+
+def get_vision_client(provider: str, api_key: str, base_url: str) -> AsyncOpenAI:
+    """
+    获取共享的 AsyncOpenAI 客户端，不存在时创建
+
+    参数:
+        provider: 提供商名称
+        api_key: API密钥
+        base_url: API基础URL
+
+    返回:
+        共享客户端，调用方不要关闭
+    """
+    _bind_current_loop()
+    key = (provider, base_url, hashlib.sha256(api_key.encode()).hexdigest())
+    client = _clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=VISION_TIMEOUT,
+            # 重试由 resilience.call_with_retry 负责，每次限流都能被自适应限流器观察到
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=VISION_MAX_CONNECTIONS,
+                    max_keepalive_connections=VISION_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=VISION_KEEPALIVE_EXPIRY
+                )
+            )
+        )
+        _clients[key] = client
+        logger.info(f"创建共享视觉模型客户端: provider={provider}, base_url={base_url}")
+    return client
+
+
+def get_provider_limiter(provider: str) -> AIMDLimiter:
+    """获取提供商的全局限流器，不存在时创建"""
+    _bind_current_loop()
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = _limiters[provider] = AIMDLimiter(provider, get_provider_concurrency(provider))
+    return limiter
+
+
+@asynccontextmanager
+async def provider_slot(provider: str) -> AsyncIterator[None]:
+    """占用提供商的一个全局并发名额，退出时按调用结果（成功耗时或异常类型）调整并发上限"""
+    limiter = get_provider_limiter(provider)
+    started_at = await limiter.acquire()
+    try:
+        yield
+    except BaseException as e:
+        limiter.release(started_at, e)
+        raise
+    limiter.release(started_at)
+
+
+def get_upload_session() -> aiohttp.ClientSession:
+    """获取共享的 aiohttp 会话，用于把图片上传到本服务的 /upload/image"""
+    global _upload_session
+    _bind_current_loop()
+    if _upload_session is None or _upload_session.closed:
+        _upload_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=VISION_MAX_CONNECTIONS, keepalive_timeout=VISION_KEEPALIVE_EXPIRY)
+        )
+    return _upload_session
+
+
+def get_client_registry_stats() -> Dict[str, Any]:
+    """获取共享客户端和各提供商的并发上限、占用及观测到的RTT"""
+    return {
+        "clients": [{"provider": provider, "base_url": base_url} for provider, base_url, _ in _clients],
+        "providers": {provider: limiter.get_stats() for provider, limiter in _limiters.items()},
+    }
+
+
+async def close_shared_clients() -> None:
+    """关闭所有共享客户端和上传会话，应用关闭时调用"""
+    global _upload_session
+    for client in list(_clients.values()):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"关闭视觉模型客户端失败: {e}")
+    _clients.clear()
+    _limiters.clear()
+    if _upload_session is not None and not _upload_session.closed:
+        await _upload_session.close()
+    _upload_session = None
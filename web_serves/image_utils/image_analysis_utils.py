@@ -3,10 +3,23 @@
 """
 图片分析工具类 - 包含调用AI服务进行图片分析的逻辑
 """
+import io
 import json
-from typing import Dict, Any, Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
 
-from web_serves.config import app_config
+from PIL import Image
+
+from web_serves.config import (
+    app_config,
+    IMAGE_PREPROCESS_FORMAT,
+    IMAGE_PREPROCESS_QUALITY,
+    IMAGE_PREPROCESS_MAX_SIDE,
+    IMAGE_PREPROCESS_PROVIDER_MAX_SIDE,
+    IMAGE_PREPROCESS_WORKERS
+)
 from web_serves.utils.logger import get_logger
 
 import aiofiles
@@ -65,6 +78,63 @@ def extract_json_content(text: str) -> Dict[str, Any]:
         }
 
 
+def extract_json_array_content(text: str, expected_count: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    从批量分析的模型输出中提取JSON数组，extract_json_content 的多图版本。
+
+    数组不完整（如输出被 max_tokens 截断）时逐个提取其中完整的JSON对象。
+    元素带有合法的 index（从1开始，允许数字字符串）时按 index 对应图片，否则按出现顺序对应；
+    同一位置只取第一个结果，按 index 对应的结果优先。
+
+    参数:
+        text (str): 模型输出
+        expected_count (int): 请求中的图片数
+
+    返回:
+        List[Optional[Dict[str, Any]]]: 与图片一一对应的结果，缺失的位置为None
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * expected_count
+    if not text:
+        return results
+
+    items = None
+    array_start = text.find("[")
+    array_end = text.rfind("]")
+    if array_start != -1 and array_end > array_start:
+        try:
+            items = json.loads(text[array_start: array_end + 1])
+        except json.JSONDecodeError:
+            items = None
+    if not isinstance(items, list):
+        items = []
+        decoder = json.JSONDecoder()
+        position = text.find("{")
+        while position != -1:
+            try:
+                item, end = decoder.raw_decode(text, position)
+                items.append(item)
+                position = text.find("{", end)
+            except json.JSONDecodeError:
+                position = text.find("{", position + 1)
+
+    # 先放带合法 index 的元素，再按出现顺序放其余元素，避免没有 index 的元素占用其他图片的位置
+    indexed, positional = [], []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or ("title" not in item and "description" not in item):
+            continue
+        index = item.get("index")
+        if isinstance(index, str) and index.strip().isdigit():
+            index = int(index)
+        if isinstance(index, int) and not isinstance(index, bool) and 1 <= index <= expected_count:
+            indexed.append((index - 1, item))
+        else:
+            positional.append((position, item))
+    for slot, item in indexed + positional:
+        if slot < expected_count and results[slot] is None:
+            results[slot] = {"title": item.get("title", ""), "description": item.get("description", "")}
+    return results
+
+
 async def image_to_base64_async(image_path: str) -> str:
     """
     异步将图像文件转换为base64编码字符串
@@ -82,3 +152,84 @@ async def image_to_base64_async(image_path: str) -> str:
         return encoded_string
     except FileNotFoundError:
         raise FileNotFoundError(f"文件未找到: {image_path}")
+
+
+# 图片预处理线程池，PIL缩放和编码时释放GIL
+_preprocess_executor: Optional[ThreadPoolExecutor] = None
+
+
+@dataclass
+class ImagePayload:
+    """发送给视觉模型的图片数据"""
+    mime_format: str
+    base64_data: str
+    original_bytes: int
+    sent_bytes: int
+    resized: bool
+
+
+def get_max_side(provider: str, detail: str) -> int:
+    """返回提供商在该细节级别下实际使用的长边像素数"""
+    limits = {**IMAGE_PREPROCESS_MAX_SIDE, **IMAGE_PREPROCESS_PROVIDER_MAX_SIDE.get(provider, {})}
+    return int(limits.get(detail, limits.get("high", 2048)))
+
+
+def prepare_image_payload(
+    image_path: str,
+    max_side: int,
+    image_format: str = IMAGE_PREPROCESS_FORMAT,
+    quality: int = IMAGE_PREPROCESS_QUALITY
+) -> ImagePayload:
+    """
+    按 max_side 等比缩小图片并重新编码为 JPEG/WebP，再做base64编码
+
+    不需要缩放且重新编码后反而更大时（如小尺寸的纯色PNG）发送原文件；需要缩放时总是发送缩放后的图片，
+    即使它比高度压缩的原文件更大，否则模型会收到超出其分辨率上限的图片。无法识别的图片原样发送。
+
+    参数:
+        image_path: 图像文件路径
+        max_side: 长边最大像素数
+        image_format: 重新编码的格式，jpeg 或 webp
+        quality: 编码质量
+
+    返回:
+        图片数据和预处理前后的字节数
+    """
+    with open(image_path, "rb") as f:
+        raw = f.read()
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            original_format = (img.format or "jpeg").lower()
+            resized = max(img.size) > max_side
+            if resized:
+                img.thumbnail((max_side, max_side), Image.LANCZOS)
+            if image_format == "jpeg" and img.mode != "RGB":
+                # JPEG不支持透明通道，透明区域铺白底
+                rgba = img.convert("RGBA")
+                background = Image.new("RGB", rgba.size, (255, 255, 255))
+                background.paste(rgba, mask=rgba.getchannel("A"))
+                img = background
+            elif img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            buffer = io.BytesIO()
+            img.save(buffer, format=image_format.upper(), quality=quality)
+            encoded = buffer.getvalue()
+    except Exception as e:
+        logger.warning(f"图片预处理失败 {image_path}: {e}, 发送原图")
+        return ImagePayload("jpeg", base64.b64encode(raw).decode("utf-8"), len(raw), len(raw), False)
+
+    if not resized and len(encoded) >= len(raw):
+        return ImagePayload(original_format, base64.b64encode(raw).decode("utf-8"), len(raw), len(raw), False)
+    return ImagePayload(image_format, base64.b64encode(encoded).decode("utf-8"), len(raw), len(encoded), resized)
+
+
+async def prepare_image_payload_async(image_path: str, max_side: int) -> ImagePayload:
+    """在预处理线程池中执行 prepare_image_payload"""
+    global _preprocess_executor
+    if _preprocess_executor is None:
+        _preprocess_executor = ThreadPoolExecutor(
+            max_workers=IMAGE_PREPROCESS_WORKERS, thread_name_prefix="image-preprocess"
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_preprocess_executor, prepare_image_payload, image_path, max_side)
+
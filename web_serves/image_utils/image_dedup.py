@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图片去重 - 分析和上传前把相同（或近似相同）的图片归为一组
+
+文档中反复出现的logo、页眉和水印会产生几十张内容相同的裁剪图，逐张分析和上传既浪费模型调用也重复占用存储。
+本模块按内容SHA256对一份文档中的图片分组，每组只分析、上传代表图片一次，结果分发给组内所有引用；
+开启 image_dedup.perceptual 时再按感知哈希（dHash，64位）把汉明距离不超过阈值的近似重复图片并入同一组，
+这些图片在Markdown中统一引用代表图片的地址。
+
+跨文档时，分析结果由图片分析缓存（见 analysis_cache.py）复用；上传地址按 (内容摘要, 上传服务地址)
+记录在同一个缓存目录中，复用前由调用方确认远程文件仍然存在。
+"""
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from web_serves.config import IMAGE_ANALYSIS_CACHE_TTL
+from web_serves.image_utils.analysis_cache import analysis_cache, hash_image_file
+from web_serves.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+UPLOAD_CACHE_KEY_PREFIX = "img_upload_v1_"
+# dHash 缩放后的尺寸：9x8 灰度图，每行相邻像素比较得到 8x8=64 位
+DHASH_SIZE = 8
+
+# 本进程累计的去重统计
+_stats: Counter = Counter()
+
+
+@dataclass
+class ImageGroup:
+    """一组内容相同或近似相同的图片"""
+    sha256: str
+    abs_path: str
+    # 组内图片在 local_images 中的序号，第一个为代表图片
+    members: List[int] = field(default_factory=list)
+    dhash: Optional[int] = None
+    near_duplicates: int = 0
+
+
+def compute_dhash(image_path: str) -> Optional[int]:
+    """计算图片的差值哈希（dHash），无法打开图片时返回None"""
+    try:
+        with Image.open(image_path) as img:
+            pixels = list(img.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS).getdata())
+    except Exception as e:
+        logger.warning(f"计算感知哈希失败 {image_path}: {e}")
+        return None
+    value = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            offset = row * (DHASH_SIZE + 1) + col
+            value = (value << 1) | int(pixels[offset] > pixels[offset + 1])
+    return value
+
+
+def group_images(
+    local_images: List[Tuple[str, str]],
+    perceptual: bool = False,
+    hamming_threshold: int = 4
+) -> List[ImageGroup]:
+    """
+    按内容摘要（可选感知哈希）对图片分组，会读取所有图片文件，应在线程中调用
+
+    参数:
+        local_images: (相对路径, 绝对路径)的元组列表
+        perceptual: 是否合并近似重复的图片
+        hamming_threshold: 感知哈希的最大汉明距离
+
+    返回:
+        按首次出现顺序排列的图片组
+    """
+    groups: Dict[str, ImageGroup] = {}
+    digests: Dict[str, str] = {}
+    for index, (_, abs_path) in enumerate(local_images):
+        # 同一路径在Markdown中多次引用时只读一次文件
+        sha256 = digests.get(abs_path)
+        if sha256 is None:
+            try:
+                sha256 = hash_image_file(abs_path)
+            except OSError as e:
+                logger.warning(f"计算图片摘要失败 {abs_path}: {e}, 不参与去重")
+                sha256 = f"path:{abs_path}"
+            digests[abs_path] = sha256
+        group = groups.get(sha256)
+        if group is None:
+            group = groups[sha256] = ImageGroup(sha256=sha256, abs_path=abs_path)
+        group.members.append(index)
+
+    ordered = list(groups.values())
+    if not perceptual:
+        return ordered
+
+    merged: List[ImageGroup] = []
+    for group in ordered:
+        group.dhash = compute_dhash(group.abs_path)
+        target = None
+        if group.dhash is not None:
+            for candidate in merged:
+                if candidate.dhash is not None and bin(candidate.dhash ^ group.dhash).count("1") <= hamming_threshold:
+                    target = candidate
+                    break
+        if target is None:
+            merged.append(group)
+        else:
+            target.members.extend(group.members)
+            target.near_duplicates += len(group.members)
+    return merged
+
+
+def record_dedup(total_images: int, groups: List[ImageGroup]) -> Dict[str, Any]:
+    """累计一份文档的去重统计，返回该文档的统计"""
+    near_duplicates = sum(group.near_duplicates for group in groups)
+    _stats["documents"] += 1
+    _stats["images"] += total_images
+    _stats["unique_images"] += len(groups)
+    _stats["near_duplicates"] += near_duplicates
+    return {
+        "total": total_images,
+        "unique": len(groups),
+        "near_duplicates": near_duplicates,
+        "dedup_ratio": round(1 - len(groups) / total_images, 4) if total_images else 0.0,
+    }
+
+
+def record_upload_reused() -> None:
+    """记录一次跨文档复用上传地址"""
+    _stats["uploads_reused"] += 1
+
+
+def _upload_cache_key(sha256: str, api_base_url: str) -> str:
+    return f"{UPLOAD_CACHE_KEY_PREFIX}{sha256}_{hashlib.md5(api_base_url.encode()).hexdigest()}"
+
+
+def get_recorded_upload(sha256: str, api_base_url: str) -> Optional[Dict[str, str]]:
+    """读取之前上传过的相同图片的地址（url、saved_filename），没有时返回None"""
+    try:
+        return analysis_cache.get(_upload_cache_key(sha256, api_base_url))
+    except Exception as e:
+        logger.warning(f"读取图片上传记录失败: {e}")
+        return None
+
+
+def record_upload(sha256: str, api_base_url: str, url: str, saved_filename: str) -> None:
+    """记录图片的上传地址，供之后的文档复用"""
+    try:
+        analysis_cache.set(
+            _upload_cache_key(sha256, api_base_url),
+            {"url": url, "saved_filename": saved_filename},
+            expire=IMAGE_ANALYSIS_CACHE_TTL
+        )
+    except Exception as e:
+        logger.warning(f"保存图片上传记录失败: {e}")
+
+
+def forget_upload(sha256: str, api_base_url: str) -> None:
+    """删除失效的上传记录"""
+    try:
+        analysis_cache.delete(_upload_cache_key(sha256, api_base_url))
+    except Exception as e:
+        logger.warning(f"删除图片上传记录失败: {e}")
+
+
+def get_image_dedup_stats() -> Dict[str, Any]:
+    """获取本进程累计的图片去重统计"""
+    images = _stats["images"]
+    return {
+        "documents": _stats["documents"],
+        "images": images,
+        "unique_images": _stats["unique_images"],
+        "near_duplicates": _stats["near_duplicates"],
+        "uploads_reused": _stats["uploads_reused"],
+        "dedup_ratio": round(1 - _stats["unique_images"] / images, 4) if images else None,
+    }
@@ -32,3 +32,37 @@ def get_image_analysis_prompt(title_max_length: int, description_max_length: int
 
 只返回JSON，不要有其他说明文字。
 """
+
+
+def get_batch_image_analysis_prompt(image_count: int, title_max_length: int, description_max_length: int) -> str:
+    """
+    生成批量图片分析的提示词，要求按图片顺序返回JSON数组。
+
+    Args:
+        image_count: 本次请求中的图片数。
+        title_max_length: 标题最大长度。
+        description_max_length: 描述最大长度。
+
+    Returns:
+        格式化的提示词字符串。
+    """
+    return f"""以上共有{image_count}张图片，请按顺序逐张分析，为每张图片生成一个{title_max_length}字以上的标题、{description_max_length}字以上的图片描述，使用JSON数组输出。
+
+分析以下方面:
+1. 图像类型（图表、示意图、照片等）
+2. 主要内容/主题
+3. 包含的关键信息点
+4. 图像的可能用途
+
+输出格式必须严格为包含{image_count}个元素的数组，index 为图片序号（从1开始）:
+[
+  {{
+    "index": 1,
+    "title": "标题({title_max_length}字以内)",
+    "description": "详细描述({description_max_length}字以内)"
+  }}
+]
+
+只返回JSON，不要有其他说明文字。
+"""
+
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多提供商路由 - 按权重、健康状况和实时时延把图片分析分散到多个提供商和模型
+
+单个请求只能使用一个 provider 时，吞吐受限于该提供商的速率限制，提供商故障时整批图片都会失败。
+开启 provider_routing 后每次模型调用都由路由器选择目标（提供商 + 模型）：
+1. 选择概率与 权重 / 近期时延中位数 成正比，已占满自适应并发上限的目标降低权重，
+   多个提供商的限额叠加，总吞吐高于任何一个提供商；
+2. 每个目标一个熔断器：连续失败 failure_threshold 次后摘除 cooldown_seconds，冷却结束后放行一个探测请求，
+   成功则恢复，失败则再次摘除且冷却时间加倍（不超过 max_cooldown_seconds）；
+3. 同一次调用重试时（见 resilience.call_with_retry）优先选择本次还没有失败过的目标，一个提供商故障时请求自动转移。
+
+所有目标都被摘除时仍选择冷却最先结束的目标，不会因为熔断而完全停止服务。
+"""
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from web_serves.config import (
+    PROVIDER_ROUTING_ENABLED,
+    PROVIDER_ROUTING_TARGETS,
+    PROVIDER_ROUTING_FAILURE_THRESHOLD,
+    PROVIDER_ROUTING_COOLDOWN,
+    PROVIDER_ROUTING_MAX_COOLDOWN
+)
+from web_serves.image_utils.batch_analysis import batch_sizes
+from web_serves.image_utils.client_registry import get_provider_limiter
+from web_serves.image_utils.resilience import recent_latency
+from web_serves.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 没有时延样本时假定的时延（秒），新目标也能分到请求
+DEFAULT_LATENCY = 1.0
+# 已占满并发上限的目标的权重系数
+SATURATED_WEIGHT_FACTOR = 0.1
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+@dataclass
+class RouteTarget:
+    """一个路由目标及其熔断状态"""
+    provider: str
+    model: str
+    api_key: str
+    base_url: str
+    weight: float = 1.0
+    state: str = BREAKER_CLOSED
+    consecutive_failures: int = 0
+    open_until: float = 0.0
+    cooldown: float = PROVIDER_ROUTING_COOLDOWN
+    probing: bool = False
+    successes: int = 0
+    failures: int = 0
+    ejections: int = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+    def available(self, now: float) -> bool:
+        """熔断器是否允许发出请求；冷却结束后转为半开，只放行一个探测请求"""
+        if self.state == BREAKER_OPEN and now >= self.open_until:
+            self.state = BREAKER_HALF_OPEN
+            self.probing = False
+        if self.state == BREAKER_HALF_OPEN:
+            return not self.probing
+        return self.state == BREAKER_CLOSED
+
+
+class ProviderRouter:
+    """多提供商路由器，只在事件循环线程中使用"""
+
+    def __init__(self, targets: List[RouteTarget]):
+        self.targets = targets
+
+    def _effective_weight(self, target: RouteTarget) -> float:
+        latency = recent_latency(target.provider, target.model) or DEFAULT_LATENCY
+        weight = target.weight / max(latency, 1e-3)
+        limiter = get_provider_limiter(target.provider)
+        if limiter.in_flight >= int(limiter.limit):
+            weight *= SATURATED_WEIGHT_FACTOR
+        return weight
+
+    def pick(self, exclude: Optional[Set[str]] = None, image_count: int = 1) -> RouteTarget:
+        """
+        选择一个目标
+
+        Args:
+            exclude: 本次调用已经失败过的目标（key），尽量不再选择
+            image_count: 本次调用包含的图片数，只选择单次图片数上限足够的目标
+
+        Returns:
+            选中的目标，半开状态的目标被选中时作为探测请求
+        """
+        now = time.monotonic()
+        exclude = exclude or set()
+        eligible = [t for t in self.targets if image_count <= 1 or batch_sizes.limit(t.provider) >= image_count] \
+            or self.targets
+        candidates = [t for t in eligible if t.key not in exclude and t.available(now)] \
+            or [t for t in eligible if t.available(now)]
+        if not candidates:
+            # 全部被摘除时选择冷却最先结束的目标
+            chosen = min(eligible, key=lambda t: t.open_until)
+        else:
+            weights = [self._effective_weight(t) for t in candidates]
+            chosen = random.choices(candidates, weights=weights)[0]
+        if chosen.state == BREAKER_HALF_OPEN:
+            chosen.probing = True
+        return chosen
+
+    def record_success(self, target: RouteTarget) -> None:
+        """记录调用成功，半开状态的目标恢复"""
+        target.successes += 1
+        target.consecutive_failures = 0
+        if target.state != BREAKER_CLOSED:
+            logger.info(f"提供商 {target.key} 探测成功，恢复路由")
+        target.state = BREAKER_CLOSED
+        target.probing = False
+        target.cooldown = PROVIDER_ROUTING_COOLDOWN
+
+    def record_failure(self, target: RouteTarget) -> None:
+        """记录调用失败，连续失败达到阈值或半开探测失败时摘除目标"""
+        target.failures += 1
+        target.consecutive_failures += 1
+        if target.state == BREAKER_HALF_OPEN:
+            target.cooldown = min(PROVIDER_ROUTING_MAX_COOLDOWN, target.cooldown * 2)
+        elif target.state == BREAKER_OPEN or target.consecutive_failures < PROVIDER_ROUTING_FAILURE_THRESHOLD:
+            return
+        target.state = BREAKER_OPEN
+        target.probing = False
+        target.open_until = time.monotonic() + target.cooldown
+        target.ejections += 1
+        logger.warning(f"提供商 {target.key} 连续失败 {target.consecutive_failures} 次，摘除 {target.cooldown:.0f} 秒")
+
+    def record_cancelled(self, target: RouteTarget) -> None:
+        """调用被取消（截止时间或对冲胜出），不计入成功失败，半开状态的目标允许重新探测"""
+        target.probing = False
+
+    def cache_identity(self) -> Tuple[str, str]:
+        """
+        图片分析缓存key中代替 (提供商, 模型) 的标识
+
+        路由开启时结果可能由任何一个目标生成，缓存key按目标集合区分，目标变化后旧结果自然失效
+        """
+        return "routed", ",".join(sorted(target.key for target in self.targets))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各目标的熔断状态、成功失败次数和近期时延"""
+        now = time.monotonic()
+        return {
+            target.key: {
+                "state": target.state,
+                "weight": target.weight,
+                "recent_latency_seconds": round(latency, 3) if (latency := recent_latency(target.provider, target.model)) else None,
+                "reopen_in_seconds": round(max(0.0, target.open_until - now), 1) if target.state == BREAKER_OPEN else 0,
+                "successes": target.successes,
+                "failures": target.failures,
+                "ejections": target.ejections,
+            }
+            for target in self.targets
+        }
+
+
+_router: Optional[ProviderRouter] = None
+_router_resolved = False
+
+
+def get_provider_router(provider_configs: Dict[str, Dict[str, Any]]) -> Optional[ProviderRouter]:
+    """
+    获取全局路由器，首次调用时按 provider_routing.targets 和环境变量创建
+
+    Args:
+        provider_configs: AsyncImageAnalysis.PROVIDER_CONFIGS
+
+    Returns:
+        路由器；未开启或没有可用目标时返回None
+    """
+    global _router, _router_resolved
+    if _router_resolved:
+        return _router
+    _router_resolved = True
+    if not PROVIDER_ROUTING_ENABLED:
+        return None
+
+    targets = []
+    for item in PROVIDER_ROUTING_TARGETS:
+        provider = str(item.get("provider", "")).lower()
+        config = provider_configs.get(provider)
+        if config is None:
+            logger.warning(f"路由目标的提供商不受支持: {provider}")
+            continue
+        api_key = os.getenv(config["api_key_env"]) or config.get("default_api_key")
+        base_url = os.getenv(config["base_url_env"]) or config.get("default_base_url")
+        if not api_key or not base_url:
+            logger.warning(f"路由目标 {provider} 未配置 {config['api_key_env']} 或 {config['base_url_env']}，跳过")
+            continue
+        model = item.get("model") or os.getenv(config["model_env"]) or config["default_models"][0]
+        targets.append(RouteTarget(provider=provider, model=model, api_key=api_key, base_url=base_url,
+                                   weight=max(1e-6, float(item.get("weight", 1)))))
+    if targets:
+        _router = ProviderRouter(targets)
+        logger.info(f"多提供商路由已开启: {[target.key for target in targets]}")
+    else:
+        logger.warning("多提供商路由没有可用目标，使用请求指定的提供商")
+    return _router
+
+
+def get_router_stats() -> Dict[str, Any]:
+    """获取路由器状态，未开启时返回 enabled=False"""
+    return {"enabled": _router is not None, "targets": _router.get_stats() if _router else {}}
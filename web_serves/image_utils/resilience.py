@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+视觉模型调用的重试和对冲请求
+
+一次临时错误就会让图片在最终Markdown中永久缺少标题和描述，因此模型调用按以下策略执行：
+1. 重试：429、5xx（见 image_retry.retryable_status_codes）、超时和连接失败时按指数退避重试，
+   等待时间在 [0, min(max_delay, base_delay × 2^n)] 内随机（full jitter），提供商返回 Retry-After 时至少等待该时长；
+   每张图片有总的截止时间 deadline_seconds，重试不会超过截止时间；
+2. 对冲：开启 image_hedging 后，调用超过该提供商和模型近期成功调用的 p95 时延仍未返回时，
+   向备用提供商（或同一提供商的备用模型）发出同样的请求，先成功的结果生效，另一个请求被取消。
+   图片多的文档的总耗时由最慢的一次调用决定，对冲用少量额外调用截掉长尾。
+"""
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import openai
+
+from web_serves.config import (
+    IMAGE_RETRY_MAX_ATTEMPTS,
+    IMAGE_RETRY_BASE_DELAY,
+    IMAGE_RETRY_MAX_DELAY,
+    IMAGE_RETRY_STATUS_CODES,
+    IMAGE_HEDGING_PERCENTILE,
+    IMAGE_HEDGING_MIN_SAMPLES,
+    IMAGE_HEDGING_MIN_DELAY
+)
+from web_serves.image_utils.adaptive_limiter import is_overload_error
+from web_serves.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 每个 (提供商, 模型) 保留最近多少次成功调用的时延
+LATENCY_SAMPLES = 200
+
+_latencies: Dict[Tuple[str, str], Deque[float]] = {}
+_stats: Counter = Counter()
+
+
+class DeadlineExceeded(Exception):
+    """图片分析超过截止时间"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """判断调用失败后是否值得重试"""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in IMAGE_RETRY_STATUS_CODES
+    return is_overload_error(error)
+
+
+def _retry_after_seconds(error: BaseException) -> Optional[float]:
+    """读取提供商返回的 Retry-After（秒）"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """第 attempt 次失败后的等待时间：full jitter 指数退避，不少于 Retry-After"""
+    delay = random.uniform(0, min(IMAGE_RETRY_MAX_DELAY, IMAGE_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, IMAGE_RETRY_MAX_DELAY))
+    return delay
+
+
+async def call_with_retry(call: Callable[[], Awaitable[Any]], deadline_at: float, description: str = "") -> Any:
+    """
+    按重试策略执行调用
+
+    参数:
+        call: 每次尝试时调用，返回新的协程
+        deadline_at: 截止时间（time.monotonic()）
+        description: 日志中的调用描述
+
+    返回:
+        调用结果
+
+    异常:
+        DeadlineExceeded: 超过截止时间
+        其他异常: 不可重试的错误，或重试次数用完后的最后一次错误
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            _stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"{description} 超过截止时间")
+        try:
+            return await asyncio.wait_for(call(), timeout=remaining)
+        except asyncio.TimeoutError:
+            _stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"{description} 超过截止时间")
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            if attempt >= IMAGE_RETRY_MAX_ATTEMPTS:
+                _stats["retries_exhausted"] += 1
+                raise
+            delay = backoff_delay(attempt, _retry_after_seconds(e))
+            if time.monotonic() + delay >= deadline_at:
+                _stats["deadline_exceeded"] += 1
+                raise
+            _stats["retries"] += 1
+            logger.warning(f"{description} 第{attempt}次调用失败: {e}, {delay:.2f} 秒后重试")
+            await asyncio.sleep(delay)
+
+
+def record_latency(provider: str, model: str, seconds: float) -> None:
+    """记录一次成功调用的时延，用于计算对冲延迟"""
+    _latencies.setdefault((provider, model), deque(maxlen=LATENCY_SAMPLES)).append(seconds)
+
+
+def hedge_delay(provider: str, model: str) -> Optional[float]:
+    """返回发出对冲请求前的等待时间（近期时延的 p95），样本不足时返回None（不对冲）"""
+    samples = _latencies.get((provider, model))
+    if not samples or len(samples) < IMAGE_HEDGING_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    percentile = ordered[min(len(ordered) - 1, int(len(ordered) * IMAGE_HEDGING_PERCENTILE))]
+    return max(IMAGE_HEDGING_MIN_DELAY, percentile)
+
+
+def recent_latency(provider: str, model: str) -> Optional[float]:
+    """返回 (提供商, 模型) 近期成功调用时延的中位数，没有样本时返回None"""
+    samples = _latencies.get((provider, model))
+    if not samples:
+        return None
+    return sorted(samples)[len(samples) // 2]
+
+
+async def hedged_call(
+    primary: Callable[[], Awaitable[Any]],
+    secondary: Callable[[], Awaitable[Any]],
+    delay: float,
+    started: Optional[asyncio.Event] = None
+) -> Any:
+    """
+    先发出主请求，超过 delay 仍未返回时发出对冲请求，返回先成功的结果
+
+    参数:
+        primary: 返回主请求协程
+        secondary: 返回对冲请求协程
+        delay: 发出对冲请求前的等待时间（秒）
+        started: 主请求拿到并发名额、实际开始调用时设置；提供时 delay 从此刻开始计算，
+            在调度器中排队的时间不会触发对冲，避免负载高时对冲请求进一步放大负载
+
+    返回:
+        先成功的结果；两个请求都失败时抛出主请求的异常
+    """
+    primary_task = asyncio.ensure_future(primary())
+    secondary_task = None
+    try:
+        if started is not None:
+            started_task = asyncio.ensure_future(started.wait())
+            await asyncio.wait({primary_task, started_task}, return_when=asyncio.FIRST_COMPLETED)
+            started_task.cancel()
+            if primary_task.done():
+                return primary_task.result()
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            return primary_task.result()
+
+        _stats["hedges"] += 1
+        secondary_task = asyncio.ensure_future(secondary())
+        pending = {primary_task, secondary_task}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is secondary_task:
+                        _stats["hedge_wins"] += 1
+                    return task.result()
+        return primary_task.result()
+    finally:
+        for task in (primary_task, secondary_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    """获取重试、对冲次数和各 (提供商, 模型) 的时延分位数"""
+    latencies = {}
+    for (provider, model), samples in _latencies.items():
+        ordered = sorted(samples)
+        latencies[f"{provider}/{model}"] = {
+            "samples": len(ordered),
+            "p50": round(ordered[len(ordered) // 2], 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        }
+    return {
+        **{key: _stats[key] for key in ("retries", "retries_exhausted", "deadline_exceeded", "hedges", "hedge_wins")},
+        "latency_seconds": latencies,
+    }
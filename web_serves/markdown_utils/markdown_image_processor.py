@@ -5,9 +5,10 @@ Markdown图片处理器 - 结合图片分析和API上传
 
 主要功能：
 1. 从Markdown文件中提取本地图片路径
-2. 使用多模态模型分析图片生成标题和描述
-3. 通过API上传图片到远程服务器
-4. 更新Markdown内容，替换为远程地址并添加描述
+2. 按内容摘要去重，相同的图片只处理一次
+3. 使用多模态模型分析图片生成标题和描述
+4. 通过API上传图片到远程服务器
+5. 更新Markdown内容，替换为远程地址并添加描述
 
 使用示例：
     processor = MarkdownImageProcessor()
@@ -20,12 +21,29 @@ import asyncio
 import logging
 import aiofiles
 import aiohttp
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Callable
 from pathlib import Path
 
 from web_serves.image_utils.async_image_analysis import AsyncImageAnalysis
+from web_serves.image_utils.client_registry import get_upload_session
 from web_serves.markdown_utils.update_markdown_with_analysis import update_markdown_with_analysis
-from web_serves.config import get_api_base_url
+from web_serves.image_utils.image_dedup import (
+    ImageGroup,
+    group_images,
+    record_dedup,
+    record_upload_reused,
+    get_recorded_upload,
+    record_upload,
+    forget_upload
+)
+from web_serves.config import (
+    get_api_base_url,
+    IMAGE_DEDUP_ENABLED,
+    IMAGE_DEDUP_PERCEPTUAL,
+    IMAGE_DEDUP_HAMMING_THRESHOLD,
+    IMAGE_DEDUP_REUSE_UPLOADS
+)
+from web_serves.utils.scheduler import ScheduleKey
 
 
 class MarkdownImageProcessor:
@@ -38,18 +56,25 @@ class MarkdownImageProcessor:
         base_url: str = None,
         vision_model: str = None,
         api_base_url: str = None,  # 后端API地址
-        max_concurrent: int = 3
+        max_concurrent: int = 3,
+        progress_callback: Optional[Callable[..., None]] = None,
+        schedule_key: Optional[ScheduleKey] = None,
+        use_cache: bool = True
     ):
         """
         初始化处理器
         
         Args:
-            provider: API提供商，支持 'guiji', 'zhipu', 'volces', 'openai'
+            provider: API提供商，支持 'guiji', 'zhipu', 'volces', 'openai', 'local_mock'
             api_key: API密钥
             base_url: API基础URL
             vision_model: 视觉模型名称
             api_base_url: 后端API地址（用于上传图片）
             max_concurrent: 最大并发数
+            progress_callback: 可选的进度回调，以 (事件类型, **数据) 调用，
+                事件类型为 images_found（含去重统计）/ image_analyzed / image_uploaded
+            schedule_key: 调度键（租户和优先级），图片分析按该键公平排队
+            use_cache: 是否使用图片分析结果缓存
         """
         self.api_base_url = api_base_url or get_api_base_url()
         
@@ -58,9 +83,15 @@ class MarkdownImageProcessor:
             api_key=api_key,
             base_url=base_url,
             vision_model=vision_model,
-            max_concurrent=max_concurrent
+            max_concurrent=max_concurrent,
+            schedule_key=schedule_key,
+            use_cache=use_cache
         )
         
+        self.progress_callback = progress_callback or (lambda event, **data: None)
+        # 最近一次 process_images 的去重统计
+        self.dedup_stats: Dict[str, Any] = {}
+        
         # 配置日志
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
@@ -133,48 +164,86 @@ class MarkdownImageProcessor:
         upload_url = f"{self.api_base_url}/upload/image"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                # 准备文件数据
-                async with aiofiles.open(local_path, 'rb') as f:
-                    file_data = await f.read()
-                
-                # 获取文件信息
-                filename = os.path.basename(local_path)
-                
-                # 使用分析结果中的标题作为文件名前缀（如果有的话）
-                title = analysis_result.get('title', '').strip()
-                if title:
-                    # 清理标题，移除不适合文件名的字符
-                    clean_title = re.sub(r'[^\w\u4e00-\u9fff-]', '_', title)[:50]
-                    name, ext = os.path.splitext(filename)
-                    filename = f"{clean_title}_{name}{ext}"
-                
-                # 准备表单数据
-                data = aiohttp.FormData()
-                data.add_field('file', file_data, filename=filename, content_type='image/*')
-                
-                # 发送上传请求
-                async with session.post(upload_url, data=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        file_info = result.get('file_info', {})
-                        saved_filename = file_info.get('saved_filename', filename)
-                          # 构造远程URL - 图片保存在 uploads/images/ 目录下
-                        remote_url = f"{self.api_base_url}/uploads/images/{saved_filename}"
-                        
-                        self.logger.info(f"图片上传成功: {local_path} -> {remote_url}")
-                        return remote_url, saved_filename
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"上传失败: HTTP {response.status}, {error_text}")
-                        
+            # 共享会话，上传图片时复用到本服务的长连接
+            session = get_upload_session()
+            # 准备文件数据
+            async with aiofiles.open(local_path, 'rb') as f:
+                file_data = await f.read()
+            
+            # 获取文件信息
+            filename = os.path.basename(local_path)
+            
+            # 使用分析结果中的标题作为文件名前缀（如果有的话）
+            title = analysis_result.get('title', '').strip()
+            if title:
+                # 清理标题，移除不适合文件名的字符
+                clean_title = re.sub(r'[^\w\u4e00-\u9fff-]', '_', title)[:50]
+                name, ext = os.path.splitext(filename)
+                filename = f"{clean_title}_{name}{ext}"
+            
+            # 准备表单数据
+            data = aiohttp.FormData()
+            data.add_field('file', file_data, filename=filename, content_type='image/*')
+            
+            # 发送上传请求
+            async with session.post(upload_url, data=data) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    file_info = result.get('file_info', {})
+                    saved_filename = file_info.get('saved_filename', filename)
+                      # 构造远程URL - 图片保存在 uploads/images/ 目录下
+                    remote_url = f"{self.api_base_url}/uploads/images/{saved_filename}"
+                    
+                    self.logger.info(f"图片上传成功: {local_path} -> {remote_url}")
+                    return remote_url, saved_filename
+                else:
+                    error_text = await response.text()
+                    raise Exception(f"上传失败: HTTP {response.status}, {error_text}")
+                    
         except Exception as e:
             self.logger.error(f"上传图片失败: {local_path}, 错误: {e}")
             raise
 
+    async def _remote_image_exists(self, url: str) -> bool:
+        """确认之前上传的图片仍可访问"""
+        try:
+            async with get_upload_session().head(url) as response:
+                return response.status == 200
+        except Exception as e:
+            self.logger.warning(f"检查已上传图片失败: {url}, 错误: {e}")
+            return False
+
+    async def upload_group(self, group: ImageGroup, analysis_result: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        上传一组图片的代表图片，其他文档已上传过相同内容且远程文件仍存在时直接复用地址
+        
+        Args:
+            group: 图片组
+            analysis_result: 代表图片的分析结果
+            
+        Returns:
+            (远程URL, 上传后的文件名)
+        """
+        reuse = IMAGE_DEDUP_REUSE_UPLOADS and not group.sha256.startswith("path:")
+        if reuse:
+            recorded = await asyncio.to_thread(get_recorded_upload, group.sha256, self.api_base_url)
+            if recorded:
+                if await self._remote_image_exists(recorded["url"]):
+                    record_upload_reused()
+                    self.logger.info(f"复用已上传图片: {group.abs_path} -> {recorded['url']}")
+                    return recorded["url"], recorded["saved_filename"]
+                await asyncio.to_thread(forget_upload, group.sha256, self.api_base_url)
+
+        remote_url, saved_filename = await self.upload_image_via_api(group.abs_path, analysis_result)
+        if reuse:
+            await asyncio.to_thread(record_upload, group.sha256, self.api_base_url, remote_url, saved_filename)
+        return remote_url, saved_filename
+
     async def process_images(self, local_images: List[Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
         """
-        批量处理图片：分析 + 上传
+        批量处理图片：去重 + 分析 + 上传
+        
+        内容相同（开启感知哈希时包括近似相同）的图片只分析、上传一次，结果分发给组内所有引用。
         
         Args:
             local_images: (相对路径, 绝对路径)的元组列表
@@ -186,46 +255,69 @@ class MarkdownImageProcessor:
             self.logger.info("没有发现本地图片需要处理")
             return {}
         
-        self.logger.info(f"开始处理 {len(local_images)} 张图片...")
+        total = len(local_images)
+        if IMAGE_DEDUP_ENABLED:
+            groups = await asyncio.to_thread(
+                group_images, local_images, IMAGE_DEDUP_PERCEPTUAL, IMAGE_DEDUP_HAMMING_THRESHOLD
+            )
+        else:
+            groups = [ImageGroup(sha256=f"path:{abs_path}", abs_path=abs_path, members=[i])
+                      for i, (_, abs_path) in enumerate(local_images)]
+        self.dedup_stats = record_dedup(total, groups)
+        self.logger.info(
+            f"开始处理 {total} 张图片，去重后 {len(groups)} 张（去重率 {self.dedup_stats['dedup_ratio']:.1%}）..."
+        )
+        self.progress_callback("images_found", **self.dedup_stats)
+        analyzed_count = 0
+
+        def report_analyzed(group_index: int, result: Dict[str, Any]) -> None:
+            nonlocal analyzed_count
+            for index in groups[group_index].members:
+                analyzed_count += 1
+                self.progress_callback(
+                    "image_analyzed",
+                    index=index,
+                    completed=analyzed_count,
+                    total=total,
+                    image=local_images[index][0],
+                    title=result.get("title", "") if isinstance(result, dict) else "",
+                    error=result.get("error") if isinstance(result, dict) else None
+                )
         
-        # 准备分析任务
+        # 每组只分析代表图片
         image_sources = [
-            {"local_image_path": abs_path} 
-            for _, abs_path in local_images
+            {"local_image_path": group.abs_path, "image_sha256": None if group.sha256.startswith("path:") else group.sha256}
+            for group in groups
         ]
         
         # 批量分析图片
-        analysis_results = await self.image_analyzer.analyze_multiple_images(image_sources)
+        analysis_results = await self.image_analyzer.analyze_multiple_images(
+            image_sources, on_result=report_analyzed
+        )
         
-        # 组合结果并上传图片
+        # 每组上传一次，结果分发给组内所有引用
         processed_results = {}
-        for i, (rel_path, abs_path) in enumerate(local_images):
-            analysis_result = analysis_results[i]
-            
+        for group, analysis_result in zip(groups, analysis_results):
             try:
-                remote_url, saved_filename = await self.upload_image_via_api(abs_path, analysis_result)
-                
+                remote_url, saved_filename = await self.upload_group(group, analysis_result)
+                error = analysis_result.get("error")
+                self.logger.info(f"处理完成: {group.abs_path} -> {remote_url}（{len(group.members)} 处引用）")
+            except Exception as e:
+                self.logger.error(f"处理图片失败: {group.abs_path}, 错误: {e}")
+                remote_url, saved_filename, error = "", "", f"上传失败: {str(e)}"
+
+            for index in group.members:
+                rel_path, abs_path = local_images[index]
                 processed_results[rel_path] = {
                     "title": analysis_result.get("title", ""),
                     "description": analysis_result.get("description", ""),
                     "url": remote_url,
-                    "error": analysis_result.get("error"),
+                    "error": error,
                     "original_path": abs_path,
                     "saved_filename": saved_filename
                 }
-                
-                self.logger.info(f"处理完成: {rel_path} -> {remote_url}")
-                
-            except Exception as e:
-                self.logger.error(f"处理图片失败: {rel_path}, 错误: {e}")
-                processed_results[rel_path] = {
-                    "title": analysis_result.get("title", ""),
-                    "description": analysis_result.get("description", ""),
-                    "url": "",
-                    "error": f"上传失败: {str(e)}",
-                    "original_path": abs_path,
-                    "saved_filename": ""
-                }
+                if remote_url:
+                    self.progress_callback("image_uploaded", index=index, total=total, image=rel_path, url=remote_url)
         
         return processed_results
     
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+解析辅助文件策略 - 控制每个文档是否写出 *_model.json、*_origin.pdf、*_layout.pdf
+
+这些文件只用于排查解析问题，web服务解析完成后会立即删除临时目录，生产环境中通常不需要：
+- none: 只生成Markdown和图片，不写任何辅助文件（默认）
+- minimal: 额外写出紧凑格式（无缩进）的 *_model.json，便于离线复查模型输出
+- debug: 写出全部辅助文件（缩进的 *_model.json、*_origin.pdf、*_layout.pdf），与旧版本行为一致
+
+跳过的文件既不生成也不会进入解析缓存。每次实际写出辅助文件时按页记录耗时和大小的滑动平均，
+跳过时据此估算节省的时间和字节数（原始PDF的大小是确定的；本进程从未写出过的文件没有耗时估算），
+随 artifacts 阶段事件上报，并累计到解析缓存中，可通过缓存统计接口查看。
+"""
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from web_serves.config import ARTIFACT_DEFAULT_POLICY
+
+ARTIFACT_POLICIES = ("none", "minimal", "debug")
+# 各策略写出的辅助文件
+POLICY_ARTIFACTS = {
+    "none": (),
+    "minimal": ("model_json",),
+    "debug": ("model_json", "origin_pdf", "layout_pdf"),
+}
+ALL_ARTIFACTS = ("model_json", "origin_pdf", "layout_pdf")
+# 滑动平均的权重
+EWMA_ALPHA = 0.2
+
+# 当前进程中每种辅助文件的每页平均耗时（秒）和大小（字节）
+_page_costs: Dict[str, Dict[str, float]] = {}
+
+
+def resolve_artifact_policy(policy: Optional[str]) -> str:
+    """
+    返回实际使用的辅助文件策略，未指定时使用配置中的默认策略
+
+    异常:
+        ValueError: 策略名称无效
+    """
+    policy = (policy or ARTIFACT_DEFAULT_POLICY).lower()
+    if policy not in ARTIFACT_POLICIES:
+        raise ValueError(f"无效的辅助文件策略: {policy}，可选 {', '.join(ARTIFACT_POLICIES)}")
+    return policy
+
+
+def _record_cost(artifact: str, seconds: float, size: int, pages: int) -> None:
+    pages = max(1, pages)
+    sample = {"seconds": seconds / pages, "bytes": size / pages}
+    current = _page_costs.get(artifact)
+    if current is None:
+        _page_costs[artifact] = sample
+    else:
+        for key, value in sample.items():
+            current[key] += EWMA_ALPHA * (value - current[key])
+
+
+def _estimate_cost(artifact: str, pages: int, pdf_bytes: bytes) -> Dict[str, Optional[float]]:
+    cost = _page_costs.get(artifact)
+    estimate = {
+        "seconds": round(cost["seconds"] * pages, 4) if cost else None,
+        "bytes": int(cost["bytes"] * pages) if cost else None,
+    }
+    if artifact == "origin_pdf":
+        # 原始PDF的大小是确定的
+        estimate["bytes"] = len(pdf_bytes)
+    return estimate
+
+
+def write_document_artifacts(policy: str, pdf_file_name: str, pdf_info: List[Dict[str, Any]], pdf_bytes: bytes,
+                             local_md_dir: str, md_writer, model_output_json: Optional[list],
+                             report_stage: Callable[..., None], record_saving: Optional[Callable[[Dict], None]] = None
+                             ) -> Dict[str, Any]:
+    """
+    按策略写出辅助文件，并上报写出和跳过的文件
+
+    参数:
+        policy: 辅助文件策略（none / minimal / debug）
+        pdf_file_name: PDF文件名（不含扩展名）
+        pdf_info: middle_json 中的页面结果（绘制布局框用）
+        pdf_bytes: 解析所用的PDF内容
+        local_md_dir: 输出目录
+        md_writer: 输出目录的写入器
+        model_output_json: 模型输出（VLM后端为None，不写 *_model.json）
+        report_stage: 阶段事件回调
+        record_saving: 可选，接收本次估算节省量的回调（用于跨进程汇总）
+
+    返回:
+        报告字典：policy、written、skipped（每个跳过文件的估算节省量）、
+        estimated_seconds_saved、estimated_bytes_saved（已知估算值之和）
+    """
+    from mineru.utils.draw_bbox import draw_layout_bbox
+
+    enabled = POLICY_ARTIFACTS[policy]
+    pages = len(pdf_info)
+    written = []
+    # 跳过的文件 -> 估算节省的耗时和字节数（本进程还没有实际写出过该文件时为None）
+    skipped: Dict[str, Dict[str, Optional[float]]] = {}
+
+    for artifact in ALL_ARTIFACTS:
+        if artifact == "model_json" and model_output_json is None:
+            continue
+        if artifact not in enabled:
+            skipped[artifact] = _estimate_cost(artifact, pages, pdf_bytes)
+            continue
+
+        start_time = time.time()
+        if artifact == "model_json":
+            file_name = f"{pdf_file_name}_model.json"
+            md_writer.write_string(
+                file_name,
+                json.dumps(model_output_json, ensure_ascii=False, indent=4 if policy == "debug" else None),
+            )
+        elif artifact == "origin_pdf":
+            file_name = f"{pdf_file_name}_origin.pdf"
+            md_writer.write(file_name, pdf_bytes)
+        else:
+            file_name = f"{pdf_file_name}_layout.pdf"
+            draw_layout_bbox(pdf_info, pdf_bytes, local_md_dir, file_name)
+        file_path = os.path.join(local_md_dir, file_name)
+        size = os.path.getsize(file_path) if os.path.isfile(file_path) else 0
+        # 紧凑格式的 model.json 比缩进格式小，不用于估算 debug 策略的开销
+        if not (artifact == "model_json" and policy != "debug"):
+            _record_cost(artifact, time.time() - start_time, size, pages)
+        written.append(artifact)
+
+    report = {
+        "policy": policy,
+        "written": written,
+        "skipped": skipped,
+        "estimated_seconds_saved": round(sum(item["seconds"] or 0.0 for item in skipped.values()), 3),
+        "estimated_bytes_saved": int(sum(item["bytes"] or 0 for item in skipped.values())),
+    }
+    report_stage("artifacts", **report)
+    if skipped and record_saving:
+        record_saving(report)
+    return report
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+内容寻址的文件存储 - 按SHA256摘要保存解析缓存中的图片和辅助文件
+
+每个文件保存为 {root}/{摘要前2位}/{摘要}，内容相同的文件（如多个文档共用的图片）只保存一份。
+解析缓存条目只记录 文件名 -> 摘要 的清单，命中时按清单取文件，不需要反序列化大对象。
+
+写入先落到同目录的临时文件再原子重命名，多个解析进程并发写入同一摘要也不会产生半个文件。
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Iterator, Set
+
+# 流式读写文件时的块大小
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """内容寻址的文件存储"""
+
+    def __init__(self, root: str):
+        """
+        初始化存储
+
+        参数:
+            root: 存储根目录
+        """
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, digest: str) -> str:
+        """返回摘要对应的文件路径"""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        """摘要对应的文件是否存在"""
+        return os.path.isfile(self.path_for(digest))
+
+    def put_file(self, src_path: str) -> str:
+        """
+        保存文件，边复制边计算摘要，已存在相同内容时不重复保存
+
+        参数:
+            src_path: 源文件路径
+
+        返回:
+            文件内容的SHA256摘要
+        """
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as dst, open(src_path, "rb") as src:
+                while chunk := src.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            return self._commit(tmp_path, digest.hexdigest())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_bytes(self, data: bytes) -> str:
+        """
+        保存二进制内容
+
+        参数:
+            data: 文件内容
+
+        返回:
+            内容的SHA256摘要
+        """
+        hex_digest = hashlib.sha256(data).hexdigest()
+        if self.exists(hex_digest):
+            return hex_digest
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                dst.write(data)
+            return self._commit(tmp_path, hex_digest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _commit(self, tmp_path: str, digest: str) -> str:
+        """把临时文件放到摘要对应的位置，已存在时丢弃临时文件"""
+        target = self.path_for(digest)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+            # 刷新修改时间，避免刚被新条目引用的文件被垃圾回收
+            os.utime(target)
+            return digest
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+        return digest
+
+    def copy_to(self, digest: str, dst_path: str) -> None:
+        """
+        把摘要对应的文件复制到目标路径
+
+        异常:
+            FileNotFoundError: 文件不存在（如已被清理）
+        """
+        shutil.copyfile(self.path_for(digest), dst_path)
+
+    def iter_digests(self) -> Iterator[str]:
+        """遍历已保存的全部摘要"""
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                yield name
+
+    def remove_unreferenced(self, referenced: Set[str], grace_seconds: int = 3600) -> int:
+        """
+        删除没有被任何缓存条目引用的文件
+
+        参数:
+            referenced: 仍被引用的摘要集合
+            grace_seconds: 只删除修改时间早于该秒数的文件，避免误删正在写入清单的新文件
+
+        返回:
+            删除的文件数量
+        """
+        removed = 0
+        now = time.time()
+        for digest in list(self.iter_digests()):
+            if digest in referenced:
+                continue
+            path = self.path_for(digest)
+            try:
+                if now - os.path.getmtime(path) >= grace_seconds:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def clear(self) -> None:
+        """删除全部文件"""
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+    def stats(self) -> Dict[str, int]:
+        """返回文件数量和占用字节数"""
+        count = 0
+        total_bytes = 0
+        for digest in self.iter_digests():
+            try:
+                total_bytes += os.path.getsize(self.path_for(digest))
+                count += 1
+            except FileNotFoundError:
+                continue
+        return {"blob_count": count, "blob_bytes": total_bytes}
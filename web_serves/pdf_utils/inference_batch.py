@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量推理分组 - 把多个文档的待解析页合并到共享的 doc_analyze 调用中
+
+MinerU pipeline 的 doc_analyze 接收PDF列表，并在内部把所有文档的页面合并成推理批次。
+批量上传时逐个文档调用（每次只传一个PDF）会让每个小文档独占一次模型推理，
+把多个文档放进同一次调用可以填满推理批次，提高GPU/CPU利用率。
+
+分组单位是一个文档的全部待解析子PDF（整篇，或页级缓存缺失的页段），不会把同一文档拆到
+不同批次，保证跨页合并与单独解析一致；单个文档超过页数预算时独占一个批次。
+"""
+from typing import Dict, List, Sequence, Tuple
+
+
+def pack_inference_batches(page_counts: Sequence[int], parse_methods: Sequence[str],
+                           page_budget: int) -> List[List[int]]:
+    """
+    按页数预算把文档分组，同一组内的文档使用相同的解析方法
+
+    参数:
+        page_counts: 每个文档待推理的页数
+        parse_methods: 每个文档的解析方法（doc_analyze 每次调用只接受一种方法）
+        page_budget: 每批的最大页数，小于等于0时每个文档单独一批
+
+    返回:
+        批次列表，每个批次是文档下标列表（保持原顺序）；待推理页数为0的文档不参与分组
+    """
+    batches: List[List[int]] = []
+    # 每种解析方法当前正在填充的批次及其页数
+    open_batches: Dict[str, List[int]] = {}
+    open_pages: Dict[str, int] = {}
+    for index, (pages, parse_method) in enumerate(zip(page_counts, parse_methods)):
+        if pages <= 0:
+            continue
+        current = open_batches.get(parse_method)
+        if current is not None and open_pages[parse_method] + pages <= page_budget:
+            current.append(index)
+            open_pages[parse_method] += pages
+            continue
+        current = [index]
+        batches.append(current)
+        open_batches[parse_method] = current
+        open_pages[parse_method] = pages
+    return batches
+
+
+def split_inference_results(inference: Tuple[list, ...], sub_pdf_counts: Sequence[int]) -> List[Tuple[list, ...]]:
+    """
+    把一次 doc_analyze 调用的返回值按文档拆分
+
+    参数:
+        inference: doc_analyze 的返回值，各列表与传入的子PDF一一对应
+        sub_pdf_counts: 批次中每个文档按顺序传入的子PDF数量
+
+    返回:
+        每个文档的推理结果，结构与 inference 相同，只包含该文档的子PDF
+    """
+    results = []
+    offset = 0
+    for count in sub_pdf_counts:
+        results.append(tuple(part[offset:offset + count] for part in inference))
+        offset += count
+    return results
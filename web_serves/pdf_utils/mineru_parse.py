@@ -19,6 +19,14 @@ mineru_pdf2md函数：
     - return_path: 是否返回生成的Markdown文件路径，默认为False
     - backend: 解析PDF所用后端，默认为"pipeline"，可选["pipeline", "vlm-transformers", "vlm-sglang-engine", "vlm-sglang-client"]
     - method: 解析PDF的方法，默认为"auto"，可选["auto", "txt", "ocr"]
+    - processing_id: 可选的处理ID，提供时会通过 emit_progress 发布解析阶段和页数等进度事件
+    - content_sha256: 可选的PDF全文件SHA256摘要（上传时已计算），用作缓存key，未提供时根据文件内容计算
+    - artifact_policy: 辅助文件策略，none（默认，只生成Markdown和图片）/ minimal（紧凑的 model.json）/
+      debug（model.json、原始PDF、布局框PDF），未指定时使用 config.json 中 artifacts.default_policy
+    - materialize_files: 缓存命中时是否把Markdown和辅助文件写入输出目录，默认为True；
+      web服务传入False，命中时只发布缺失的图片到 web_images_dir（硬链接），不写任何其他文件
+    - return_details: 为True时返回完整的结果字典，包含每页的分流摘要 page_routing
+      （pipeline 后端 method=auto 时，文本层干净的页走文本通道，不经过版面分析和OCR模型）
     - 返回值: 如果return_path=True，返回生成的Markdown文件路径；否则返回Markdown内容
 
 mineru_multi_pdf2md函数：
@@ -35,14 +43,41 @@ mineru_multi_pdf2md函数：
 """
 
 import os
+import copy
+from contextlib import ExitStack
 import shutil
 import json
 import hashlib
 from pathlib import Path
-from typing import List, Union, Dict, Any, Optional
+from typing import Callable, List, Union, Dict, Any, Optional, Tuple
 import re
+from functools import lru_cache
 import diskcache as dc
 
+from web_serves.utils.progress import emit_progress
+from web_serves.pdf_utils.blob_store import BlobStore
+from web_serves.pdf_utils.page_cache import (
+    compute_page_fingerprints,
+    neighborhood_digest,
+    extract_pdf_pages,
+    plan_page_runs,
+    collect_image_paths,
+    rename_image_paths
+)
+from web_serves.pdf_utils.parse_lock import single_flight
+from web_serves.pdf_utils.inference_batch import pack_inference_batches, split_inference_results
+from web_serves.pdf_utils.artifacts import resolve_artifact_policy, write_document_artifacts
+from web_serves.pdf_utils.text_fast_path import (
+    TEXT_FAST_PATH_VERSION,
+    route_pdf_pages,
+    text_page_model,
+    summarize_routing
+)
+from web_serves.config import (
+    PAGE_CACHE_ENABLED, PAGE_CACHE_RENDER_SCALE, PARSE_LOCK_TIMEOUT,
+    BATCH_INFERENCE_ENABLED, BATCH_PAGE_BUDGET, TEXT_FAST_PATH_ENABLED
+)
+
 # Set environment variable for model source if needed
 os.environ.setdefault('MINERU_MODEL_SOURCE', "modelscope")
 
@@ -50,6 +85,102 @@ os.environ.setdefault('MINERU_MODEL_SOURCE', "modelscope")
 # 初始化缓存，最大空间100GB
 CACHE_DIR = os.path.join(os.path.expanduser("."), ".cache", "remote_pdf_parse_serve")
 cache = dc.Cache(CACHE_DIR, size_limit=100 * 1024 ** 3)
+# 单飞锁文件目录：相同cache key的并发解析在此加文件锁
+PARSE_LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+# 缓存条目只保存清单，图片和辅助文件按内容摘要保存在 blobs 目录
+blob_store = BlobStore(os.path.join(CACHE_DIR, "blobs"))
+
+# 缓存key格式版本：v1 为前8KB哈希（已废弃），v2 为全文件SHA256 + mineru版本 + 模型开关
+CACHE_SCHEMA_VERSION = 2
+CACHE_KEY_PREFIX = f"pdf_parse_v{CACHE_SCHEMA_VERSION}_"
+LEGACY_CACHE_KEY_PREFIX = "pdf_parse_"
+# 页级缓存key前缀，页级缓存条目保存单页的 middle_json 结果和模型输出
+PAGE_CACHE_KEY_PREFIX = "pdf_page_v1_"
+# 记录缓存目录当前格式版本的特殊key
+CACHE_SCHEMA_MARKER_KEY = "__pdf_parse_cache_schema__"
+# 跳过辅助文件的累计统计（跳过的文件数、估算节省的字节数和毫秒数）
+ARTIFACT_SKIPPED_KEY = "__artifacts_skipped__"
+ARTIFACT_BYTES_SAVED_KEY = "__artifact_bytes_saved__"
+ARTIFACT_MS_SAVED_KEY = "__artifact_ms_saved__"
+INTERNAL_CACHE_KEYS = (CACHE_SCHEMA_MARKER_KEY, ARTIFACT_SKIPPED_KEY, ARTIFACT_BYTES_SAVED_KEY, ARTIFACT_MS_SAVED_KEY)
+
+
+def preload_pipeline_models(langs: Optional[List[str]] = None, formula_enable=True, table_enable=True) -> float:
+    """
+    预加载pipeline后端的模型（布局、公式检测/识别、OCR、表格），用于常驻解析进程启动时预热
+
+    参数:
+        langs: 需要额外预加载OCR/表格模型的语言列表，如 ["ch"]
+        formula_enable: 是否加载公式模型
+        table_enable: 是否加载表格模型
+
+    返回:
+        预加载耗时（秒）
+    """
+    import time
+    from mineru.backend.pipeline.pipeline_analyze import ModelSingleton
+    from mineru.backend.pipeline.model_init import AtomModelSingleton
+    # 同时导入解析时用到的模块，避免首个请求承担导入开销
+    from mineru.backend.pipeline.pipeline_analyze import doc_analyze  # noqa: F401
+    from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make  # noqa: F401
+    from mineru.backend.pipeline.model_json_to_middle_json import result_to_middle_json  # noqa: F401
+
+    start_time = time.time()
+    # 与 BatchAnalyze 中使用的key保持一致: (lang=None, formula_enable, table_enable)
+    ModelSingleton().get_model(lang=None, formula_enable=formula_enable, table_enable=table_enable)
+
+    atom_model_manager = AtomModelSingleton()
+    for lang in langs or []:
+        atom_model_manager.get_atom_model(atom_model_name='ocr', det_db_box_thresh=0.3, lang=lang)
+        if table_enable:
+            atom_model_manager.get_atom_model(atom_model_name='table', lang=lang)
+
+    return time.time() - start_time
+
+
+def count_pdf_pages(pdf_bytes: bytes) -> Optional[int]:
+    """
+    使用pypdfium2统计PDF页数，失败时返回None
+
+    参数:
+        pdf_bytes: PDF文件二进制内容
+
+    返回:
+        页数
+    """
+    try:
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    except Exception:
+        return None
+
+
+def publish_file(src_path: str, dst_path: str) -> bool:
+    """
+    把文件发布到目标路径：目标已存在时跳过，否则优先创建硬链接，跨文件系统时退回复制
+
+    MinerU按图片内容哈希命名裁剪图，同名文件内容相同，因此已存在的文件无需覆盖。
+
+    参数:
+        src_path: 源文件路径
+        dst_path: 目标路径
+
+    返回:
+        是否新发布了文件
+    """
+    if os.path.exists(dst_path):
+        return False
+    try:
+        os.link(src_path, dst_path)
+    except FileExistsError:
+        return False
+    except OSError:
+        shutil.copy2(src_path, dst_path)
+    return True
 
 
 def convert_image_paths_to_absolute_urls(markdown_content: str, base_url: str) -> str:
@@ -78,6 +209,90 @@ def convert_image_paths_to_absolute_urls(markdown_content: str, base_url: str) -
     return converted_content
 
 
+def document_stage_reporter(processing_id: Optional[str], doc_index: int, document_count: int,
+                            file_name: str) -> Callable[..., None]:
+    """返回发布指定文档阶段事件的函数，以 (阶段名, **数据) 调用"""
+    def report_stage(stage, **data):
+        emit_progress(
+            processing_id, "stage", stage=stage,
+            document_index=doc_index, document_count=document_count, file_name=file_name, **data
+        )
+    return report_stage
+
+
+def write_parsed_document(pdf_file_name: str, pdf_info: List[Dict[str, Any]], pdf_bytes: bytes,
+                          local_image_dir: str, local_md_dir: str, md_writer, union_make,
+                          web_images_dir: Optional[str], cache_key: Optional[str],
+                          report_stage: Callable[..., None], model_output_json: Optional[list] = None,
+                          artifact_policy: str = "debug",
+                          page_routing: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+    """
+    由 pdf_info 生成Markdown，按辅助文件策略写出结果文件，发布图片并写入整篇缓存
+
+    参数:
+        pdf_file_name: PDF文件名（不含扩展名）
+        pdf_info: middle_json 中的页面结果
+        pdf_bytes: 解析所用的PDF内容（保存为 _origin.pdf 并绘制布局框）
+        local_image_dir: 解析输出的图片目录
+        local_md_dir: 解析输出目录
+        md_writer: 输出目录的写入器
+        union_make: 对应后端的 union_make 函数
+        web_images_dir: web服务的图片目录，提供时把图片发布到该目录并把Markdown中的图片路径转换为URL
+        cache_key: 整篇缓存key，为None时不写缓存
+        report_stage: 阶段事件回调
+        model_output_json: 模型输出，写入 *_model.json（VLM后端为None）
+        artifact_policy: 辅助文件策略（none / minimal / debug）
+        page_routing: 每页的分流摘要（summarize_routing 的返回值），随整篇缓存保存，命中时原样返回
+
+    返回:
+        (Markdown文件路径, Markdown内容)
+    """
+    from mineru.utils.enum_class import MakeMode
+
+    # 先生成临时的markdown内容
+    report_stage("union_make")
+    image_dir = "images"  # 临时使用相对路径生成
+    md_content_str = union_make(pdf_info, MakeMode.MM_MD, image_dir)
+
+    # 将markdown中的相对图片路径转换为绝对URL路径
+    if web_images_dir:
+        md_content_str = convert_image_paths_to_absolute_urls(md_content_str, "/uploads/images/")
+
+    report_stage("writing_files")
+    md_path = os.path.join(local_md_dir, f"{pdf_file_name}.md")
+    with open(md_path, "w", encoding="utf-8") as f:
+        f.write(md_content_str)
+
+    # 按策略写出 model.json、原始PDF和布局框PDF，跳过的文件不生成也不进入缓存
+    write_document_artifacts(
+        artifact_policy, pdf_file_name, pdf_info, pdf_bytes, local_md_dir, md_writer,
+        model_output_json, report_stage, record_saving=record_artifact_savings
+    )
+
+    # 如果指定了web图片目录，将图片复制到该目录
+    if web_images_dir:
+        os.makedirs(web_images_dir, exist_ok=True)
+        if os.path.exists(local_image_dir):
+            for img_file in os.listdir(local_image_dir):
+                if img_file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
+                    src_path = os.path.join(local_image_dir, img_file)
+                    dst_path = os.path.join(web_images_dir, img_file)
+                    publish_file(src_path, dst_path)
+
+    # 保存到缓存
+    if cache_key:
+        try:
+            cached_data = cache_result_from_files(local_image_dir, local_md_dir, pdf_file_name, md_content_str)
+            if page_routing is not None:
+                cached_data['page_routing'] = page_routing
+            save_to_cache(cache_key, cached_data)
+        except Exception as e:
+            print(f"缓存保存失败: {e}")
+
+    report_stage("document_parsed")
+    return md_path, md_content_str
+
+
 def get_parsed_pdf_results(
         path_list: list[Path],
         output_dir,
@@ -88,7 +303,12 @@ def get_parsed_pdf_results(
         start_page_id=0,
         end_page_id=None,
         web_images_dir=None,  # web服务的图片目录
-        use_cache=True  # 是否使用缓存
+        use_cache=True,  # 是否使用缓存
+        processing_id=None,  # 处理ID，用于发布进度事件
+        content_digests=None,  # 每个文档的全文件SHA256摘要
+        materialize_files=True,  # 缓存命中时是否写出Markdown和辅助文件
+        artifact_policy=None,  # 辅助文件策略：none / minimal / debug
+        coalesce_parses=True  # 是否对相同cache key的解析加单飞锁
 ):
     """
     解析PDF文件并返回结果列表，每个结果包含文件路径和Markdown内容
@@ -104,14 +324,20 @@ def get_parsed_pdf_results(
         end_page_id: 解析结束页码
         web_images_dir: web服务的图片目录路径，如果提供则图片会额外复制到此目录
         use_cache: 是否使用缓存
+        processing_id: 处理ID，提供时发布各阶段的进度事件
+        content_digests: 与 path_list 一一对应的全文件SHA256摘要列表，未提供时根据文件内容计算
+        materialize_files: 缓存命中时是否把Markdown和辅助文件写入输出目录。为False且提供了
+            web_images_dir时，命中只发布缺失的图片，结果中的 md_path 为None
+        artifact_policy: 辅助文件（*_model.json、*_origin.pdf、*_layout.pdf）策略，未指定时使用配置中的默认策略
+        coalesce_parses: 是否在本进程中对相同cache key的解析加单飞锁。web服务在事件循环中已持有锁时传入False，
+            解析进程不会阻塞等待主进程持有的锁（分片解析持锁时还要使用解析进程）
         
     返回:
-        包含字典的列表，每个字典包含文件路径和Markdown内容
+        包含字典的列表，每个字典包含 file_path、md_path、md_content 和 page_routing
+        （每页的分流摘要，未启用文本通道时为None）
     """
     from mineru.cli.common import prepare_env, convert_pdf_bytes_to_bytes_by_pypdfium2, read_fn
     from mineru.data.data_reader_writer import FileBasedDataWriter
-    from mineru.utils.draw_bbox import draw_layout_bbox, draw_span_bbox
-    from mineru.utils.enum_class import MakeMode
     
     if backend == "pipeline":
         from mineru.backend.pipeline.pipeline_analyze import doc_analyze as pipeline_doc_analyze
@@ -121,176 +347,239 @@ def get_parsed_pdf_results(
         from mineru.backend.vlm.vlm_analyze import doc_analyze as vlm_doc_analyze
         from mineru.backend.vlm.vlm_middle_json_mkcontent import union_make as vlm_union_make
     
+    artifact_policy = resolve_artifact_policy(artifact_policy)
+    
     file_name_list = []
     pdf_bytes_list = []
-    lang_list = []
     for path in path_list:
-        file_name = str(Path(path).stem)
-        pdf_bytes = read_fn(path)
-        file_name_list.append(file_name)
-        pdf_bytes_list.append(pdf_bytes)
-        lang_list.append(lang)
-    
-    results = []
+        file_name_list.append(str(Path(path).stem))
+        pdf_bytes_list.append(read_fn(path))
+    document_count = len(pdf_bytes_list)
     
-    # 处理每个PDF文件
-    for idx, pdf_bytes in enumerate(pdf_bytes_list):
-        pdf_file_name = file_name_list[idx]
-        
-        # 生成缓存key
-        cache_key = None
-        if use_cache:
-            cache_key = generate_pdf_cache_key(
-                pdf_bytes, backend, method, lang, start_page_id, end_page_id
-            )
-            
-            # 尝试从缓存获取结果
-            cached_result = get_cached_result(cache_key)
-            if cached_result:
-                try:
-                    # 从缓存恢复文件
-                    restore_result = restore_cached_files(
-                        cached_result, output_dir, pdf_file_name, method, web_images_dir
-                    )
-                    results.append({
-                        'file_path': str(path_list[idx]),
-                        'md_path': restore_result['md_path'],
-                        'md_content': restore_result['md_content']
-                    })
-                    continue  # 跳过实际解析，使用缓存结果
-                except Exception as e:
-                    print(f"缓存结果恢复失败: {e}，将重新解析")
+    results: List[Optional[Dict[str, Any]]] = [None] * document_count
+
+    def stage_reporter(doc_index):
+        """返回发布指定文档阶段事件的函数"""
+        return document_stage_reporter(processing_id, doc_index, document_count, file_name_list[doc_index])
+
+    def try_restore(doc_index, cache_key, **data):
+        """尝试用缓存结果填充指定文档，成功返回True"""
+        restore_result = restore_from_cache(
+            cache_key, output_dir, file_name_list[doc_index], method, web_images_dir, materialize_files
+        )
+        if not restore_result:
+            return False
+        results[doc_index] = {
+            'file_path': str(path_list[doc_index]),
+            'md_path': restore_result['md_path'],
+            'md_content': restore_result['md_content'],
+            'page_routing': restore_result.get('page_routing')
+        }
+        stage_reporter(doc_index)("cache_hit", **data)
+        return True
+
+    def finish_document(doc_index, pdf_info, pdf_bytes, local_image_dir, local_md_dir, md_writer, union_make,
+                        model_output_json=None, routing=None):
+        """生成Markdown，写出结果文件，发布图片并写入缓存"""
+        page_routing = summarize_routing(routing)
+        md_path, md_content_str = write_parsed_document(
+            file_name_list[doc_index], pdf_info, pdf_bytes, local_image_dir, local_md_dir, md_writer, union_make,
+            web_images_dir, cache_keys[doc_index] if use_cache else None, stage_reporter(doc_index),
+            model_output_json=model_output_json, artifact_policy=artifact_policy, page_routing=page_routing
+        )
+        results[doc_index] = {
+            'file_path': str(path_list[doc_index]),
+            'md_path': md_path,
+            'md_content': md_content_str,
+            'page_routing': page_routing
+        }
+
+    def prepare_pipeline_job(doc_index):
+        """转换页码范围，按页分流并规划页级缓存，返回待推理的文档任务"""
+        report_stage = stage_reporter(doc_index)
+        report_stage("converting_pages")
+        new_pdf_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes_list[doc_index], start_page_id, end_page_id)
+        total_pages = count_pdf_pages(new_pdf_bytes)
+        emit_progress(processing_id, "pages", document_index=doc_index, file_name=file_name_list[doc_index],
+                      total_pages=total_pages)
+        local_image_dir, local_md_dir = prepare_env(output_dir, file_name_list[doc_index], method)
+        job = {
+            'doc_index': doc_index,
+            'pdf_bytes': new_pdf_bytes,
+            'local_image_dir': local_image_dir,
+            'local_md_dir': local_md_dir,
+            'page_plan': None,
+            'parse_method': method,
+            'sub_pdfs': [new_pdf_bytes],
+            'page_count': total_pages or 1,
+            'inference': None
+        }
+        use_page_cache = use_cache and PAGE_CACHE_ENABLED
+        if use_page_cache or text_fast_path:
+            # 文本通道页直接提取文本；页级缓存只解析新增或变化的页，其余页使用缓存的页面结果
+            try:
+                page_plan = plan_pipeline_pages(
+                    new_pdf_bytes, lang, method, report_stage,
+                    use_page_cache=use_page_cache, text_fast_path=text_fast_path
+                )
+                job.update(
+                    page_plan=page_plan,
+                    parse_method=page_plan['parse_method'],
+                    sub_pdfs=page_plan['sub_pdfs'],
+                    page_count=page_plan['infer_pages']
+                )
+            except Exception as e:
+                print(f"按页解析规划失败: {e}，将整篇解析")
+        return job
+
+    def finish_pipeline_job(job):
+        """把推理结果转换为 middle_json 并生成Markdown"""
+        doc_index = job['doc_index']
+        report_stage = stage_reporter(doc_index)
+        local_image_dir, local_md_dir = job['local_image_dir'], job['local_md_dir']
+        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+
+        pdf_info = None
+        routing = None
+        if job['page_plan'] is not None:
+            try:
+                pdf_info, model_output_json = assemble_pipeline_pages(
+                    job['page_plan'], job['inference'], image_writer, local_image_dir, report_stage
+                )
+                routing = job['page_plan']['routing']
+            except Exception as e:
+                print(f"按页解析失败: {e}，将整篇解析")
+
+        if pdf_info is None:
+            inference = job['inference']
+            if job['page_plan'] is not None:
+                # 按页解析失败时推理结果只覆盖部分页，单独对整篇文档重新推理
+                report_stage("doc_analyze")
+                inference = pipeline_doc_analyze(
+                    [job['pdf_bytes']], [lang], parse_method=method, formula_enable=True, table_enable=True
+                )
+            infer_results, all_image_lists, all_pdf_docs, processed_lang_list, ocr_enabled_list = inference
         
-        # 如果缓存未命中或不使用缓存，进行实际解析
-        if backend == "pipeline":
-            # Pipeline backend 处理
-            new_pdf_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id, end_page_id)
-            
-            # 单个文件解析
-            infer_results, all_image_lists, all_pdf_docs, processed_lang_list, ocr_enabled_list = pipeline_doc_analyze(
-                [new_pdf_bytes], [lang], parse_method=method, formula_enable=True, table_enable=True
-            )
-            
             model_list = infer_results[0]
             images_list = all_image_lists[0]
             pdf_doc = all_pdf_docs[0]
             _lang = processed_lang_list[0]
             _ocr_enable = ocr_enabled_list[0]
-            
-            local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, method)
-            image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
-            
+        
             # Store model output for future use if needed
             model_output_json = model_list.copy()
-            # Save model output to file
-            md_writer.write_string(
-                f"{pdf_file_name}_model.json",
-                json.dumps(model_output_json, ensure_ascii=False, indent=4),
-            )
 
+            report_stage("middle_json", ocr_enabled=bool(_ocr_enable))
             middle_json = pipeline_result_to_middle_json(model_list, images_list, pdf_doc, image_writer, _lang, _ocr_enable, True)
             pdf_info = middle_json["pdf_info"]
+        job['inference'] = None
+        finish_document(doc_index, pdf_info, job['pdf_bytes'], local_image_dir, local_md_dir, md_writer,
+                        pipeline_union_make, model_output_json, routing)
 
-            # 先生成临时的markdown内容
-            image_dir = "images"  # 临时使用相对路径生成
-            md_content_str = pipeline_union_make(pdf_info, MakeMode.MM_MD, image_dir)
-            
-            # 将markdown中的相对图片路径转换为绝对URL路径
-            if web_images_dir:
-                md_content_str = convert_image_paths_to_absolute_urls(md_content_str, "/uploads/images/")
-            
-            md_path = os.path.join(local_md_dir, f"{pdf_file_name}.md")
-            with open(md_path, "w", encoding="utf-8") as f:
-                f.write(md_content_str)
-            
-            # 保存原始PDF
-            md_writer.write(f"{pdf_file_name}_origin.pdf", new_pdf_bytes)
-            
-            # 绘制布局框
-            draw_layout_bbox(pdf_info, new_pdf_bytes, local_md_dir, f"{pdf_file_name}_layout.pdf")
-            
-            # 如果指定了web图片目录，将图片复制到该目录
-            if web_images_dir:
-                os.makedirs(web_images_dir, exist_ok=True)
-                if os.path.exists(local_image_dir):
-                    for img_file in os.listdir(local_image_dir):
-                        if img_file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                            src_path = os.path.join(local_image_dir, img_file)
-                            dst_path = os.path.join(web_images_dir, img_file)
-                            shutil.copy2(src_path, dst_path)
-            
-            # 保存到缓存
-            if use_cache and cache_key:
-                try:
-                    cached_data = cache_result_from_files(local_image_dir, local_md_dir, pdf_file_name, md_content_str)
-                    save_to_cache(cache_key, cached_data)
-                except Exception as e:
-                    print(f"缓存保存失败: {e}")
-            
-            results.append({
-                'file_path': str(path_list[idx]),
-                'md_path': md_path,
-                'md_content': md_content_str
-            })
-            
-        else:
-            # VLM backend 处理
-            backend_name = backend[4:] if backend.startswith("vlm-") else backend
-            parse_method = "vlm"
-            
-            pdf_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id, end_page_id)
-            local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
-            image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
-            middle_json, _ = vlm_doc_analyze(pdf_bytes, image_writer=image_writer, backend=backend_name, server_url=server_url)
-
-            pdf_info = middle_json["pdf_info"]
+    def parse_pipeline_documents(doc_indices):
+        """pipeline 后端：按页数预算把多个文档的待解析页合并到共享的 doc_analyze 调用中"""
+        jobs = [prepare_pipeline_job(doc_index) for doc_index in doc_indices]
+        page_budget = BATCH_PAGE_BUDGET if BATCH_INFERENCE_ENABLED else 0
+        batches = pack_inference_batches(
+            [job['page_count'] if job['sub_pdfs'] else 0 for job in jobs],
+            [job['parse_method'] for job in jobs],
+            page_budget
+        )
+        # 全部页都命中页级缓存或走文本通道的文档不需要推理
+        for job in jobs:
+            if not job['sub_pdfs']:
+                finish_pipeline_job(job)
+        for batch in batches:
+            batch_jobs = [jobs[i] for i in batch]
+            sub_pdfs = [sub_pdf for job in batch_jobs for sub_pdf in job['sub_pdfs']]
+            batch_pages = sum(job['page_count'] for job in batch_jobs)
+            for job in batch_jobs:
+                stage_data = job['page_plan']['analyze_info'] if job['page_plan'] is not None else {}
+                stage_reporter(job['doc_index'])(
+                    "doc_analyze", batch_documents=len(batch_jobs), batch_pages=batch_pages, **stage_data
+                )
+            inference = pipeline_doc_analyze(
+                sub_pdfs, [lang] * len(sub_pdfs), parse_method=batch_jobs[0]['parse_method'],
+                formula_enable=True, table_enable=True
+            )
+            # 按每个文档的子PDF数量把推理结果拆回各文档
+            for job, job_inference in zip(batch_jobs, split_inference_results(
+                    inference, [len(job['sub_pdfs']) for job in batch_jobs])):
+                job['inference'] = job_inference
+            del inference
+            for job in batch_jobs:
+                finish_pipeline_job(job)
 
-            # 先生成临时的markdown内容
-            image_dir = "images"  # 临时使用相对路径生成
-            md_content_str = vlm_union_make(pdf_info, MakeMode.MM_MD, image_dir)
-            
-            # 将markdown中的相对图片路径转换为绝对URL路径
-            if web_images_dir:
-                md_content_str = convert_image_paths_to_absolute_urls(md_content_str, "/uploads/images/")
-            
-            md_path = os.path.join(local_md_dir, f"{pdf_file_name}.md")
-            with open(md_path, "w", encoding="utf-8") as f:
-                f.write(md_content_str)
-            
-            # 保存原始PDF
-            md_writer.write(f"{pdf_file_name}_origin.pdf", pdf_bytes)
-            
-            # 绘制布局框
-            draw_layout_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_layout.pdf")
-
-            # 如果指定了web图片目录，将图片复制到该目录
-            if web_images_dir:
-                os.makedirs(web_images_dir, exist_ok=True)
-                if os.path.exists(local_image_dir):
-                    for img_file in os.listdir(local_image_dir):
-                        if img_file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                            src_path = os.path.join(local_image_dir, img_file)
-                            dst_path = os.path.join(web_images_dir, img_file)
-                            shutil.copy2(src_path, dst_path)
-
-            # 保存到缓存
-            if use_cache and cache_key:
-                try:
-                    cached_data = cache_result_from_files(local_image_dir, local_md_dir, pdf_file_name, md_content_str)
-                    save_to_cache(cache_key, cached_data)
-                except Exception as e:
-                    print(f"缓存保存失败: {e}")
-
-            results.append({
-                'file_path': str(path_list[idx]),
-                'md_path': md_path,
-                'md_content': md_content_str
-            })
+    def parse_vlm_document(doc_index):
+        """VLM 后端：逐个文档解析"""
+        report_stage = stage_reporter(doc_index)
+        backend_name = backend[4:] if backend.startswith("vlm-") else backend
+        parse_method = "vlm"
+    
+        report_stage("converting_pages")
+        pdf_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes_list[doc_index], start_page_id, end_page_id)
+        emit_progress(processing_id, "pages", document_index=doc_index, file_name=file_name_list[doc_index],
+                      total_pages=count_pdf_pages(pdf_bytes))
+        local_image_dir, local_md_dir = prepare_env(output_dir, file_name_list[doc_index], parse_method)
+        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+        report_stage("doc_analyze")
+        middle_json, _ = vlm_doc_analyze(pdf_bytes, image_writer=image_writer, backend=backend_name, server_url=server_url)
+        finish_document(doc_index, middle_json["pdf_info"], pdf_bytes, local_image_dir, local_md_dir, md_writer, vlm_union_make)
+    
+    # 查找整篇缓存，收集需要解析的文档
+    text_fast_path = uses_text_fast_path(backend, method)
+    cache_keys: List[Optional[str]] = [None] * document_count
+    pending = []
+    for idx, pdf_bytes in enumerate(pdf_bytes_list):
+        if use_cache:
+            cache_keys[idx] = generate_pdf_cache_key(
+                pdf_bytes, backend, method, lang, start_page_id, end_page_id,
+                content_digest=content_digests[idx] if content_digests else None, text_fast_path=text_fast_path
+            )
+            if try_restore(idx, cache_keys[idx]):
+                continue  # 跳过实际解析，使用缓存结果
+        pending.append(idx)
+    
+    # 同一请求中内容相同的文档只解析一次：文档下标 -> 首个相同文档的下标
+    duplicates = {}
+    with ExitStack() as locks:
+        # 同一节点上相同cache key的解析只执行一次，后到的请求等待先到者完成后直接复用缓存结果。
+        # 按cache key的顺序加锁，多个进程同时处理有重叠的批量请求时不会互相等待形成死锁
+        to_parse = []
+        locked_keys = {}
+        for idx in sorted(pending, key=lambda i: cache_keys[i] or ""):
+            cache_key = cache_keys[idx]
+            if cache_key in locked_keys:
+                duplicates[idx] = locked_keys[cache_key]
+                continue
+            waited = locks.enter_context(single_flight(
+                PARSE_LOCK_DIR, cache_key if coalesce_parses else None, timeout=PARSE_LOCK_TIMEOUT,
+                on_wait=lambda doc_index=idx: stage_reporter(doc_index)("waiting_for_duplicate")
+            ))
+            if cache_key:
+                locked_keys[cache_key] = idx
+            if waited and try_restore(idx, cache_key, coalesced=True):
+                continue
+            to_parse.append(idx)
+        to_parse.sort()
+        
+        # 缓存未命中或不使用缓存，进行实际解析
+        if backend == "pipeline":
+            parse_pipeline_documents(to_parse)
+        else:
+            for idx in to_parse:
+                parse_vlm_document(idx)
+    
+    for idx, first_index in duplicates.items():
+        if not try_restore(idx, cache_keys[idx], coalesced=True):
+            results[idx] = dict(results[first_index], file_path=str(path_list[idx]))
     
     return results
 
 
-def mineru_pdf2md(pdf_file_path, md_output_path, return_path=False, backend="pipeline", method="auto", lang="ch", web_images_dir=None, use_cache=True):
+def mineru_pdf2md(pdf_file_path, md_output_path, return_path=False, backend="pipeline", method="auto", lang="ch", web_images_dir=None, use_cache=True,
+                  processing_id=None, content_sha256=None, materialize_files=True, artifact_policy=None,
+                  return_details=False, coalesce_parses=True):
     """
     将PDF文件转换为Markdown格式
     
@@ -303,6 +592,12 @@ def mineru_pdf2md(pdf_file_path, md_output_path, return_path=False, backend="pip
         lang: 语言选项，默认为"ch"
         web_images_dir: web服务的图片目录路径，图片会额外复制到此目录
         use_cache: 是否使用缓存，默认为True
+        processing_id: 处理ID，提供时发布解析进度事件
+        content_sha256: PDF全文件SHA256摘要，上传时已计算的可直接传入，避免重复计算
+        materialize_files: 缓存命中时是否写出Markdown和辅助文件（为False时 return_path 返回None）
+        artifact_policy: 辅助文件策略（none / minimal / debug），未指定时使用配置中的默认策略
+        return_details: 为True时返回完整的结果字典（md_path、md_content、page_routing 等），忽略 return_path
+        coalesce_parses: 是否对相同cache key的解析加单飞锁，调用方已持有锁时传入False
         
     返回:
         如果return_path=True，返回生成的Markdown文件路径；否则返回生成的Markdown内容
@@ -329,7 +624,12 @@ def mineru_pdf2md(pdf_file_path, md_output_path, return_path=False, backend="pip
         backend=backend,
         method=method,
         web_images_dir=web_images_dir,
-        use_cache=use_cache
+        use_cache=use_cache,
+        processing_id=processing_id,
+        content_digests=[content_sha256] if content_sha256 else None,
+        materialize_files=materialize_files,
+        artifact_policy=artifact_policy,
+        coalesce_parses=coalesce_parses
     )
     
     # 确保结果不为空
@@ -338,6 +638,8 @@ def mineru_pdf2md(pdf_file_path, md_output_path, return_path=False, backend="pip
     
     result = results[0]
     
+    if return_details:
+        return result
     if return_path:
         return result['md_path']
     else:
@@ -345,7 +647,10 @@ def mineru_pdf2md(pdf_file_path, md_output_path, return_path=False, backend="pip
 
 
 def mineru_multi_pdf2md(pdf_file_paths: List[str], md_output_path: str, return_content=True, 
-                        backend="pipeline", method="auto", lang="ch", web_images_dir=None, use_cache=True) -> List[Dict[str, Any]]:
+                        backend="pipeline", method="auto", lang="ch", web_images_dir=None, use_cache=True,
+                        processing_id=None, content_sha256_list=None,
+                        materialize_files=True, artifact_policy=None,
+                        coalesce_parses=True) -> List[Dict[str, Any]]:
     """
     批量处理多个PDF文件，转换为Markdown格式
     
@@ -358,6 +663,11 @@ def mineru_multi_pdf2md(pdf_file_paths: List[str], md_output_path: str, return_c
         lang: 语言选项
         web_images_dir: web服务的图片目录路径，图片会额外复制到此目录
         use_cache: 是否使用缓存，默认为True
+        processing_id: 处理ID，提供时发布解析进度事件
+        content_sha256_list: 与 pdf_file_paths 一一对应的全文件SHA256摘要列表
+        materialize_files: 缓存命中时是否写出Markdown和辅助文件
+        artifact_policy: 辅助文件策略（none / minimal / debug），未指定时使用配置中的默认策略
+        coalesce_parses: 是否对相同cache key的解析加单飞锁，调用方已持有锁时传入False
         
     返回:
         包含每个PDF处理结果的字典列表
@@ -383,7 +693,12 @@ def mineru_multi_pdf2md(pdf_file_paths: List[str], md_output_path: str, return_c
         backend=backend,
         method=method,
         web_images_dir=web_images_dir,
-        use_cache=use_cache
+        use_cache=use_cache,
+        processing_id=processing_id,
+        content_digests=content_sha256_list,
+        materialize_files=materialize_files,
+        artifact_policy=artifact_policy,
+        coalesce_parses=coalesce_parses
     )
     
     # 如果不需要返回内容，则删除md_content字段
@@ -395,10 +710,23 @@ def mineru_multi_pdf2md(pdf_file_paths: List[str], md_output_path: str, return_c
     return results
 
 
+@lru_cache(maxsize=1)
+def get_mineru_version() -> str:
+    """获取已安装的mineru版本，模型或解析逻辑随版本变化，版本号参与缓存key"""
+    try:
+        from importlib.metadata import version
+        return version("mineru")
+    except Exception:
+        return "unknown"
+
+
 def generate_pdf_cache_key(pdf_bytes: bytes, backend: str, method: str, lang: str, 
-                          start_page_id: int, end_page_id: Optional[int]) -> str:
+                          start_page_id: int, end_page_id: Optional[int],
+                          content_digest: Optional[str] = None,
+                          formula_enable: bool = True, table_enable: bool = True,
+                          text_fast_path: bool = False) -> str:
     """
-    生成PDF缓存key，基于文件前8k内容和解析参数
+    生成PDF缓存key，基于全文件SHA256摘要和解析参数
     
     参数:
         pdf_bytes: PDF文件二进制内容
@@ -407,23 +735,427 @@ def generate_pdf_cache_key(pdf_bytes: bytes, backend: str, method: str, lang: st
         lang: 语言
         start_page_id: 开始页码
         end_page_id: 结束页码
+        content_digest: 已计算好的全文件SHA256摘要（如上传时流式计算的），未提供时根据pdf_bytes计算
+        formula_enable: 是否启用公式识别
+        table_enable: 是否启用表格识别
+        text_fast_path: 是否启用原生文本页快速通道（见 uses_text_fast_path）
         
     返回:
-        缓存key字符串
+        缓存key字符串，格式: pdf_parse_v2_{文件摘要}_{参数哈希}
     """
-    # 取前8k内容作为文件标识
-    file_content = pdf_bytes[:8192]
+    file_hash = content_digest or hashlib.sha256(pdf_bytes).hexdigest()
     
-    # 生成文件内容的哈希值
-    file_hash = hashlib.sha256(file_content).hexdigest()
-    
-    # 结合解析参数生成完整的缓存key
-    params = f"{backend}_{method}_{lang}_{start_page_id}_{end_page_id}"
-    cache_key = f"pdf_parse_{file_hash}_{hashlib.md5(params.encode()).hexdigest()}"
+    # 解析参数、mineru版本和模型开关都会影响结果，一起参与参数哈希
+    params = (
+        f"{backend}_{method}_{lang}_{start_page_id}_{end_page_id}"
+        f"_mineru={get_mineru_version()}_formula={formula_enable}_table={table_enable}"
+    )
+    if text_fast_path:
+        params += f"_text_fast_path=v{TEXT_FAST_PATH_VERSION}"
+    cache_key = f"{CACHE_KEY_PREFIX}{file_hash}_{hashlib.md5(params.encode()).hexdigest()}"
     
     return cache_key
 
 
+def migrate_pdf_cache() -> int:
+    """
+    迁移缓存目录到当前key格式
+
+    v1 的key只基于文件前8KB，无法换算成全文件摘要，旧条目既不会再被命中，
+    又可能返回错误文档的结果，因此直接删除。迁移完成后写入格式版本标记，只执行一次。
+
+    返回:
+        删除的旧条目数量
+    """
+    try:
+        if cache.get(CACHE_SCHEMA_MARKER_KEY) == CACHE_SCHEMA_VERSION:
+            return 0
+        removed = 0
+        for key in list(cache.iterkeys()):
+            if (isinstance(key, str) and key.startswith(LEGACY_CACHE_KEY_PREFIX)
+                    and not key.startswith(CACHE_KEY_PREFIX)):
+                if cache.delete(key):
+                    removed += 1
+        cache.set(CACHE_SCHEMA_MARKER_KEY, CACHE_SCHEMA_VERSION)
+        if removed:
+            print(f"PDF解析缓存已迁移到 v{CACHE_SCHEMA_VERSION}，删除旧格式条目 {removed} 个")
+        return removed
+    except Exception as e:
+        print(f"PDF解析缓存迁移失败: {e}")
+        return 0
+
+
+def generate_page_cache_key(fingerprints: List[str], page_index: int, parse_method: str, lang: str,
+                            formula_enable: bool = True, table_enable: bool = True,
+                            text_fast_path: bool = False) -> str:
+    """
+    生成页级缓存key，基于本页及相邻页的指纹和解析参数
+
+    参数:
+        fingerprints: 全部页面的指纹
+        page_index: 页码（从0开始）
+        parse_method: 实际使用的解析方法（auto 已解析为 txt / ocr）
+        lang: 语言
+        formula_enable: 是否启用公式识别
+        table_enable: 是否启用表格识别
+        text_fast_path: 是否启用了文本通道（启用时模型页的上下文不包含文本通道页，结果可能不同）
+
+    返回:
+        缓存key字符串，格式: pdf_page_v1_{相邻页摘要}_{参数哈希}
+    """
+    params = (
+        f"pipeline_{parse_method}_{lang}"
+        f"_mineru={get_mineru_version()}_formula={formula_enable}_table={table_enable}"
+    )
+    if text_fast_path:
+        params += f"_text_fast_path=v{TEXT_FAST_PATH_VERSION}"
+    return f"{PAGE_CACHE_KEY_PREFIX}{neighborhood_digest(fingerprints, page_index)}_{hashlib.md5(params.encode()).hexdigest()}"
+
+
+def uses_text_fast_path(backend: str, method: str) -> bool:
+    """是否对该请求启用原生文本页快速通道（只用于 pipeline 后端的 auto 方法）"""
+    return TEXT_FAST_PATH_ENABLED and backend == "pipeline" and method == "auto"
+
+
+def plan_pipeline_pages(pdf_bytes: bytes, lang: str, method: str, report_stage,
+                        use_page_cache: bool = True, text_fast_path: bool = False) -> Dict[str, Any]:
+    """
+    按页规划解析（pipeline后端）：文本通道页直接生成页面结果，其余页查找页级缓存，
+    把需要模型解析的页合并为带上下文的页段并拆成子PDF。子PDF由调用方送入 doc_analyze
+    （可与其他文档合并为一次调用），再用 assemble_pipeline_pages 按页序拼出结果
+
+    参数:
+        pdf_bytes: 已按页码范围转换后的PDF内容
+        lang: 语言
+        method: 解析方法，auto 时对需要模型解析的页分类，保证各页段使用相同的方法
+        report_stage: 阶段事件回调
+        use_page_cache: 是否使用页级缓存
+        text_fast_path: 是否先检查每页，文本层干净的页走文本通道
+
+    返回:
+        解析计划，sub_pdfs 为需要推理的子PDF列表，infer_pages 为其总页数（含上下文页），
+        routing 为每页的分流结果（未启用文本通道时为None）
+    """
+    from mineru.utils.pdf_classify import classify
+
+    routing, text_pages = None, {}
+    if text_fast_path:
+        routing, text_pages = route_pdf_pages(pdf_bytes)
+        summary = summarize_routing(routing)
+        report_stage("page_routing", text_pages=summary['text_pages'], model_pages=summary['model_pages'])
+        total_pages = len(routing)
+    else:
+        total_pages = count_pdf_pages(pdf_bytes) or 0
+    model_pages = [i for i in range(total_pages) if i not in text_pages]
+
+    parse_method = method
+    if method == "auto":
+        # 文本通道页不参与分类，避免干净的文本页把扫描页判成 txt
+        classify_bytes = pdf_bytes
+        if text_pages:
+            classify_bytes = extract_pdf_pages(pdf_bytes, model_pages) if model_pages else None
+        parse_method = "txt" if classify_bytes is None or classify(classify_bytes) == "txt" else "ocr"
+
+    fragments: List[Optional[Dict[str, Any]]] = [None] * total_pages
+    page_keys = None
+    if use_page_cache:
+        fingerprints = compute_page_fingerprints(pdf_bytes, PAGE_CACHE_RENDER_SCALE)
+        page_keys = [
+            generate_page_cache_key(fingerprints, i, parse_method, lang, text_fast_path=text_fast_path)
+            for i in range(total_pages)
+        ]
+        for i in model_pages:
+            fragments[i] = get_cached_result(page_keys[i])
+    for i, page_info in text_pages.items():
+        fragments[i] = {'page_info': page_info, 'model': text_page_model(page_info), 'images': {}}
+    missing_pages = [
+        i for i in model_pages
+        if not fragments[i] or not all(blob_store.exists(d) for d in fragments[i].get('images', {}).values())
+    ]
+    if use_page_cache:
+        report_stage("page_cache", total_pages=total_pages, cached_pages=len(model_pages) - len(missing_pages))
+
+    runs = plan_page_runs(missing_pages, total_pages, eligible=set(model_pages) if text_pages else None)
+    infer_pages = sum(end - start + 1 for start, end in runs)
+    if runs == [(0, total_pages - 1)]:
+        sub_pdfs = [pdf_bytes]
+    else:
+        sub_pdfs = [extract_pdf_pages(pdf_bytes, range(start, end + 1)) for start, end in runs]
+    return {
+        'parse_method': parse_method,
+        'page_keys': page_keys,
+        'fragments': fragments,
+        'missing_pages': missing_pages,
+        'runs': runs,
+        'sub_pdfs': sub_pdfs,
+        'infer_pages': infer_pages,
+        'routing': routing,
+        'analyze_info': {
+            'pages_to_parse': len(missing_pages),
+            'context_pages': infer_pages - len(missing_pages)
+        }
+    }
+
+
+def renumber_page_fragment(fragment: Dict[str, Any], page_index: int) -> None:
+    """把页面结果中的 page_idx 和模型输出中的 page_no 设为该页在输出文档中的页码"""
+    fragment['page_info']['page_idx'] = page_index
+    page_model = fragment.get('model')
+    if isinstance(page_model, dict) and isinstance(page_model.get('page_info'), dict):
+        page_model['page_info']['page_no'] = page_index
+
+
+def assemble_pipeline_pages(plan: Dict[str, Any], inference: Optional[Tuple[list, ...]], image_writer,
+                            local_image_dir: str, report_stage) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    把模型解析页段的推理结果转换为页面结果（启用页级缓存时写入缓存），与文本通道页、
+    缓存命中的页按页序拼出完整的 pdf_info
+
+    参数:
+        plan: plan_pipeline_pages 返回的解析计划
+        inference: plan['sub_pdfs'] 对应的 doc_analyze 返回值（各列表与子PDF一一对应），没有需要推理的页时为None
+        image_writer: 图片写入器
+        local_image_dir: 图片目录，缓存命中页的图片会硬链接到此目录
+        report_stage: 阶段事件回调
+
+    返回:
+        (pdf_info, model_list)，每页的 page_idx 和模型输出的 page_no 为该页在本文档中的页码
+    """
+    fragments = list(plan['fragments'])
+    missing_set = set(plan['missing_pages'])
+    if plan['runs']:
+        from mineru.backend.pipeline.model_json_to_middle_json import result_to_middle_json as pipeline_result_to_middle_json
+
+        infer_results, all_image_lists, all_pdf_docs, processed_lang_list, ocr_enabled_list = inference
+        report_stage("middle_json", ocr_enabled=bool(ocr_enabled_list[0]))
+        for run_index, (start, _) in enumerate(plan['runs']):
+            model_list = copy.deepcopy(infer_results[run_index])
+            middle_json = pipeline_result_to_middle_json(
+                infer_results[run_index], all_image_lists[run_index], all_pdf_docs[run_index], image_writer,
+                processed_lang_list[run_index], ocr_enabled_list[run_index], True
+            )
+            for offset, page_info in enumerate(middle_json["pdf_info"]):
+                page_index = start + offset
+                # 上下文页只用于保证跨页合并一致，结果以缓存为准
+                if page_index not in missing_set:
+                    continue
+                fragment = {
+                    'storage': 'blob',
+                    'page_info': page_info,
+                    'model': model_list[offset],
+                    'images': {},
+                    'files': {}
+                }
+                if plan['page_keys'] is not None:
+                    fragment['images'] = {
+                        name: blob_store.put_file(os.path.join(local_image_dir, name))
+                        for name in collect_image_paths(page_info)
+                        if os.path.isfile(os.path.join(local_image_dir, name))
+                    }
+                    save_to_cache(plan['page_keys'][page_index], fragment)
+                fragments[page_index] = fragment
+
+    # 缓存命中页的图片从缓存硬链接到本地图片目录，后续发布和整篇缓存与整篇解析时一致
+    os.makedirs(local_image_dir, exist_ok=True)
+    for page_index, fragment in enumerate(fragments):
+        # 页级缓存按内容复用，同一页在其他文档或页码范围中的位置可能不同，所有页都按输出中的位置重新编号
+        renumber_page_fragment(fragment, page_index)
+        if page_index in missing_set:
+            continue
+        for name, digest in fragment.get('images', {}).items():
+            publish_file(blob_store.path_for(digest), os.path.join(local_image_dir, name))
+
+    return [fragment['page_info'] for fragment in fragments], [fragment['model'] for fragment in fragments]
+
+
+def classify_pdf_method(pdf_file_path: str) -> str:
+    """对整篇文档判断解析方法（txt / ocr），分片解析时各分片使用相同的方法"""
+    from mineru.cli.common import read_fn
+    from mineru.utils.pdf_classify import classify
+
+    return "txt" if classify(read_fn(pdf_file_path)) == "txt" else "ocr"
+
+
+def parse_pdf_shard(pdf_file_path: str, shard_dir: str, shard_index: int, start_page: int, end_page: int,
+                    lang: str, parse_method: str, context_pages: int = 1,
+                    text_fast_path: bool = False, web_images_dir: Optional[str] = None,
+                    render_markdown: bool = False) -> Dict[str, Any]:
+    """
+    解析大文档的一个页段（pipeline后端，在解析进程池中执行）
+
+    页段两侧各多解析 context_pages 页作为上下文，只保留本页段的页面结果，保证分片边界的跨页合并与整篇解析一致。
+    启用文本通道时，文本层干净的页直接提取文本，其余页交给模型解析。
+    render_markdown 为True时（流式输出），还会逐页调用 union_make，把每页的Markdown按行写入
+    {shard_dir}/shard_{序号}.ndjson，并立即把本页段的图片发布到 web_images_dir，客户端收到页面时图片已可访问。
+    MinerU 按分片内的页码命名图片，不同分片的图片会重名，因此本页段引用的图片按内容SHA256重命名后
+    移到 {shard_dir}/images，页面结果写入 {shard_dir}/shard_{序号}.json，由 merge_pdf_shards 合并。
+
+    参数:
+        pdf_file_path: PDF文件路径
+        shard_dir: 分片工作目录（各分片共享）
+        shard_index: 分片序号
+        start_page: 起始页码（从0开始，含）
+        end_page: 结束页码（含）
+        lang: 语言
+        parse_method: 实际使用的解析方法（txt / ocr）
+        context_pages: 每侧的上下文页数
+        text_fast_path: 是否启用原生文本页快速通道
+        web_images_dir: web服务的图片目录（render_markdown 时发布图片并把图片路径转换为URL）
+        render_markdown: 是否逐页生成Markdown
+
+    返回:
+        分片信息，包含页码范围、结果文件路径、图片数量、本页段每页的分流结果（未启用文本通道时为None）
+        和逐页Markdown文件路径（未逐页生成时为None）
+    """
+    from mineru.cli.common import convert_pdf_bytes_to_bytes_by_pypdfium2, read_fn
+    from mineru.data.data_reader_writer import FileBasedDataWriter
+    from mineru.backend.pipeline.pipeline_analyze import doc_analyze as pipeline_doc_analyze
+
+    pdf_bytes = read_fn(pdf_file_path)
+    total_pages = count_pdf_pages(pdf_bytes) or end_page + 1
+    context_start = max(0, start_page - context_pages)
+    context_end = min(total_pages - 1, end_page + context_pages)
+    shard_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, context_start, context_end)
+
+    local_image_dir = os.path.join(shard_dir, f"shard_{shard_index}", "images")
+    image_writer = FileBasedDataWriter(local_image_dir)
+    # 分片的阶段事件由主进程汇总上报
+    ignore_stage = document_stage_reporter(None, shard_index, 0, "")
+    plan = plan_pipeline_pages(shard_bytes, lang, parse_method, ignore_stage,
+                               use_page_cache=False, text_fast_path=text_fast_path)
+    inference = None
+    if plan['sub_pdfs']:
+        inference = pipeline_doc_analyze(
+            plan['sub_pdfs'], [lang] * len(plan['sub_pdfs']), parse_method=parse_method,
+            formula_enable=True, table_enable=True
+        )
+    shard_info, model_list = assemble_pipeline_pages(plan, inference, image_writer, local_image_dir, ignore_stage)
+    del inference
+
+    merged_image_dir = os.path.join(shard_dir, "images")
+    os.makedirs(merged_image_dir, exist_ok=True)
+    renamed: Dict[str, str] = {}
+    pdf_info = []
+    models = []
+    for offset, page_info in enumerate(shard_info):
+        page_index = context_start + offset
+        # 上下文页只用于保证跨页合并一致，由相邻分片负责
+        if not start_page <= page_index <= end_page:
+            continue
+        for name in collect_image_paths(page_info):
+            src_path = os.path.join(local_image_dir, name)
+            if name in renamed or not os.path.isfile(src_path):
+                continue
+            with open(src_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            renamed[name] = f"{digest}{os.path.splitext(name)[1]}"
+            os.replace(src_path, os.path.join(merged_image_dir, renamed[name]))
+        rename_image_paths(page_info, renamed)
+        renumber_page_fragment({'page_info': page_info, 'model': model_list[offset]}, page_index)
+        pdf_info.append(page_info)
+        models.append(model_list[offset])
+
+    result_path = os.path.join(shard_dir, f"shard_{shard_index}.json")
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({"pdf_info": pdf_info, "model": models}, f, ensure_ascii=False)
+    shutil.rmtree(os.path.join(shard_dir, f"shard_{shard_index}"), ignore_errors=True)
+
+    routing = None
+    if plan['routing'] is not None:
+        routing = [
+            dict(decision, page=context_start + decision['page']) for decision in plan['routing']
+            if start_page <= context_start + decision['page'] <= end_page
+        ]
+
+    pages_path = None
+    if render_markdown:
+        from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make as pipeline_union_make
+        from mineru.utils.enum_class import MakeMode
+
+        if web_images_dir:
+            os.makedirs(web_images_dir, exist_ok=True)
+            for name in renamed.values():
+                publish_file(os.path.join(merged_image_dir, name), os.path.join(web_images_dir, name))
+        routes = {decision['page']: decision['route'] for decision in routing or []}
+        pages_path = os.path.join(shard_dir, f"shard_{shard_index}.ndjson")
+        with open(pages_path, "w", encoding="utf-8") as f:
+            for page_info in pdf_info:
+                page_markdown = pipeline_union_make([page_info], MakeMode.MM_MD, "images")
+                if web_images_dir:
+                    page_markdown = convert_image_paths_to_absolute_urls(page_markdown, "/uploads/images/")
+                record = {"page": page_info["page_idx"], "route": routes.get(page_info["page_idx"]), "markdown": page_markdown}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    return {
+        "shard_index": shard_index,
+        "start_page": start_page,
+        "end_page": end_page,
+        "result_path": result_path,
+        "image_count": len(renamed),
+        "routing": routing,
+        "pages_path": pages_path
+    }
+
+
+def merge_pdf_shards(pdf_file_path: str, md_output_path: str, shard_dir: str, shards: List[Dict[str, Any]],
+                     method: str = "auto", web_images_dir: Optional[str] = None, cache_key: Optional[str] = None,
+                     processing_id: Optional[str] = None, artifact_policy: Optional[str] = None,
+                     page_routing: Optional[Dict[str, Any]] = None, return_content: bool = True) -> Optional[str]:
+    """
+    按页序合并各分片的页面结果，生成一篇Markdown（在解析进程池中执行）
+
+    参数:
+        pdf_file_path: PDF文件路径
+        md_output_path: 输出目录
+        shard_dir: 分片工作目录
+        shards: parse_pdf_shard 的返回值列表
+        method: 请求的解析方法（决定输出子目录，与整篇解析一致）
+        web_images_dir: web服务的图片目录
+        cache_key: 整篇缓存key，为None时不写缓存
+        processing_id: 处理ID，提供时发布阶段事件
+        artifact_policy: 辅助文件策略，未指定时使用配置中的默认策略
+        page_routing: 全文档的分流摘要，随整篇缓存保存
+        return_content: 是否返回Markdown内容（流式输出已逐页发送，不需要再把整篇内容传回主进程）
+
+    返回:
+        Markdown内容，return_content 为False时返回None
+    """
+    from mineru.cli.common import prepare_env, convert_pdf_bytes_to_bytes_by_pypdfium2, read_fn
+    from mineru.data.data_reader_writer import FileBasedDataWriter
+    from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make as pipeline_union_make
+
+    pdf_file_name = str(Path(pdf_file_path).stem)
+    report_stage = document_stage_reporter(processing_id, 0, 1, pdf_file_name)
+    report_stage("merging_shards", shard_count=len(shards))
+
+    local_image_dir, local_md_dir = prepare_env(md_output_path, pdf_file_name, method)
+    md_writer = FileBasedDataWriter(local_md_dir)
+    merged_image_dir = os.path.join(shard_dir, "images")
+    if os.path.isdir(merged_image_dir):
+        for name in os.listdir(merged_image_dir):
+            os.replace(os.path.join(merged_image_dir, name), os.path.join(local_image_dir, name))
+
+    pdf_info = []
+    model_output_json = []
+    for shard in sorted(shards, key=lambda item: item["start_page"]):
+        with open(shard["result_path"], "r", encoding="utf-8") as f:
+            shard_result = json.load(f)
+        pdf_info.extend(shard_result["pdf_info"])
+        model_output_json.extend(shard_result["model"])
+
+    policy = resolve_artifact_policy(artifact_policy)
+    # 只有需要写出原始PDF或布局框时才用到完整的PDF内容
+    pdf_bytes = b""
+    if policy == "debug":
+        pdf_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(read_fn(pdf_file_path), 0, None)
+    _, md_content = write_parsed_document(
+        pdf_file_name, pdf_info, pdf_bytes, local_image_dir, local_md_dir, md_writer, pipeline_union_make,
+        web_images_dir, cache_key, report_stage, model_output_json=model_output_json, artifact_policy=policy,
+        page_routing=page_routing
+    )
+    return md_content if return_content else None
+
+
 def get_cached_result(cache_key: str):
     """
     从缓存获取解析结果
@@ -456,55 +1188,99 @@ def save_to_cache(cache_key: str, result: Dict[str, Any], expire_time: int = 7 *
         print(f"缓存保存失败: {e}")
 
 
+def restore_from_cache(cache_key: str, output_dir: str, pdf_file_name: str, method: str,
+                       web_images_dir: Optional[str], materialize_files: bool) -> Optional[Dict[str, Any]]:
+    """
+    查找缓存并恢复结果，未命中或恢复失败时返回None
+
+    返回:
+        包含 md_path、md_content 和 page_routing 的字典
+    """
+    cached_result = get_cached_result(cache_key)
+    if not cached_result:
+        return None
+    try:
+        return restore_cached_files(
+            cached_result, output_dir, pdf_file_name, method, web_images_dir,
+            materialize_files=materialize_files
+        )
+    except Exception as e:
+        print(f"缓存结果恢复失败: {e}，将重新解析")
+        return None
+
+
 def restore_cached_files(cached_result: Dict[str, Any], output_dir: str, 
-                        pdf_file_name: str, method: str, web_images_dir: Optional[str] = None):
+                        pdf_file_name: str, method: str, web_images_dir: Optional[str] = None,
+                        materialize_files: bool = True):
     """
     从缓存结果恢复文件到指定目录
     
     参数:
-        cached_result: 缓存的解析结果
+        cached_result: 缓存的解析结果（清单格式，或旧版本内联了文件内容的格式）
         output_dir: 输出目录
         pdf_file_name: PDF文件名
         method: 解析方法
         web_images_dir: web服务的图片目录路径
+        materialize_files: 是否把Markdown、图片和辅助文件写入输出目录。为False且提供了
+            web_images_dir时只把缺失的图片从缓存硬链接到 web_images_dir，Markdown直接引用
+            已发布的图片地址，不写出任何其他文件
         
     返回:
-        包含文件路径和内容的字典
+        包含文件路径和内容的字典，未写出Markdown文件时 md_path 为None
+
+    异常:
+        FileNotFoundError: 清单引用的文件已不存在，调用方应重新解析
     """
+    use_blob_store = cached_result.get('storage') == 'blob'
+    md_content = cached_result.get('md_content', '')
+    cached_images = cached_result.get('images', {})
+    
+    # 如果有web图片目录，更新markdown中的图片路径
+    if web_images_dir:
+        md_content = convert_image_paths_to_absolute_urls(md_content, "/uploads/images/")
+    
+    # 零拷贝命中：图片已按内容摘要保存在缓存中，只需确保web目录中存在同名文件
+    if not materialize_files and web_images_dir and use_blob_store:
+        os.makedirs(web_images_dir, exist_ok=True)
+        for img_name, digest in cached_images.items():
+            publish_file(blob_store.path_for(digest), os.path.join(web_images_dir, img_name))
+        return {
+            'md_path': None,
+            'md_content': md_content,
+            'page_routing': cached_result.get('page_routing')
+        }
+    
     from mineru.cli.common import prepare_env
     
     # 准备输出目录
     local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, method)
     
     # 恢复markdown文件
-    md_content = cached_result.get('md_content', '')
     md_path = os.path.join(local_md_dir, f"{pdf_file_name}.md")
-    
-    # 如果有web图片目录，更新markdown中的图片路径
-    if web_images_dir:
-        md_content = convert_image_paths_to_absolute_urls(md_content, "/uploads/images/")
-    
     with open(md_path, "w", encoding="utf-8") as f:
         f.write(md_content)
     
     # 恢复图片文件
-    cached_images = cached_result.get('images', {})
     for img_name, img_data in cached_images.items():
         img_path = os.path.join(local_image_dir, img_name)
-        with open(img_path, "wb") as f:
-            f.write(img_data)
+        if use_blob_store:
+            blob_store.copy_to(img_data, img_path)
+        else:
+            with open(img_path, "wb") as f:
+                f.write(img_data)
         
-        # 如果指定了web图片目录，也复制到那里
+        # 如果指定了web图片目录，也发布到那里
         if web_images_dir:
             os.makedirs(web_images_dir, exist_ok=True)
-            web_img_path = os.path.join(web_images_dir, img_name)
-            shutil.copy2(img_path, web_img_path)
+            publish_file(img_path, os.path.join(web_images_dir, img_name))
     
     # 恢复其他文件
     cached_files = cached_result.get('files', {})
     for file_name, file_data in cached_files.items():
         file_path = os.path.join(local_md_dir, file_name)
-        if isinstance(file_data, str):
+        if use_blob_store:
+            blob_store.copy_to(file_data, file_path)
+        elif isinstance(file_data, str):
             with open(file_path, "w", encoding="utf-8") as f:
                 f.write(file_data)
         else:
@@ -513,14 +1289,15 @@ def restore_cached_files(cached_result: Dict[str, Any], output_dir: str,
     
     return {
         'md_path': md_path,
-        'md_content': md_content
+        'md_content': md_content,
+        'page_routing': cached_result.get('page_routing')
     }
 
 
 def cache_result_from_files(local_image_dir: str, local_md_dir: str, 
                            pdf_file_name: str, md_content: str) -> Dict[str, Any]:
     """
-    从文件系统中收集需要缓存的结果
+    把解析产生的图片和辅助文件存入内容寻址存储，返回缓存条目的清单
     
     参数:
         local_image_dir: 图片目录
@@ -529,9 +1306,10 @@ def cache_result_from_files(local_image_dir: str, local_md_dir: str,
         md_content: markdown内容
         
     返回:
-        包含缓存数据的字典
+        清单字典: md_content 为Markdown内容，images / files 为 文件名 -> SHA256摘要
     """
     cached_result = {
+        'storage': 'blob',
         'md_content': md_content,
         'images': {},
         'files': {}
@@ -542,8 +1320,7 @@ def cache_result_from_files(local_image_dir: str, local_md_dir: str,
         for img_file in os.listdir(local_image_dir):
             if img_file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
                 img_path = os.path.join(local_image_dir, img_file)
-                with open(img_path, "rb") as f:
-                    cached_result['images'][img_file] = f.read()
+                cached_result['images'][img_file] = blob_store.put_file(img_path)
     
     # 收集其他文件（如JSON、PDF等）
     if os.path.exists(local_md_dir):
@@ -551,16 +1328,46 @@ def cache_result_from_files(local_image_dir: str, local_md_dir: str,
             if file_name != f"{pdf_file_name}.md":  # 排除主要的markdown文件
                 file_path = os.path.join(local_md_dir, file_name)
                 if os.path.isfile(file_path):
-                    if file_name.endswith('.json'):
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            cached_result['files'][file_name] = f.read()
-                    else:
-                        with open(file_path, "rb") as f:
-                            cached_result['files'][file_name] = f.read()
+                    cached_result['files'][file_name] = blob_store.put_file(file_path)
     
     return cached_result
 
 
+def record_artifact_savings(report: Dict[str, Any]) -> None:
+    """把跳过辅助文件的估算节省量累计到缓存中（多个解析进程共享）"""
+    try:
+        cache.incr(ARTIFACT_SKIPPED_KEY, len(report['skipped']))
+        cache.incr(ARTIFACT_BYTES_SAVED_KEY, int(report['estimated_bytes_saved']))
+        cache.incr(ARTIFACT_MS_SAVED_KEY, int(report['estimated_seconds_saved'] * 1000))
+    except Exception as e:
+        print(f"辅助文件统计更新失败: {e}")
+
+
+def gc_pdf_cache_blobs() -> int:
+    """
+    清理不再被任何缓存条目引用的文件
+
+    缓存条目过期或被diskcache按容量淘汰后，其引用的文件不会自动删除，需要定期回收。
+
+    返回:
+        删除的文件数量
+    """
+    try:
+        referenced = set()
+        for key in list(cache.iterkeys()):
+            value = cache.get(key)
+            if isinstance(value, dict) and value.get('storage') == 'blob':
+                referenced.update(value.get('images', {}).values())
+                referenced.update(value.get('files', {}).values())
+        removed = blob_store.remove_unreferenced(referenced)
+        if removed:
+            print(f"清理未引用的缓存文件 {removed} 个")
+        return removed
+    except Exception as e:
+        print(f"缓存文件清理失败: {e}")
+        return 0
+
+
 def clear_pdf_cache():
     """
     清理PDF解析缓存
@@ -570,6 +1377,8 @@ def clear_pdf_cache():
     """
     try:
         cache.clear()
+        blob_store.clear()
+        cache.set(CACHE_SCHEMA_MARKER_KEY, CACHE_SCHEMA_VERSION)
         return True
     except Exception as e:
         print(f"缓存清理失败: {e}")
@@ -585,9 +1394,14 @@ def get_cache_stats():
     """
     try:
         return {
-            'cache_size': len(cache),
+            'cache_size': len(cache) - sum(int(key in cache) for key in INTERNAL_CACHE_KEYS),
+            'schema_version': CACHE_SCHEMA_VERSION,
             'cache_directory': CACHE_DIR,
             'disk_usage': cache.volume(),
+            **blob_store.stats(),
+            'artifacts_skipped': cache.get(ARTIFACT_SKIPPED_KEY, 0),
+            'artifact_bytes_saved_estimate': cache.get(ARTIFACT_BYTES_SAVED_KEY, 0),
+            'artifact_seconds_saved_estimate': round(cache.get(ARTIFACT_MS_SAVED_KEY, 0) / 1000, 3),
         }
     except Exception as e:
         print(f"获取缓存统计信息失败: {e}")
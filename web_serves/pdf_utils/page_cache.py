@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+页级缓存辅助函数 - 页面指纹、按页拆分PDF、规划需要重新解析的页段
+
+页级缓存的单位是 pipeline 后端 middle_json 中的一页（pdf_info 的一个元素）。
+MinerU 在生成 middle_json 时会把跨页的段落合并到上一页，一页的结果依赖相邻页，
+因此页缓存key由 (上一页, 本页, 下一页) 的指纹共同决定；重新解析缺失的页时，
+会在页段两侧各带上一页作为上下文，保证合并行为与整篇解析一致。
+"""
+import hashlib
+import io
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def compute_page_fingerprints(pdf_bytes: bytes, render_scale: float = 1.0) -> List[str]:
+    """
+    计算每一页的内容指纹：页面尺寸和旋转、文本层内容、低分辨率渲染结果的SHA256
+
+    参数:
+        pdf_bytes: PDF文件二进制内容
+        render_scale: 渲染比例，1.0 对应 72 DPI，只用于检测内容变化
+
+    返回:
+        每页一个指纹
+    """
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        fingerprints = []
+        for page_index in range(len(pdf)):
+            page = pdf[page_index]
+            try:
+                digest = hashlib.sha256()
+                width, height = page.get_size()
+                digest.update(f"{width:.2f}x{height:.2f}:{page.get_rotation()}".encode())
+                textpage = page.get_textpage()
+                try:
+                    digest.update(textpage.get_text_range().encode("utf-8", "replace"))
+                finally:
+                    textpage.close()
+                bitmap = page.render(scale=render_scale)
+                try:
+                    digest.update(bitmap.to_pil().tobytes())
+                finally:
+                    bitmap.close()
+            finally:
+                page.close()
+            fingerprints.append(digest.hexdigest())
+        return fingerprints
+    finally:
+        pdf.close()
+
+
+def neighborhood_digest(fingerprints: List[str], page_index: int) -> str:
+    """返回由上一页、本页、下一页指纹组成的页缓存摘要"""
+    prev_fp = fingerprints[page_index - 1] if page_index > 0 else ""
+    next_fp = fingerprints[page_index + 1] if page_index + 1 < len(fingerprints) else ""
+    return hashlib.sha256(f"{prev_fp}|{fingerprints[page_index]}|{next_fp}".encode()).hexdigest()
+
+
+def extract_pdf_pages(pdf_bytes: bytes, page_indices: Iterable[int]) -> bytes:
+    """
+    从PDF中抽取指定页组成新的PDF
+
+    参数:
+        pdf_bytes: PDF文件二进制内容
+        page_indices: 要抽取的页码（从0开始）
+
+    返回:
+        新PDF的二进制内容
+    """
+    import pypdfium2 as pdfium
+
+    src = pdfium.PdfDocument(pdf_bytes)
+    dst = pdfium.PdfDocument.new()
+    try:
+        dst.import_pages(src, list(page_indices))
+        buffer = io.BytesIO()
+        dst.save(buffer)
+        return buffer.getvalue()
+    finally:
+        dst.close()
+        src.close()
+
+
+def plan_page_runs(missing_pages: List[int], total_pages: int, context: int = 1,
+                   eligible: Optional[Set[int]] = None) -> List[Tuple[int, int]]:
+    """
+    把缺失的页合并为连续页段，两侧各扩展 context 页作为上下文，重叠或相邻的页段合并
+
+    参数:
+        missing_pages: 缺失（需要解析）的页码
+        total_pages: 总页数
+        context: 每侧扩展的上下文页数
+        eligible: 可选，允许送入模型的页码；提供时上下文只在这些页中扩展，页段也不会跨过其他页
+
+    返回:
+        (起始页, 结束页) 列表，均为闭区间
+    """
+    runs: List[Tuple[int, int]] = []
+    for page_index in sorted(set(missing_pages)):
+        start = max(0, page_index - context)
+        end = min(total_pages - 1, page_index + context)
+        if eligible is not None:
+            low = high = page_index
+            while low > start and low - 1 in eligible:
+                low -= 1
+            while high < end and high + 1 in eligible:
+                high += 1
+            start, end = low, high
+        if runs and start <= runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], max(runs[-1][1], end))
+        else:
+            runs.append((start, end))
+    return runs
+
+
+def collect_image_paths(node: Any, found: Optional[Set[str]] = None) -> Set[str]:
+    """递归收集页面结果中引用的图片文件名（span 的 image_path 字段）"""
+    if found is None:
+        found = set()
+    if isinstance(node, dict):
+        image_path = node.get("image_path")
+        if isinstance(image_path, str) and image_path:
+            found.add(image_path)
+        for value in node.values():
+            collect_image_paths(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            collect_image_paths(value, found)
+    return found
+
+
+def rename_image_paths(node: Any, mapping: Dict[str, str]) -> None:
+    """递归把页面结果中 span 的 image_path 按映射替换为新文件名"""
+    if isinstance(node, dict):
+        image_path = node.get("image_path")
+        if isinstance(image_path, str) and image_path in mapping:
+            node["image_path"] = mapping[image_path]
+        for value in node.values():
+            rename_image_paths(value, mapping)
+    elif isinstance(node, list):
+        for value in node:
+            rename_image_paths(value, mapping)
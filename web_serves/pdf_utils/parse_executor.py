@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF解析执行器 - 在独立的进程池中运行MinerU解析
+
+MinerU解析是CPU/GPU密集型的同步调用，直接在 async 路由中执行会阻塞整个
+uvicorn 事件循环（包括 /health、静态文件和图片上传）。本模块维护一个
+有界的进程池，所有解析任务都通过 run_in_parse_executor 提交到进程池中执行，
+事件循环只负责等待结果。
+
+进程池中的子进程是常驻的：启动时通过初始化函数预加载MinerU的模型，
+warm_up_parse_executor 会等待所有子进程预热完成并记录耗时，
+/health 根据 get_parse_readiness 返回的就绪状态决定是否对外提供服务。
+
+子进程中通过 emit_progress 发布的进度事件写入跨进程队列，由主进程的转发线程
+投递到 progress_broker，供 SSE 接口订阅。
+
+使用示例：
+    from web_serves.pdf_utils.parse_executor import run_in_parse_executor
+    from web_serves.pdf_utils.mineru_parse import mineru_pdf2md
+
+    markdown = await run_in_parse_executor(mineru_pdf2md, pdf_path, output_dir)
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from web_serves.config import (
+    PARSE_MAX_WORKERS,
+    PARSE_MP_START_METHOD,
+    PARSE_PRELOAD_MODELS,
+    PARSE_PRELOAD_LANGS,
+    PARSE_WARMUP_TIMEOUT
+)
+from web_serves.utils.logger import get_logger
+from web_serves.utils.progress import progress_broker, set_progress_sink, ProgressQueueForwarder
+
+logger = get_logger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+# 子进程进度事件队列及其转发线程，进程池重建时沿用
+_progress_queue = None
+_progress_forwarder: Optional[ProgressQueueForwarder] = None
+_stats = {
+    "submitted": 0,
+    "running": 0,
+    "completed": 0,
+    "failed": 0,
+    "restarts": 0,
+}
+_readiness: Dict[str, Any] = {
+    "status": "not_started",  # not_started / warming_up / ready / failed
+    "workers": [],
+    "warmup_seconds": None,
+    "error": None,
+}
+
+# 子进程内的状态（仅在解析子进程中有效）
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_parse_worker(preload_models: bool, preload_langs: List[str], warmup_barrier, progress_queue) -> None:
+    """
+    解析子进程初始化函数：常驻进程启动时预加载模型
+
+    注意：这里不能向外抛出异常，否则整个进程池会被标记为损坏，
+    预加载失败时只记录错误，由 warm_up_parse_executor 汇报。
+    """
+    _worker_state["_barrier"] = warmup_barrier
+    if progress_queue is not None:
+        set_progress_sink(progress_queue.put_nowait)
+    _worker_state.update({
+        "pid": os.getpid(),
+        "ready": False,
+        "warmup_seconds": None,
+        "error": None,
+    })
+    if not preload_models:
+        _worker_state["ready"] = True
+        return
+    try:
+        from web_serves.pdf_utils.mineru_parse import preload_pipeline_models
+        _worker_state["warmup_seconds"] = round(preload_pipeline_models(preload_langs), 2)
+        _worker_state["ready"] = True
+    except Exception as e:
+        _worker_state["error"] = f"模型预加载失败: {e}"
+
+
+def _get_worker_state(barrier_timeout: float) -> Dict[str, Any]:
+    """
+    在子进程中执行，返回该进程的预热状态
+
+    每个预热任务都会在屏障上等待，直到全部子进程都完成初始化，
+    这样 N 个预热任务一定分别落在 N 个不同的子进程上。
+    """
+    state = {key: value for key, value in _worker_state.items() if not key.startswith("_")}
+    barrier = _worker_state.get("_barrier")
+    if barrier is not None:
+        try:
+            barrier.wait(timeout=barrier_timeout)
+        except threading.BrokenBarrierError:
+            state["error"] = state.get("error") or "等待其他解析进程预热超时"
+    return state
+
+
+def start_parse_executor() -> ProcessPoolExecutor:
+    """
+    启动解析进程池（如果尚未启动）
+
+    返回:
+        ProcessPoolExecutor 实例
+    """
+    global _executor, _progress_queue, _progress_forwarder
+    with _executor_lock:
+        if _executor is None:
+            mp_context = multiprocessing.get_context(PARSE_MP_START_METHOD)
+            warmup_barrier = mp_context.Barrier(PARSE_MAX_WORKERS)
+            if _progress_queue is None:
+                _progress_queue = mp_context.Queue()
+                _progress_forwarder = ProgressQueueForwarder(_progress_queue, progress_broker)
+                _progress_forwarder.start()
+            _executor = ProcessPoolExecutor(
+                max_workers=PARSE_MAX_WORKERS,
+                mp_context=mp_context,
+                initializer=_init_parse_worker,
+                initargs=(PARSE_PRELOAD_MODELS, PARSE_PRELOAD_LANGS, warmup_barrier, _progress_queue),
+            )
+            logger.info(
+                f"解析进程池已启动: max_workers={PARSE_MAX_WORKERS}, start_method={PARSE_MP_START_METHOD}"
+            )
+        return _executor
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    """获取解析进程池，未启动时自动启动"""
+    return _executor or start_parse_executor()
+
+
+def shutdown_parse_executor(wait: bool = True) -> None:
+    """
+    关闭解析进程池
+
+    参数:
+        wait: 是否等待正在执行的任务结束
+    """
+    global _executor, _progress_queue, _progress_forwarder
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
+            _readiness.update(status="not_started", workers=[], warmup_seconds=None, error=None)
+            logger.info("解析进程池已关闭")
+        if _progress_forwarder is not None:
+            _progress_forwarder.stop()
+            _progress_forwarder = None
+            _progress_queue = None
+
+
+async def warm_up_parse_executor() -> Dict[str, Any]:
+    """
+    预热解析进程池：启动全部常驻子进程并等待其完成模型预加载
+
+    返回:
+        就绪状态字典，包含每个子进程的预热耗时
+    """
+    executor = get_parse_executor()
+    loop = asyncio.get_running_loop()
+    _readiness.update(status="warming_up", workers=[], warmup_seconds=None, error=None)
+    logger.info(f"开始预热解析进程池: {PARSE_MAX_WORKERS} 个进程, preload_models={PARSE_PRELOAD_MODELS}")
+
+    start_time = time.time()
+    # 同时提交与进程数相同的任务，促使进程池一次性启动全部子进程
+    results = await asyncio.gather(
+        *[
+            loop.run_in_executor(executor, _get_worker_state, PARSE_WARMUP_TIMEOUT)
+            for _ in range(PARSE_MAX_WORKERS)
+        ],
+        return_exceptions=True
+    )
+
+    workers = {}
+    errors = []
+    for result in results:
+        if isinstance(result, Exception):
+            errors.append(str(result))
+        else:
+            workers[result.get("pid")] = result
+            if result.get("error"):
+                errors.append(result["error"])
+
+    _readiness.update(
+        workers=list(workers.values()),
+        warmup_seconds=round(time.time() - start_time, 2),
+        error="; ".join(dict.fromkeys(errors)) if errors else None,
+        status="failed" if errors else "ready",
+    )
+    if errors:
+        logger.error(f"解析进程池预热失败: {_readiness['error']}")
+    else:
+        logger.info(f"解析进程池预热完成，耗时 {_readiness['warmup_seconds']} 秒")
+    return get_parse_readiness()
+
+
+def get_parse_readiness() -> Dict[str, Any]:
+    """
+    获取解析进程池的就绪状态
+
+    返回:
+        包含 status、workers、warmup_seconds、error 的字典
+    """
+    return {
+        "status": _readiness["status"],
+        "ready": _readiness["status"] == "ready",
+        "workers": list(_readiness["workers"]),
+        "warmup_seconds": _readiness["warmup_seconds"],
+        "error": _readiness["error"],
+    }
+
+
+def _restart_broken_executor(broken: ProcessPoolExecutor) -> None:
+    """子进程异常退出（如OOM被杀）后进程池不可再用，需要重建"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+            _stats["restarts"] += 1
+            _readiness.update(status="not_started", workers=[], warmup_seconds=None)
+            logger.error("解析进程池已损坏（子进程异常退出），将在下次提交时重建")
+    try:
+        broken.shutdown(wait=False, cancel_futures=True)
+    except Exception as e:
+        logger.warning(f"关闭损坏的解析进程池失败: {e}")
+
+
+async def run_in_parse_executor(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    在解析进程池中执行同步函数，并在事件循环中异步等待结果
+
+    参数:
+        func: 要执行的函数，必须是可pickle的模块级函数
+        *args, **kwargs: 传递给函数的参数（必须可pickle）
+
+    返回:
+        函数的返回值
+    """
+    executor = get_parse_executor()
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+
+    _stats["submitted"] += 1
+    _stats["running"] += 1
+    try:
+        result = await loop.run_in_executor(executor, call)
+        _stats["completed"] += 1
+        return result
+    except BrokenProcessPool:
+        _stats["failed"] += 1
+        _restart_broken_executor(executor)
+        # 重建后的子进程需要重新预热，预热完成前 /health 返回未就绪
+        if _readiness["status"] == "not_started":
+            _readiness["status"] = "warming_up"
+            asyncio.create_task(warm_up_parse_executor())
+        raise
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _stats["running"] -= 1
+
+
+def get_parse_executor_stats() -> Dict[str, Any]:
+    """
+    获取解析进程池的统计信息
+
+    返回:
+        包含进程池配置和任务计数的字典
+    """
+    return {
+        "max_workers": PARSE_MAX_WORKERS,
+        "start_method": PARSE_MP_START_METHOD,
+        "started": _executor is not None,
+        "readiness": _readiness["status"],
+        **_stats,
+    }
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+单飞锁 - 同一节点上相同cache key的解析只执行一次
+
+解析进程池中的多个子进程共享同一个缓存目录。解析前对 {lock_dir}/{cache_key}.lock 加排他文件锁，
+先拿到锁的请求执行解析并写入缓存，后到的请求阻塞等待，拿到锁后重新查缓存即可直接复用结果。
+
+持锁者在释放锁之前删除锁文件，等待者拿到锁后会校验锁文件仍是自己打开的那个（inode一致），
+否则重新打开，因此锁目录中不会残留文件。进程崩溃时文件锁由操作系统自动释放。
+没有 fcntl 的平台（Windows）上不做合并，直接解析。
+
+web服务在主进程（事件循环的线程）中获取锁后再把解析任务提交到解析进程池，解析进程中不等待锁，
+避免分片解析持锁时解析进程被等待同一把锁的任务占满。
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# 等待锁时的轮询间隔（秒）
+POLL_INTERVAL = 0.2
+
+
+@contextmanager
+def single_flight(
+    lock_dir: str,
+    key: Optional[str],
+    timeout: float = 3600,
+    on_wait: Optional[Callable[[], None]] = None
+) -> Iterator[bool]:
+    """
+    对 key 加跨进程排他锁，with 块执行期间其他进程的相同 key 会等待
+
+    参数:
+        lock_dir: 锁文件目录
+        key: 锁的键（cache key），为空时不加锁
+        timeout: 最长等待秒数，超时后不再等待，直接执行 with 块
+        on_wait: 锁已被占用、开始等待时调用一次
+
+    返回:
+        是否等待过其他进程（为True时调用方应先重新检查缓存）
+    """
+    if not key or fcntl is None:
+        yield False
+        return
+
+    os.makedirs(lock_dir, exist_ok=True)
+    lock_path = os.path.join(lock_dir, f"{key}.lock")
+    deadline = time.monotonic() + timeout
+    waited = False
+    fd = None
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            fd = None
+            if not waited:
+                waited = True
+                if on_wait:
+                    on_wait()
+            if time.monotonic() >= deadline:
+                print(f"等待相同解析任务超时（{timeout}秒），将直接解析: {key}")
+                break
+            time.sleep(POLL_INTERVAL)
+            continue
+        # 前一个持锁者可能已删除锁文件，此时拿到的是已失效文件上的锁，需要重新打开
+        try:
+            if os.stat(lock_path).st_ino == os.fstat(fd).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+        fd = None
+
+    try:
+        yield waited
+    finally:
+        if fd is not None:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            os.close(fd)
@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+大文档分片解析 - 把页数很多的PDF按页段拆分到解析进程池的多个进程中并行解析
+
+整篇解析时一个1000页的文档只占用一个解析进程，其余进程空闲。分片模式（pipeline后端）：
+1. 查找整篇缓存，命中直接返回；未命中时在主进程中按cache key加单飞锁
+2. method=auto 时先对整篇文档分类，保证各分片使用相同的解析方法
+3. 按进程数把文档拆成连续页段，每个页段由 parse_pdf_shard 在独立进程中解析（两侧带上下文页），
+   启用文本通道时各分片内文本层干净的页直接提取文本
+4. merge_pdf_shards 按页序合并页面结果，生成一篇Markdown并写入整篇缓存
+
+页数不足 sharding.min_document_pages、进程池只有一个进程或使用VLM后端时，直接调用 mineru_pdf2md。
+parse_pdf_files 用一次 mineru_multi_pdf2md 调用批量解析多个PDF。
+
+单飞锁都在主进程（事件循环的线程）中获取后再提交解析任务，解析进程中不等待锁，
+因此分片解析持锁期间，相同PDF的其他请求不会占住解析进程、让分片排在它们后面。
+
+stream_pdf_pages 用同样的方式按 streaming.window_pages 页的窗口解析，窗口按页序提交，
+每个窗口完成后立即逐页产出Markdown，下游可以在后面的页还在解析时开始处理前面的页。
+
+使用示例：
+    from web_serves.pdf_utils.sharded_parse import parse_pdf_file, stream_pdf_pages
+
+    result = await parse_pdf_file(pdf_path, output_dir, web_images_dir=images_dir)
+    markdown, page_routing = result["md_content"], result["page_routing"]
+
+    async for record in stream_pdf_pages(pdf_path, output_dir, web_images_dir=images_dir):
+        if record["type"] == "page":
+            print(record["page"], record["markdown"])
+"""
+import asyncio
+import json
+import os
+import shutil
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from web_serves.config import (
+    PARSE_MAX_WORKERS,
+    PARSE_LOCK_TIMEOUT,
+    SHARDING_ENABLED,
+    SHARD_MIN_DOCUMENT_PAGES,
+    SHARD_MIN_PAGES,
+    SHARD_CONTEXT_PAGES,
+    STREAM_WINDOW_PAGES
+)
+from web_serves.pdf_utils.mineru_parse import (
+    PARSE_LOCK_DIR,
+    mineru_pdf2md,
+    mineru_multi_pdf2md,
+    count_pdf_pages,
+    generate_pdf_cache_key,
+    restore_from_cache,
+    document_stage_reporter,
+    uses_text_fast_path,
+    classify_pdf_method,
+    parse_pdf_shard,
+    merge_pdf_shards
+)
+from web_serves.pdf_utils.parse_executor import run_in_parse_executor
+from web_serves.pdf_utils.parse_lock import single_flight
+from web_serves.pdf_utils.text_fast_path import summarize_routing
+from web_serves.utils.progress import emit_progress
+
+
+# 缓存命中时每条记录包含的Markdown段落数
+STREAM_CACHED_BLOCKS = 64
+
+
+def plan_shard_ranges(total_pages: int, max_shards: int, min_document_pages: int,
+                      min_shard_pages: int) -> List[Tuple[int, int]]:
+    """
+    把文档均匀拆分为连续页段
+
+    参数:
+        total_pages: 总页数
+        max_shards: 最多分片数（解析进程数）
+        min_document_pages: 页数达到该值才分片
+        min_shard_pages: 每个分片的最少页数
+
+    返回:
+        (起始页, 结束页) 列表，均为闭区间；不分片时只有一个页段
+    """
+    if total_pages <= 0:
+        return []
+    shard_count = 1
+    if total_pages >= min_document_pages:
+        shard_count = max(1, min(max_shards, total_pages // max(1, min_shard_pages)))
+    base, extra = divmod(total_pages, shard_count)
+    ranges = []
+    start = 0
+    for index in range(shard_count):
+        size = base + (1 if index < extra else 0)
+        ranges.append((start, start + size - 1))
+        start += size
+    return ranges
+
+
+def _count_pdf_file_pages(pdf_file_path: str) -> int:
+    with open(pdf_file_path, "rb") as f:
+        return count_pdf_pages(f.read()) or 0
+
+
+def _read_page_records(pages_path: str) -> List[Dict[str, Any]]:
+    with open(pages_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _enter_parse_locks(locks: ExitStack, keyed_waits: List[Tuple[str, Callable[[], None]]]) -> bool:
+    waited = False
+    for cache_key, on_wait in keyed_waits:
+        waited = locks.enter_context(
+            single_flight(PARSE_LOCK_DIR, cache_key, timeout=PARSE_LOCK_TIMEOUT, on_wait=on_wait)
+        ) or waited
+    return waited
+
+
+async def _acquire_parse_locks(locks: ExitStack, keyed_waits: List[Tuple[Optional[str], Callable[[], None]]]) -> bool:
+    """
+    在线程中按cache key的顺序获取单飞锁（加入 locks），返回是否等待过其他请求
+
+    所有单飞锁都在主进程中获取，解析进程不等待锁：分片解析持锁期间还要把分片提交到解析进程池，
+    如果解析进程中的整篇解析阻塞在同一把锁上，分片会排在它们后面直到锁超时。
+    按key排序加锁，多个请求同时处理有重叠的文档时不会互相等待形成死锁。
+    """
+    ordered = sorted({key: on_wait for key, on_wait in keyed_waits if key}.items())
+    if not ordered:
+        return False
+    acquire = asyncio.ensure_future(asyncio.to_thread(_enter_parse_locks, locks, ordered))
+    try:
+        return await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # 请求被取消时锁可能仍在后台线程中获取，获取后立即释放
+        acquire.add_done_callback(lambda _: locks.close())
+        raise
+
+
+async def _acquire_parse_lock(locks: ExitStack, cache_key: Optional[str], report_stage: Callable[..., None]) -> bool:
+    """在线程中获取单飞锁（加入 locks），返回是否等待过其他请求"""
+    return await _acquire_parse_locks(locks, [(cache_key, lambda: report_stage("waiting_for_duplicate"))])
+
+
+async def _pdf_cache_key(pdf_file_path: str, backend: str, method: str, lang: str,
+                         content_sha256: Optional[str]) -> str:
+    """在主进程中计算与 get_parsed_pdf_results 相同的整篇cache key"""
+    pdf_bytes = b"" if content_sha256 else await asyncio.to_thread(Path(pdf_file_path).read_bytes)
+    return generate_pdf_cache_key(pdf_bytes, backend, method, lang, 0, None, content_digest=content_sha256,
+                                  text_fast_path=uses_text_fast_path(backend, method))
+
+
+async def parse_pdf_file(
+    pdf_file_path: str,
+    md_output_path: str,
+    backend: str = "pipeline",
+    method: str = "auto",
+    lang: str = "ch",
+    web_images_dir: Optional[str] = None,
+    use_cache: bool = True,
+    processing_id: Optional[str] = None,
+    content_sha256: Optional[str] = None,
+    materialize_files: bool = True,
+    artifact_policy: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    在解析进程池中解析单个PDF，大文档自动分片并行解析
+
+    参数同 mineru_pdf2md
+
+    返回:
+        包含 md_content 和 page_routing（每页的分流摘要，未启用文本通道时为None）的字典
+    """
+    ranges: List[Tuple[int, int]] = []
+    if SHARDING_ENABLED and backend == "pipeline" and PARSE_MAX_WORKERS > 1:
+        total_pages = await asyncio.to_thread(_count_pdf_file_pages, pdf_file_path)
+        ranges = plan_shard_ranges(total_pages, PARSE_MAX_WORKERS, SHARD_MIN_DOCUMENT_PAGES, SHARD_MIN_PAGES)
+
+    pdf_file_name = str(Path(pdf_file_path).stem)
+    report_stage = document_stage_reporter(processing_id, 0, 1, pdf_file_name)
+
+    if len(ranges) < 2:
+        locks = ExitStack()
+        try:
+            # 在事件循环中等待相同PDF的解析完成后再提交，解析进程中不再加锁；
+            # 先到者的结果写入缓存后，解析进程中的缓存查找会直接命中
+            if use_cache:
+                cache_key = await _pdf_cache_key(pdf_file_path, backend, method, lang, content_sha256)
+                await _acquire_parse_lock(locks, cache_key, report_stage)
+            return await run_in_parse_executor(
+                mineru_pdf2md,
+                pdf_file_path=pdf_file_path,
+                md_output_path=md_output_path,
+                return_details=True,
+                backend=backend,
+                method=method,
+                lang=lang,
+                web_images_dir=web_images_dir,
+                use_cache=use_cache,
+                processing_id=processing_id,
+                content_sha256=content_sha256,
+                materialize_files=materialize_files,
+                artifact_policy=artifact_policy,
+                coalesce_parses=False
+            )
+        finally:
+            locks.close()
+
+    text_fast_path = uses_text_fast_path(backend, method)
+
+    async def try_restore(cache_key: Optional[str], **data) -> Optional[Dict[str, Any]]:
+        if not cache_key:
+            return None
+        restore_result = await asyncio.to_thread(
+            restore_from_cache, cache_key, md_output_path, pdf_file_name, method, web_images_dir, materialize_files
+        )
+        if not restore_result:
+            return None
+        report_stage("cache_hit", **data)
+        return restore_result
+
+    cache_key = None
+    if use_cache:
+        cache_key = await _pdf_cache_key(pdf_file_path, backend, method, lang, content_sha256)
+        restore_result = await try_restore(cache_key)
+        if restore_result is not None:
+            return restore_result
+
+    shard_dir = os.path.join(md_output_path, f"{pdf_file_name}_shards")
+    locks = ExitStack()
+    try:
+        # 与整篇解析共用单飞锁，相同PDF的并发请求只解析一次
+        if await _acquire_parse_lock(locks, cache_key, report_stage):
+            restore_result = await try_restore(cache_key, coalesced=True)
+            if restore_result is not None:
+                return restore_result
+
+        parse_method = method
+        if method == "auto":
+            parse_method = await run_in_parse_executor(classify_pdf_method, pdf_file_path)
+
+        report_stage("sharding", shard_count=len(ranges), total_pages=ranges[-1][1] + 1, parse_method=parse_method)
+        emit_progress(processing_id, "pages", document_index=0, file_name=pdf_file_name, total_pages=ranges[-1][1] + 1)
+
+        async def run_shard(shard_index: int, start_page: int, end_page: int):
+            shard = await run_in_parse_executor(
+                parse_pdf_shard, pdf_file_path, shard_dir, shard_index, start_page, end_page,
+                lang, parse_method, SHARD_CONTEXT_PAGES, text_fast_path
+            )
+            report_stage("shard_parsed", shard_index=shard_index, start_page=start_page, end_page=end_page)
+            return shard
+
+        shards = await asyncio.gather(*[
+            run_shard(shard_index, start_page, end_page)
+            for shard_index, (start_page, end_page) in enumerate(ranges)
+        ])
+        page_routing = None
+        if text_fast_path:
+            page_routing = summarize_routing([decision for shard in shards for decision in shard["routing"]])
+            report_stage("page_routing", text_pages=page_routing["text_pages"], model_pages=page_routing["model_pages"])
+        md_content = await run_in_parse_executor(
+            merge_pdf_shards, pdf_file_path, md_output_path, shard_dir, list(shards),
+            method, web_images_dir, cache_key, processing_id, artifact_policy, page_routing
+        )
+        return {"md_content": md_content, "page_routing": page_routing}
+    finally:
+        locks.close()
+        await asyncio.to_thread(shutil.rmtree, shard_dir, True)
+
+
+async def parse_pdf_files(
+    pdf_file_paths: List[str],
+    md_output_path: str,
+    backend: str = "pipeline",
+    method: str = "auto",
+    lang: str = "ch",
+    web_images_dir: Optional[str] = None,
+    use_cache: bool = True,
+    processing_id: Optional[str] = None,
+    content_sha256_list: Optional[List[str]] = None,
+    materialize_files: bool = True,
+    artifact_policy: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    在解析进程池中批量解析多个PDF（一次 mineru_multi_pdf2md 调用）
+
+    提交前在事件循环中获取各文档的单飞锁：相同PDF正在其他请求中解析（包括分片解析）时在这里等待，
+    不占用解析进程。参数同 mineru_multi_pdf2md
+    """
+    document_count = len(pdf_file_paths)
+    locks = ExitStack()
+    try:
+        if use_cache:
+            keyed_waits = []
+            for doc_index, pdf_file_path in enumerate(pdf_file_paths):
+                cache_key = await _pdf_cache_key(
+                    pdf_file_path, backend, method, lang,
+                    content_sha256_list[doc_index] if content_sha256_list else None
+                )
+                report_stage = document_stage_reporter(
+                    processing_id, doc_index, document_count, str(Path(pdf_file_path).stem)
+                )
+                keyed_waits.append((cache_key, lambda report_stage=report_stage: report_stage("waiting_for_duplicate")))
+            await _acquire_parse_locks(locks, keyed_waits)
+        return await run_in_parse_executor(
+            mineru_multi_pdf2md,
+            pdf_file_paths=pdf_file_paths,
+            md_output_path=md_output_path,
+            return_content=True,
+            backend=backend,
+            method=method,
+            lang=lang,
+            web_images_dir=web_images_dir,
+            use_cache=use_cache,
+            processing_id=processing_id,
+            content_sha256_list=content_sha256_list,
+            materialize_files=materialize_files,
+            artifact_policy=artifact_policy,
+            coalesce_parses=False
+        )
+    finally:
+        locks.close()
+
+
+async def stream_pdf_pages(
+    pdf_file_path: str,
+    md_output_path: str,
+    backend: str = "pipeline",
+    method: str = "auto",
+    lang: str = "ch",
+    web_images_dir: Optional[str] = None,
+    use_cache: bool = True,
+    processing_id: Optional[str] = None,
+    content_sha256: Optional[str] = None,
+    artifact_policy: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    按页窗口解析单个PDF，逐页产出Markdown记录（pipeline后端）
+
+    窗口按页序提交到解析进程池，同时运行的窗口数不超过解析进程数，其他请求的解析任务可以穿插执行；
+    每个窗口完成后读取其逐页结果并产出，主进程同一时间最多只持有一个窗口的Markdown。
+    全部窗口完成后在解析进程中合并写入整篇缓存（不把整篇内容传回主进程）。
+
+    整篇缓存命中时按段落分块产出缓存的Markdown（没有页码）；VLM后端整篇解析后一次产出。
+
+    参数同 parse_pdf_file
+
+    产出:
+        {"type": "start", "total_pages", "windows"}：开始解析（缓存命中时不产出）
+        {"type": "page", "page", "route", "markdown"}：一页的Markdown，按页序产出
+        {"type": "markdown", "markdown"}：缓存命中或VLM后端时的Markdown分块
+        {"type": "end", "cached", "page_routing"}：结束
+    """
+    if backend != "pipeline":
+        result = await parse_pdf_file(
+            pdf_file_path, md_output_path, backend=backend, method=method, lang=lang,
+            web_images_dir=web_images_dir, use_cache=use_cache, processing_id=processing_id,
+            content_sha256=content_sha256, materialize_files=False, artifact_policy=artifact_policy
+        )
+        yield {"type": "markdown", "markdown": result["md_content"]}
+        yield {"type": "end", "cached": None, "page_routing": result["page_routing"]}
+        return
+
+    pdf_file_name = str(Path(pdf_file_path).stem)
+    report_stage = document_stage_reporter(processing_id, 0, 1, pdf_file_name)
+    text_fast_path = uses_text_fast_path(backend, method)
+
+    async def try_restore(cache_key: Optional[str], **data) -> Optional[Dict[str, Any]]:
+        if not cache_key:
+            return None
+        restore_result = await asyncio.to_thread(
+            restore_from_cache, cache_key, md_output_path, pdf_file_name, method, web_images_dir, False
+        )
+        if restore_result:
+            report_stage("cache_hit", **data)
+        return restore_result
+
+    def cached_records(restore_result: Dict[str, Any]):
+        blocks = restore_result["md_content"].split("\n\n")
+        for start in range(0, len(blocks), STREAM_CACHED_BLOCKS):
+            yield {"type": "markdown", "markdown": "\n\n".join(blocks[start:start + STREAM_CACHED_BLOCKS])}
+        yield {"type": "end", "cached": True, "page_routing": restore_result.get("page_routing")}
+
+    cache_key = None
+    if use_cache:
+        cache_key = await _pdf_cache_key(pdf_file_path, backend, method, lang, content_sha256)
+        restore_result = await try_restore(cache_key)
+        if restore_result is not None:
+            for record in cached_records(restore_result):
+                yield record
+            return
+
+    shard_dir = os.path.join(md_output_path, f"{pdf_file_name}_stream")
+    locks = ExitStack()
+    tasks: List[asyncio.Future] = []
+    try:
+        if await _acquire_parse_lock(locks, cache_key, report_stage):
+            restore_result = await try_restore(cache_key, coalesced=True)
+            if restore_result is not None:
+                for record in cached_records(restore_result):
+                    yield record
+                return
+
+        total_pages = await asyncio.to_thread(_count_pdf_file_pages, pdf_file_path)
+        parse_method = method
+        if method == "auto":
+            parse_method = await run_in_parse_executor(classify_pdf_method, pdf_file_path)
+        ranges = [
+            (start, min(start + STREAM_WINDOW_PAGES, total_pages) - 1)
+            for start in range(0, total_pages, STREAM_WINDOW_PAGES)
+        ]
+        report_stage("streaming", window_count=len(ranges), total_pages=total_pages, parse_method=parse_method)
+        emit_progress(processing_id, "pages", document_index=0, file_name=pdf_file_name, total_pages=total_pages)
+        yield {"type": "start", "total_pages": total_pages, "windows": len(ranges)}
+
+        # 信号量按等待顺序唤醒，窗口按页序开始解析
+        slots = asyncio.Semaphore(PARSE_MAX_WORKERS)
+
+        async def run_window(window_index: int, start_page: int, end_page: int):
+            async with slots:
+                return await run_in_parse_executor(
+                    parse_pdf_shard, pdf_file_path, shard_dir, window_index, start_page, end_page,
+                    lang, parse_method, SHARD_CONTEXT_PAGES, text_fast_path, web_images_dir, True
+                )
+
+        tasks = [
+            asyncio.ensure_future(run_window(window_index, start_page, end_page))
+            for window_index, (start_page, end_page) in enumerate(ranges)
+        ]
+        shards = []
+        for task in tasks:
+            shard = await task
+            shards.append(shard)
+            report_stage("window_parsed", shard_index=shard["shard_index"],
+                         start_page=shard["start_page"], end_page=shard["end_page"])
+            for record in await asyncio.to_thread(_read_page_records, shard["pages_path"]):
+                yield {"type": "page", **record}
+            await asyncio.to_thread(os.remove, shard["pages_path"])
+
+        page_routing = None
+        if text_fast_path:
+            page_routing = summarize_routing([decision for shard in shards for decision in shard["routing"]])
+            report_stage("page_routing", text_pages=page_routing["text_pages"], model_pages=page_routing["model_pages"])
+        await run_in_parse_executor(
+            merge_pdf_shards, pdf_file_path, md_output_path, shard_dir, shards,
+            method, web_images_dir, cache_key, processing_id, artifact_policy, page_routing, False
+        )
+        yield {"type": "end", "cached": False, "page_routing": page_routing}
+    finally:
+        for task in tasks:
+            task.cancel()
+        locks.close()
+        await asyncio.to_thread(shutil.rmtree, shard_dir, True)
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+原生文本页快速通道 - 有干净文本层的页面直接提取文本，不经过版面分析和OCR模型
+
+程序生成的PDF（Word/LaTeX导出等）大多数页只有文字，method=auto 时仍会让每一页都经过
+pipeline 的全部模型。解析前先用 pypdfium2 检查每一页：
+1. 文本层：字符数足够，乱码字符（替换符、私有区字符、控制字符）比例低
+2. 图片覆盖率：图片对象的面积占页面比例低
+3. 矢量图形：路径对象数量少（表格线、图表通常由大量路径组成）
+4. 版面：没有多栏、表格式的大段水平间隔，公式字符比例低，页面未旋转
+
+全部满足的页走文本通道：按行高和行距把文本行合并为段落，字号明显大于正文的短段落作为标题，
+页眉页脚区域的短行作为丢弃块，生成与 middle_json 相同结构的页面结果，由 union_make 输出
+相同格式的Markdown。其余页（扫描页、图片或图形较多的页）仍交给模型解析。
+
+每页的分流结果（route: text / model，以及原因和统计值）随 page_routing 阶段事件上报，并返回给调用方。
+"""
+import statistics
+from typing import Any, Dict, List, Optional, Tuple
+
+from web_serves.config import (
+    TEXT_FAST_PATH_MIN_CHARS,
+    TEXT_FAST_PATH_MAX_GARBLED_RATIO,
+    TEXT_FAST_PATH_MAX_IMAGE_COVERAGE,
+    TEXT_FAST_PATH_MAX_PATH_OBJECTS,
+    TEXT_FAST_PATH_MAX_FORMULA_RATIO
+)
+
+# 文本通道算法版本，参与整篇缓存key，算法变化时使旧结果失效
+TEXT_FAST_PATH_VERSION = 1
+# 与 MinerU BlockType / ContentType 的取值一致
+BLOCK_TEXT = "text"
+BLOCK_TITLE = "title"
+BLOCK_DISCARDED = "discarded"
+SPAN_TEXT = "text"
+# 页眉页脚区域占页面高度的比例，以及该区域中视为页眉页脚的最大字符数
+MARGIN_RATIO = 0.06
+MARGIN_MAX_CHARS = 80
+# 同一行内两段文字的水平间隔超过行高的该倍数时视为分栏或表格
+COLUMN_GAP_RATIO = 3.0
+# 出现大间隔的行数超过该比例时交给模型
+MAX_GAPPED_LINE_RATIO = 0.2
+# 段落内行距超过行高的该倍数时分段
+PARAGRAPH_GAP_RATIO = 0.6
+# 标题字号至少为正文字号的倍数，以及标题的最大字符数和行数
+TITLE_SIZE_RATIO = 1.2
+TITLE_MAX_CHARS = 120
+TITLE_MAX_LINES = 3
+
+
+def _is_garbled(char: str) -> bool:
+    code = ord(char)
+    if char == "\ufffd" or 0xE000 <= code <= 0xF8FF:
+        return True
+    return code < 0x20 and char not in "\r\n\t"
+
+
+def _is_formula_char(char: str) -> bool:
+    code = ord(char)
+    return 0x2200 <= code <= 0x22FF or 0x1D400 <= code <= 0x1D7FF or 0x27C0 <= code <= 0x27EF
+
+
+def _object_bounds(obj) -> Tuple[float, float, float, float]:
+    # pypdfium2 v5 为 get_bounds，v4 为 get_pos
+    get_bounds = getattr(obj, "get_bounds", None) or obj.get_pos
+    return get_bounds()
+
+
+def _image_coverage(page, width: float, height: float) -> float:
+    """图片对象面积之和占页面面积的比例（裁剪到页面内，最大为1）"""
+    import pypdfium2.raw as pdfium_c
+
+    area = 0.0
+    for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]):
+        left, bottom, right, top = _object_bounds(obj)
+        left, right = max(0.0, left), min(width, right)
+        bottom, top = max(0.0, bottom), min(height, top)
+        if right > left and top > bottom:
+            area += (right - left) * (top - bottom)
+    return min(1.0, area / (width * height)) if width and height else 0.0
+
+
+def _count_path_objects(page) -> int:
+    import pypdfium2.raw as pdfium_c
+
+    return sum(1 for _ in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_PATH]))
+
+
+def _extract_lines(textpage, height: float) -> List[Dict[str, Any]]:
+    """
+    把文本层的文字矩形合并为文本行
+
+    返回:
+        文本行列表（按阅读顺序），bbox 为左上角原点坐标，segments 为行内各段文字
+    """
+    import pypdfium2.raw as pdfium_c
+
+    rects = []
+    for index in range(textpage.count_rects()):
+        left, bottom, right, top = textpage.get_rect(index)
+        text = textpage.get_text_bounded(left, bottom, right, top).strip()
+        if not text:
+            continue
+        char_index = textpage.get_index((left + right) / 2, (bottom + top) / 2, right - left, top - bottom)
+        size = pdfium_c.FPDFText_GetFontSize(textpage.raw, char_index) if char_index >= 0 else 0.0
+        rects.append({
+            "bbox": [left, height - top, right, height - bottom],
+            "text": text,
+            "size": size or (top - bottom)
+        })
+
+    rects.sort(key=lambda r: (r["bbox"][1], r["bbox"][0]))
+    lines: List[Dict[str, Any]] = []
+    for rect in rects:
+        x0, y0, x1, y1 = rect["bbox"]
+        line = lines[-1] if lines else None
+        if line is not None:
+            overlap = min(line["bbox"][3], y1) - max(line["bbox"][1], y0)
+            if overlap >= 0.5 * min(line["bbox"][3] - line["bbox"][1], y1 - y0):
+                line["segments"].append(rect)
+                line["bbox"] = [min(line["bbox"][0], x0), min(line["bbox"][1], y0),
+                                max(line["bbox"][2], x1), max(line["bbox"][3], y1)]
+                continue
+        lines.append({"bbox": [x0, y0, x1, y1], "segments": [rect]})
+
+    for line in lines:
+        line["segments"].sort(key=lambda r: r["bbox"][0])
+        line["text"] = " ".join(segment["text"] for segment in line["segments"])
+        line["size"] = max(segment["size"] for segment in line["segments"])
+        line["height"] = line["bbox"][3] - line["bbox"][1]
+        line["max_gap"] = max(
+            [b["bbox"][0] - a["bbox"][2] for a, b in zip(line["segments"], line["segments"][1:])] or [0.0]
+        )
+    return lines
+
+
+def _make_block(block_type: str, lines: List[Dict[str, Any]], index: int) -> Dict[str, Any]:
+    """生成 middle_json 格式的文本块，每个文本行一个 span"""
+    block_lines = []
+    for line in lines:
+        bbox = [round(v, 2) for v in line["bbox"]]
+        block_lines.append({
+            "bbox": bbox,
+            "spans": [{"bbox": bbox, "type": SPAN_TEXT, "content": line["text"], "score": 1.0}]
+        })
+    block = {
+        "type": block_type,
+        "bbox": [
+            round(min(line["bbox"][0] for line in lines), 2),
+            round(min(line["bbox"][1] for line in lines), 2),
+            round(max(line["bbox"][2] for line in lines), 2),
+            round(max(line["bbox"][3] for line in lines), 2)
+        ],
+        "lines": block_lines,
+        "index": index
+    }
+    if block_type == BLOCK_TITLE:
+        block["level"] = 1
+    return block
+
+
+def _build_page_info(lines: List[Dict[str, Any]], page_index: int, width: float, height: float) -> Dict[str, Any]:
+    """把文本行合并为段落，生成与 pipeline 后端 middle_json 相同结构的页面结果"""
+    body_lines, discarded = [], []
+    for line in lines:
+        in_margin = line["bbox"][3] < height * MARGIN_RATIO or line["bbox"][1] > height * (1 - MARGIN_RATIO)
+        if in_margin and len(line["text"]) <= MARGIN_MAX_CHARS:
+            discarded.append(line)
+        else:
+            body_lines.append(line)
+
+    paragraphs: List[List[Dict[str, Any]]] = []
+    if body_lines:
+        line_height = statistics.median(line["height"] for line in body_lines)
+        right_edge = max(line["bbox"][2] for line in body_lines)
+        left_edge = min(line["bbox"][0] for line in body_lines)
+        for line in body_lines:
+            prev = paragraphs[-1][-1] if paragraphs else None
+            if prev is not None:
+                gap = line["bbox"][1] - prev["bbox"][3]
+                same_size = abs(line["size"] - prev["size"]) <= 1.0
+                # 上一行明显短于版心宽度时视为段落结束
+                prev_short = prev["bbox"][2] < right_edge - 0.15 * (right_edge - left_edge)
+                if gap <= PARAGRAPH_GAP_RATIO * line_height and same_size and not prev_short:
+                    paragraphs[-1].append(line)
+                    continue
+            paragraphs.append([line])
+
+    para_blocks = []
+    if paragraphs:
+        body_size = statistics.median(line["size"] for line in body_lines)
+        for paragraph in paragraphs:
+            text_length = sum(len(line["text"]) for line in paragraph)
+            is_title = (
+                paragraph[0]["size"] >= body_size * TITLE_SIZE_RATIO
+                and len(paragraph) <= TITLE_MAX_LINES
+                and text_length <= TITLE_MAX_CHARS
+            )
+            para_blocks.append(_make_block(BLOCK_TITLE if is_title else BLOCK_TEXT, paragraph, len(para_blocks)))
+
+    return {
+        "preproc_blocks": para_blocks,
+        "para_blocks": para_blocks,
+        "discarded_blocks": [_make_block(BLOCK_DISCARDED, [line], index) for index, line in enumerate(discarded)],
+        "images": [],
+        "tables": [],
+        "interline_equations": [],
+        "page_idx": page_index,
+        "page_size": [round(width, 2), round(height, 2)]
+    }
+
+
+def _route_page(page, page_index: int) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """检查单页并返回 (分流结果, 文本通道的页面结果)，交给模型的页面结果为None"""
+    width, height = page.get_size()
+    textpage = page.get_textpage()
+    try:
+        text = textpage.get_text_range()
+        visible = [c for c in text if not c.isspace()]
+        chars = len(visible)
+        garbled_ratio = sum(1 for c in visible if _is_garbled(c)) / chars if chars else 0.0
+        formula_ratio = sum(1 for c in visible if _is_formula_char(c)) / chars if chars else 0.0
+        image_coverage = _image_coverage(page, width, height)
+        path_objects = _count_path_objects(page)
+        lines = _extract_lines(textpage, height) if chars else []
+    finally:
+        textpage.close()
+
+    gapped_lines = sum(1 for line in lines if line["max_gap"] > COLUMN_GAP_RATIO * line["height"])
+    decision = {
+        "page": page_index,
+        "route": "model",
+        "reason": None,
+        "chars": chars,
+        "garbled_ratio": round(garbled_ratio, 4),
+        "image_coverage": round(image_coverage, 4),
+        "path_objects": path_objects
+    }
+    if page.get_rotation():
+        decision["reason"] = "rotated"
+    elif chars < TEXT_FAST_PATH_MIN_CHARS:
+        decision["reason"] = "no_text_layer"
+    elif garbled_ratio > TEXT_FAST_PATH_MAX_GARBLED_RATIO:
+        decision["reason"] = "garbled_text"
+    elif image_coverage > TEXT_FAST_PATH_MAX_IMAGE_COVERAGE:
+        decision["reason"] = "images"
+    elif path_objects > TEXT_FAST_PATH_MAX_PATH_OBJECTS:
+        decision["reason"] = "vector_graphics"
+    elif formula_ratio > TEXT_FAST_PATH_MAX_FORMULA_RATIO:
+        decision["reason"] = "formulas"
+    elif lines and gapped_lines > MAX_GAPPED_LINE_RATIO * len(lines):
+        decision["reason"] = "complex_layout"
+    else:
+        decision["route"] = "text"
+        decision["reason"] = "text_layer"
+        return decision, _build_page_info(lines, page_index, width, height)
+    return decision, None
+
+
+def route_pdf_pages(pdf_bytes: bytes) -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+    """
+    检查每一页的文本层和图片覆盖率，决定走文本通道还是交给模型
+
+    参数:
+        pdf_bytes: 已按页码范围转换后的PDF内容
+
+    返回:
+        (每页的分流结果列表, 文本通道页码 -> 页面结果)
+    """
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        routing, text_pages = [], {}
+        for page_index in range(len(pdf)):
+            page = pdf[page_index]
+            try:
+                decision, page_info = _route_page(page, page_index)
+            finally:
+                page.close()
+            routing.append(decision)
+            if page_info is not None:
+                text_pages[page_index] = page_info
+        return routing, text_pages
+    finally:
+        pdf.close()
+
+
+def text_page_model(page_info: Dict[str, Any]) -> Dict[str, Any]:
+    """文本通道页面在 *_model.json 中的占位条目（没有模型检测结果）"""
+    width, height = page_info["page_size"]
+    return {
+        "layout_dets": [],
+        "page_info": {"page_no": page_info["page_idx"], "width": width, "height": height},
+        "route": "text"
+    }
+
+
+def summarize_routing(routing: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """返回响应中的分流摘要：各通道页数和每页的分流结果"""
+    if routing is None:
+        return None
+    return {
+        "text_pages": sum(1 for decision in routing if decision["route"] == "text"),
+        "model_pages": sum(1 for decision in routing if decision["route"] == "model"),
+        "pages": routing
+    }
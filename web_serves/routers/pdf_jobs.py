@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF异步任务相关路由
+
+提交PDF后立即返回 task_id，解析和图片分析在后台执行，客户端通过轮询获取状态和结果。
+结果的格式与同步接口 /upload/pdf、/upload/pdfs 完全一致。
+"""
+import uuid
+from typing import List, Optional
+
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Request
+from fastapi.responses import JSONResponse
+
+from web_serves.config import (
+    get_storage_paths,
+    DEFAULT_IMAGE_PROVIDER,
+    DEFAULT_MAX_CONCURRENT_AI
+)
+from web_serves.routers.pdf_processing import (
+    save_pdf_to_work_dir,
+    save_uploaded_pdfs,
+    admit_saved_pdfs,
+    process_saved_pdf,
+    process_saved_pdfs,
+    cleanup_failed_processing,
+    to_http_exception,
+    validate_artifact_policy
+)
+from web_serves.utils.job_manager import job_manager, JOB_SUCCEEDED, JOB_FAILED
+from web_serves.utils.admission import admission_controller
+from web_serves.utils.scheduler import resolve_schedule_key, PRIORITY_BULK
+from web_serves.utils.progress import emit_progress
+
+router = APIRouter(prefix="/jobs", tags=["PDF异步任务"])
+
+
+def _accepted_response(job: dict) -> JSONResponse:
+    """构造任务已受理的响应"""
+    task_id = job["task_id"]
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "task_id": task_id,
+            "status": job["status"],
+            "status_url": f"/jobs/{task_id}",
+            "result_url": f"/jobs/{task_id}/result",
+            "progress_url": f"/progress/{task_id}"
+        }
+    )
+
+
+@router.post("/pdf")
+async def submit_pdf_job(
+    request: Request,
+    file: UploadFile = File(...),
+    provider: str = Form(default=DEFAULT_IMAGE_PROVIDER),
+    max_concurrent: int = Form(default=DEFAULT_MAX_CONCURRENT_AI),
+    parse_images: bool = Form(default=True),
+    backend: str = Form(default="pipeline"),
+    method: str = Form(default="auto"),
+    use_cache: bool = Form(default=True),
+    artifact_policy: Optional[str] = Form(default=None)
+):
+    """
+    提交单个PDF解析任务，保存文件后立即返回 task_id
+
+    参数与 /upload/pdf 相同，异步任务默认按批量优先级调度。
+
+    Returns:
+        202响应，包含 task_id、状态查询地址和结果地址
+    """
+    artifact_policy = validate_artifact_policy(artifact_policy)
+    schedule_key = resolve_schedule_key(request, PRIORITY_BULK)
+    storage_paths = get_storage_paths()
+    processing_id = uuid.uuid4().hex
+    temp_work_dir = storage_paths["temp_dir"] / processing_id
+    pdf_path = None
+
+    # 上传文件必须在请求结束前保存，之后的解析在后台执行；解析队列已满时直接拒绝，不创建任务
+    try:
+        pdf_path, temp_pdf_path, content_sha256 = await save_pdf_to_work_dir(file, storage_paths, temp_work_dir)
+        admission_ticket = await admit_saved_pdfs([pdf_path], schedule_key)
+    except Exception as e:
+        cleanup_failed_processing([pdf_path], temp_work_dir)
+        raise to_http_exception(e, "PDF处理失败")
+
+    async def runner(on_stage):
+        try:
+            return await process_saved_pdf(
+                file=file,
+                pdf_path=pdf_path,
+                temp_pdf_path=temp_pdf_path,
+                processing_id=processing_id,
+                storage_paths=storage_paths,
+                provider=provider,
+                max_concurrent=max_concurrent,
+                parse_images=parse_images,
+                backend=backend,
+                method=method,
+                use_cache=use_cache,
+                on_stage=on_stage,
+                content_sha256=content_sha256,
+                artifact_policy=artifact_policy,
+                admission_ticket=admission_ticket,
+                schedule_key=schedule_key
+            )
+        except Exception as e:
+            admission_controller.release(admission_ticket)
+            cleanup_failed_processing([pdf_path], temp_work_dir)
+            print(f"PDF任务处理错误: {str(e)}")
+            raise to_http_exception(e, "PDF处理失败")
+
+    job = job_manager.create_job(processing_id, "pdf", meta={
+        "filenames": [file.filename],
+        "provider": provider,
+        "backend": backend,
+        "method": method,
+        "artifact_policy": artifact_policy,
+        "parse_images": parse_images,
+        "tenant": schedule_key.tenant,
+        "priority": schedule_key.priority
+    })
+    job_manager.update_stage(processing_id, "saved")
+    emit_progress(processing_id, "stage", stage="saved")
+    job_manager.submit(processing_id, runner)
+    return _accepted_response(job)
+
+
+@router.post("/pdfs")
+async def submit_pdfs_job(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    provider: str = Form(default=DEFAULT_IMAGE_PROVIDER),
+    max_concurrent: int = Form(default=DEFAULT_MAX_CONCURRENT_AI),
+    parse_images: bool = Form(default=True),
+    backend: str = Form(default="pipeline"),
+    method: str = Form(default="auto"),
+    use_cache: bool = Form(default=True),
+    artifact_policy: Optional[str] = Form(default=None)
+):
+    """
+    提交批量PDF解析任务，保存文件后立即返回 task_id
+
+    参数与 /upload/pdfs 相同，异步任务默认按批量优先级调度。
+
+    Returns:
+        202响应，包含 task_id、状态查询地址和结果地址
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="未提供PDF文件")
+
+    artifact_policy = validate_artifact_policy(artifact_policy)
+    schedule_key = resolve_schedule_key(request, PRIORITY_BULK)
+    storage_paths = get_storage_paths()
+    processing_id = uuid.uuid4().hex
+    temp_work_dir = storage_paths["temp_dir"] / processing_id
+    pdf_paths = []
+
+    try:
+        temp_work_dir.mkdir(parents=True, exist_ok=True)
+        pdf_paths, temp_pdf_paths, content_digests = await save_uploaded_pdfs(files, storage_paths["pdf_dir"], temp_work_dir)
+        admission_ticket = await admit_saved_pdfs(pdf_paths, schedule_key)
+    except Exception as e:
+        cleanup_failed_processing(pdf_paths, temp_work_dir)
+        raise to_http_exception(e, "批量PDF处理失败")
+
+    async def runner(on_stage):
+        try:
+            return await process_saved_pdfs(
+                files=files,
+                pdf_paths=pdf_paths,
+                temp_pdf_paths=temp_pdf_paths,
+                temp_work_dir=temp_work_dir,
+                processing_id=processing_id,
+                storage_paths=storage_paths,
+                provider=provider,
+                max_concurrent=max_concurrent,
+                parse_images=parse_images,
+                backend=backend,
+                method=method,
+                use_cache=use_cache,
+                on_stage=on_stage,
+                content_digests=content_digests,
+                artifact_policy=artifact_policy,
+                admission_ticket=admission_ticket,
+                schedule_key=schedule_key
+            )
+        except Exception as e:
+            admission_controller.release(admission_ticket)
+            cleanup_failed_processing(pdf_paths, temp_work_dir)
+            print(f"批量PDF任务处理错误: {str(e)}")
+            raise to_http_exception(e, "批量PDF处理失败")
+
+    job = job_manager.create_job(processing_id, "pdfs", meta={
+        "filenames": [file.filename for file in files],
+        "provider": provider,
+        "backend": backend,
+        "method": method,
+        "artifact_policy": artifact_policy,
+        "parse_images": parse_images,
+        "tenant": schedule_key.tenant,
+        "priority": schedule_key.priority
+    })
+    job_manager.update_stage(processing_id, "saved")
+    emit_progress(processing_id, "stage", stage="saved")
+    job_manager.submit(processing_id, runner)
+    return _accepted_response(job)
+
+
+@router.get("/{task_id}")
+async def get_job_status(task_id: str):
+    """
+    查询任务状态和进度
+
+    Returns:
+        任务状态字典，status 为 pending / running / succeeded / failed
+    """
+    job = job_manager.get_status(task_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已过期: {task_id}")
+    return JSONResponse(content=job)
+
+
+@router.get("/{task_id}/result")
+async def get_job_result(task_id: str):
+    """
+    获取任务结果
+
+    Returns:
+        任务成功时返回与同步接口相同的响应内容；
+        任务未完成时返回202和当前状态；任务失败时返回与同步接口相同的错误
+    """
+    job = job_manager.get_status(task_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已过期: {task_id}")
+
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+
+    if job["status"] != JOB_SUCCEEDED:
+        return JSONResponse(status_code=202, content=job)
+
+    result = job_manager.get_result(task_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"任务结果已过期: {task_id}")
+    return JSONResponse(content=result)
@@ -4,24 +4,34 @@
 PDF处理相关路由
 """
 import os
+import asyncio
+import json
 import uuid
 import tempfile
 import shutil
 import aiofiles
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Body, Query, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, Body, Query, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 from web_serves.pdf_utils.mineru_parse import (
-    mineru_pdf2md, 
-    mineru_multi_pdf2md,
     clear_pdf_cache,
-    get_cache_stats
+    get_cache_stats,
+    count_pdf_pages
 )
+from web_serves.pdf_utils.sharded_parse import parse_pdf_file, parse_pdf_files, stream_pdf_pages
+from web_serves.pdf_utils.artifacts import resolve_artifact_policy
 from web_serves.markdown_utils.markdown_image_processor import MarkdownImageProcessor
+from web_serves.image_utils.client_registry import get_client_registry_stats
+from web_serves.image_utils.analysis_cache import get_analysis_cache_stats, clear_analysis_cache
+from web_serves.image_utils.image_dedup import get_image_dedup_stats
+from web_serves.image_utils.batch_analysis import get_batching_stats
+from web_serves.image_utils.resilience import get_resilience_stats
+from web_serves.image_utils.provider_router import get_router_stats
 from web_serves.config import (
     get_storage_paths, 
     get_api_base_url, 
@@ -29,18 +39,41 @@ from web_serves.config import (
     DEFAULT_MAX_CONCURRENT_AI
 )
 from web_serves.utils.file_handler import FileHandler
+from web_serves.utils.progress import emit_progress
+from web_serves.utils.admission import admission_controller, AdmissionRejected, AdmissionTicket
+from web_serves.utils.scheduler import (
+    ScheduleKey,
+    resolve_schedule_key,
+    image_scheduler,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BULK
+)
 from web_serves.exceptions import UnsupportedFileTypeError, FileSaveError
 
 router = APIRouter(prefix="/upload", tags=["PDF处理"])
 
+# 流式接口支持的输出格式 -> 响应的 media type
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "markdown": "text/markdown; charset=utf-8",
+}
+
 
 async def process_markdown_with_images(
     markdown_content: str,
     temp_work_dir: str,
     provider: str,
-    max_concurrent: int
+    max_concurrent: int,
+    processing_id: Optional[str] = None,
+    schedule_key: Optional[ScheduleKey] = None,
+    use_cache: bool = True
 ) -> str:
-    """处理Markdown中的图片并返回处理后的内容"""
+    """
+    处理Markdown中的图片并返回处理后的内容
+
+    提供 processing_id 时发布每张图片的分析进度，图片分析按 schedule_key 公平排队，
+    use_cache 为False时不读写图片分析结果缓存
+    """
     if not markdown_content:
         return markdown_content
         
@@ -49,7 +82,10 @@ async def process_markdown_with_images(
         async with MarkdownImageProcessor(
             provider=provider,
             api_base_url=get_api_base_url(),
-            max_concurrent=max_concurrent
+            max_concurrent=max_concurrent,
+            progress_callback=lambda event, **data: emit_progress(processing_id, event, **data),
+            schedule_key=schedule_key,
+            use_cache=use_cache
         ) as processor:
             processed_markdown = await processor.process_markdown_content(
                 markdown_content,
@@ -82,28 +118,228 @@ def cleanup_temp_directory(temp_dir: Path) -> bool:
         return False
 
 
+def to_http_exception(error: Exception, message_prefix: str) -> HTTPException:
+    """将处理过程中的异常转换为HTTP异常"""
+    if isinstance(error, AdmissionRejected):
+        return HTTPException(
+            status_code=error.status_code,
+            detail=error.detail,
+            headers={"Retry-After": str(error.retry_after)}
+        )
+    elif isinstance(error, UnsupportedFileTypeError):
+        return HTTPException(status_code=400, detail=error.message)
+    elif isinstance(error, FileSaveError):
+        return HTTPException(status_code=500, detail=error.message)
+    else:
+        return HTTPException(status_code=500, detail=f"{message_prefix}: {str(error)}")
+
+
+def _count_saved_pdf_pages(pdf_paths: List[Path]) -> int:
+    total_pages = 0
+    for pdf_path in pdf_paths:
+        with open(pdf_path, "rb") as f:
+            total_pages += count_pdf_pages(f.read()) or 0
+    return total_pages
+
+
+async def admit_saved_pdfs(pdf_paths: List[Path], schedule_key: Optional[ScheduleKey] = None) -> AdmissionTicket:
+    """统计已保存PDF的总页数并申请解析准入，队列已满或预估内存超出预算时抛出 AdmissionRejected"""
+    total_pages = await asyncio.to_thread(_count_saved_pdf_pages, pdf_paths)
+    return admission_controller.admit(documents=len(pdf_paths), pages=total_pages, key=schedule_key)
+
+
+def validate_artifact_policy(artifact_policy: Optional[str]) -> str:
+    """校验请求中的辅助文件策略，未指定时返回默认策略，无效时返回400"""
+    try:
+        return resolve_artifact_policy(artifact_policy)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def make_stage_reporter(
+    processing_id: str,
+    on_stage: Optional[Callable[[str], None]] = None
+) -> Callable[[str], None]:
+    """生成阶段回调：调用 on_stage 并发布 stage 进度事件"""
+    def report(stage: str) -> None:
+        if on_stage:
+            on_stage(stage)
+        emit_progress(processing_id, "stage", stage=stage)
+    return report
+
+
+def cleanup_failed_processing(pdf_paths: List[Path], temp_work_dir: Path) -> None:
+    """处理失败时清理已保存的PDF文件和临时工作目录"""
+    try:
+        for pdf_path in pdf_paths:
+            if pdf_path and pdf_path.exists():
+                pdf_path.unlink()
+        cleanup_temp_directory(temp_work_dir)
+    except Exception as cleanup_inner_error: 
+        print(f"清理文件或目录时发生内部错误: {cleanup_inner_error}")
+
+
+async def save_pdf_to_work_dir(
+    file: UploadFile,
+    storage_paths: Dict[str, Any],
+    temp_work_dir: Path
+) -> tuple[Path, Path, str]:
+    """保存上传的PDF文件，并复制到临时工作目录，返回(存储路径, 临时路径, 全文件SHA256摘要)"""
+    # 1. 保存上传的PDF文件
+    uploaded_file_info = await FileHandler.save_uploaded_pdf_file(
+        file=file,
+        save_directory=storage_paths["pdf_dir"]
+    )
+    pdf_path = Path(uploaded_file_info["file_path"])
+    print(f"PDF文件已保存: {pdf_path}")
+
+    # 2. 创建临时工作目录并复制PDF
+    temp_work_dir.mkdir(parents=True, exist_ok=True)
+    temp_pdf_path = temp_work_dir / uploaded_file_info["saved_filename"]
+    await asyncio.to_thread(shutil.copy2, pdf_path, temp_pdf_path)
+    return pdf_path, temp_pdf_path, uploaded_file_info["sha256"]
+
+
+async def process_saved_pdf(
+    file: UploadFile,
+    pdf_path: Path,
+    temp_pdf_path: Path,
+    processing_id: str,
+    storage_paths: Dict[str, Any],
+    provider: str,
+    max_concurrent: int,
+    parse_images: bool,
+    backend: str,
+    method: str,
+    use_cache: bool,
+    on_stage: Optional[Callable[[str], None]] = None,
+    content_sha256: Optional[str] = None,
+    artifact_policy: Optional[str] = None,
+    admission_ticket: Optional[AdmissionTicket] = None,
+    schedule_key: Optional[ScheduleKey] = None
+) -> Dict[str, Any]:
+    """
+    处理已保存的单个PDF：解析、图片处理、保存Markdown，返回 /upload/pdf 的响应内容
+
+    Args:
+        on_stage: 可选的阶段回调，参数为阶段名（parsing / analyzing_images / saving_markdown）
+        content_sha256: 上传时计算的全文件摘要，用作解析缓存key
+        artifact_policy: 辅助文件策略（none / minimal / debug），未指定时使用默认策略
+        admission_ticket: 解析准入凭证，解析前排队等待名额，解析结束后释放
+        schedule_key: 调度键（租户和优先级），图片分析按该键公平排队
+    """
+    on_stage = make_stage_reporter(processing_id, on_stage)
+    remote_base_url = f"{get_api_base_url()}/uploads/images/"
+    temp_work_dir = temp_pdf_path.parent
+    pdf_filename = pdf_path.name
+    markdown_path = None
+
+    # 3. 使用mineru转换PDF为Markdown，支持缓存（在解析进程池中执行，不阻塞事件循环）
+    # 先排队等待解析名额，大文档按页段分片到多个解析进程并行解析
+    async with admission_controller.run(admission_ticket):
+        on_stage("parsing")
+        print(f"开始转换PDF: {temp_pdf_path}")
+        parse_result = await parse_pdf_file(
+            pdf_file_path=str(temp_pdf_path),
+            md_output_path=str(temp_work_dir),
+            backend=backend,
+            method=method,
+            web_images_dir=str(storage_paths["images_dir"]),  # 传入web图片目录
+            use_cache=use_cache,  # 传入缓存参数
+            processing_id=processing_id,
+            content_sha256=content_sha256,
+            materialize_files=False,  # 缓存命中时只发布图片，不在临时目录写出任何文件
+            artifact_policy=artifact_policy
+        )
+    markdown_content = parse_result["md_content"]
+    
+    # 4. 处理Markdown中的图片（如果需要）
+    processed_markdown = markdown_content
+    if parse_images:
+        on_stage("analyzing_images")
+        processed_markdown = await process_markdown_with_images(
+            markdown_content, 
+            str(temp_work_dir),
+            provider,
+            max_concurrent,
+            processing_id,
+            schedule_key,
+            use_cache
+        )
+    
+    # 5. 保存处理后的Markdown文件（如果需要）
+    if storage_paths["keep_markdown_files"]:
+        on_stage("saving_markdown")
+        markdown_filename = f"{Path(pdf_filename).stem}_{processing_id}.md"
+        markdown_path = storage_paths["markdown_dir"] / markdown_filename
+        await save_markdown_file(processed_markdown, markdown_path)
+    
+    # 6. 获取文件信息
+    file_size = pdf_path.stat().st_size
+    creation_time = datetime.now().isoformat()
+    
+    # 7. 清理临时工作目录
+    directory_cleaned = cleanup_temp_directory(temp_work_dir)
+    
+    # 8. 返回处理结果
+    return {
+        "success": True,
+        "task_id": processing_id,
+        "document": {
+            "original_name": file.filename,
+            "stored_name": pdf_filename,
+            "size_bytes": file_size,
+            "mime_type": file.content_type,
+            "storage_path": str(pdf_path.relative_to(storage_paths["pdf_dir"].parent)),
+            "creation_timestamp": creation_time,
+        },
+        "markdown": {
+            "content": processed_markdown,
+            "path": str(markdown_path.relative_to(storage_paths["markdown_dir"].parent)) if storage_paths["keep_markdown_files"] and markdown_path else None,
+            "has_images": "![](" in processed_markdown or "![" in processed_markdown,
+            "images_processed": parse_images and "images" in processed_markdown.lower()
+        },
+        "processing": {
+            "provider": provider,
+            "backend": backend,
+            "method": method,
+            "artifact_policy": resolve_artifact_policy(artifact_policy),
+            "image_analysis_enabled": parse_images,
+            "remote_base_url": remote_base_url,
+            "temp_directory_cleaned": directory_cleaned
+        },
+        # 每页走文本通道还是模型解析（只有 pipeline 后端 method=auto 时有值）
+        "page_routing": parse_result.get("page_routing")
+    }
+
+
 @router.post("/pdf")
 async def upload_pdf(
+    request: Request,
     file: UploadFile = File(...),
     provider: str = Form(default=DEFAULT_IMAGE_PROVIDER),
     max_concurrent: int = Form(default=DEFAULT_MAX_CONCURRENT_AI),
     parse_images: bool = Form(default=True),
     backend: str = Form(default="pipeline"),
     method: str = Form(default="auto"),
-    use_cache: bool = Form(default=True)  # 新增缓存参数
+    use_cache: bool = Form(default=True),  # 新增缓存参数
+    artifact_policy: Optional[str] = Form(default=None)
 ):
     """
     上传PDF文件，转换为Markdown，并可选择性处理图片
     
     Args:
         file: 要上传的PDF文件
-        provider: AI视觉模型提供商 (guiji, zhipu, volces, openai)
+        provider: AI视觉模型提供商 (guiji, zhipu, volces, openai, local_mock)
         max_concurrent: 最大并发处理数
         parse_images: 是否对Markdown中的图片进行AI分析和处理
         backend: 解析PDF所用后端 (pipeline, vlm-transformers, vlm-sglang-engine)
         method: 解析PDF的方法 (auto, txt, ocr)
         use_cache: 是否使用缓存功能，默认为True
+        artifact_policy: 辅助文件策略 (none, minimal, debug)，默认使用 config.json 中的 artifacts.default_policy
         
+    请求头 X-API-Key / X-Client-Id 标识租户，默认按交互优先级调度，可用 X-Priority 覆盖。
+
     Returns:
         包含处理后的Markdown内容的JSON响应
     """
@@ -113,121 +349,205 @@ async def upload_pdf(
     print("method:", method)
     print("parse_images目前设置的参数是:", parse_images)
     print("use_cache:", use_cache)
+    artifact_policy = validate_artifact_policy(artifact_policy)
+    schedule_key = resolve_schedule_key(request, PRIORITY_INTERACTIVE)
     
-    remote_base_url = f"{get_api_base_url()}/uploads/images/"
     storage_paths = get_storage_paths()
     processing_id = uuid.uuid4().hex
     temp_work_dir = storage_paths["temp_dir"] / processing_id
     pdf_path = None
-    markdown_path = None
+    admission_ticket = None
 
     try:
-        # 1. 保存上传的PDF文件
-        uploaded_file_info = await FileHandler.save_uploaded_pdf_file(
+        pdf_path, temp_pdf_path, content_sha256 = await save_pdf_to_work_dir(file, storage_paths, temp_work_dir)
+        admission_ticket = await admit_saved_pdfs([pdf_path], schedule_key)
+        emit_progress(processing_id, "stage", stage="saved")
+        content = await process_saved_pdf(
             file=file,
-            save_directory=storage_paths["pdf_dir"]
-        )
-        pdf_filename = uploaded_file_info["saved_filename"]
-        pdf_path = Path(uploaded_file_info["file_path"])
-        print(f"PDF文件已保存: {pdf_path}")
-
-        # 2. 创建临时工作目录并复制PDF
-        temp_work_dir.mkdir(parents=True, exist_ok=True)
-        temp_pdf_path = temp_work_dir / pdf_filename
-        shutil.copy2(pdf_path, temp_pdf_path)
-        
-        # 3. 使用mineru转换PDF为Markdown，支持缓存
-        print(f"开始转换PDF: {temp_pdf_path}")
-        markdown_content = mineru_pdf2md(
-            pdf_file_path=str(temp_pdf_path),
-            md_output_path=str(temp_work_dir),
-            return_path=False,
+            pdf_path=pdf_path,
+            temp_pdf_path=temp_pdf_path,
+            processing_id=processing_id,
+            storage_paths=storage_paths,
+            provider=provider,
+            max_concurrent=max_concurrent,
+            parse_images=parse_images,
             backend=backend,
             method=method,
-            web_images_dir=str(storage_paths["images_dir"]),  # 传入web图片目录
-            use_cache=use_cache  # 传入缓存参数
+            use_cache=use_cache,
+            content_sha256=content_sha256,
+            artifact_policy=artifact_policy,
+            admission_ticket=admission_ticket,
+            schedule_key=schedule_key
         )
+        emit_progress(processing_id, "completed")
+        return JSONResponse(status_code=200, content=content)
         
-        # 4. 处理Markdown中的图片（如果需要）
-        processed_markdown = markdown_content
-        if parse_images:
-            processed_markdown = await process_markdown_with_images(
-                markdown_content, 
-                str(temp_work_dir),
-                provider,
-                max_concurrent
-            )
-        
-        # 5. 保存处理后的Markdown文件（如果需要）
-        if storage_paths["keep_markdown_files"]:
-            markdown_filename = f"{Path(pdf_filename).stem}_{processing_id}.md"
-            markdown_path = storage_paths["markdown_dir"] / markdown_filename
-            await save_markdown_file(processed_markdown, markdown_path)
-        
-        # 6. 获取文件信息
-        file_size = pdf_path.stat().st_size
-        creation_time = datetime.now().isoformat()
-        
-        # 7. 清理临时工作目录
-        directory_cleaned = cleanup_temp_directory(temp_work_dir)
-        
-        # 8. 返回处理结果
-        return JSONResponse(
-            status_code=200,
-            content={
-                "success": True,
+    except Exception as e:
+        # 清理可能创建的文件
+        admission_controller.release(admission_ticket)
+        cleanup_failed_processing([pdf_path], temp_work_dir)
+        print(f"PDF处理错误: {str(e)}")
+        http_error = to_http_exception(e, "PDF处理失败")
+        emit_progress(processing_id, "failed", error=http_error.detail)
+        raise http_error
+
+
+async def stream_saved_pdf(
+    file: UploadFile,
+    pdf_path: Path,
+    temp_pdf_path: Path,
+    processing_id: str,
+    storage_paths: Dict[str, Any],
+    backend: str,
+    method: str,
+    use_cache: bool,
+    output_format: str,
+    content_sha256: Optional[str] = None,
+    artifact_policy: Optional[str] = None,
+    admission_ticket: Optional[AdmissionTicket] = None
+):
+    """
+    逐页解析已保存的PDF并产出响应内容（NDJSON记录或Markdown文本），结束后清理临时目录
+
+    Markdown在产出的同时追加写入 markdown 目录，不在内存中拼接整篇内容；
+    提供 admission_ticket 时先排队等待解析名额，结束后释放
+    """
+    temp_work_dir = temp_pdf_path.parent
+    markdown_file = None
+    wrote_markdown = False
+    if storage_paths["keep_markdown_files"]:
+        markdown_path = storage_paths["markdown_dir"] / f"{Path(pdf_path.name).stem}_{processing_id}.md"
+        markdown_file = await aiofiles.open(markdown_path, "w", encoding="utf-8")
+
+    def encode(record: Dict[str, Any]) -> Optional[str]:
+        if output_format == "ndjson":
+            return json.dumps(record, ensure_ascii=False) + "\n"
+        return record["markdown"] + "\n\n" if record.get("markdown") else None
+
+    try:
+        if output_format == "ndjson":
+            yield encode({
+                "type": "document",
                 "task_id": processing_id,
-                "document": {
-                    "original_name": file.filename,
-                    "stored_name": pdf_filename,
-                    "size_bytes": file_size,
-                    "mime_type": file.content_type,
-                    "storage_path": str(pdf_path.relative_to(storage_paths["pdf_dir"].parent)),
-                    "creation_timestamp": creation_time,
-                },
-                "markdown": {
-                    "content": processed_markdown,
-                    "path": str(markdown_path.relative_to(storage_paths["markdown_dir"].parent)) if storage_paths["keep_markdown_files"] and markdown_path else None,
-                    "has_images": "![](" in processed_markdown or "![" in processed_markdown,
-                    "images_processed": parse_images and "images" in processed_markdown.lower()
-                },
-                "processing": {
-                    "provider": provider,
-                    "backend": backend,
-                    "method": method,
-                    "image_analysis_enabled": parse_images,
-                    "remote_base_url": remote_base_url,
-                    "temp_directory_cleaned": directory_cleaned
-                }
-            }
+                "original_name": file.filename,
+                "stored_name": pdf_path.name,
+                "storage_path": str(pdf_path.relative_to(storage_paths["pdf_dir"].parent))
+            })
+        async with admission_controller.run(admission_ticket):
+            emit_progress(processing_id, "stage", stage="parsing")
+            async for record in stream_pdf_pages(
+                pdf_file_path=str(temp_pdf_path),
+                md_output_path=str(temp_work_dir),
+                backend=backend,
+                method=method,
+                web_images_dir=str(storage_paths["images_dir"]),
+                use_cache=use_cache,
+                processing_id=processing_id,
+                content_sha256=content_sha256,
+                artifact_policy=artifact_policy
+            ):
+                if markdown_file and record.get("markdown"):
+                    await markdown_file.write(("\n\n" if wrote_markdown else "") + record["markdown"])
+                    wrote_markdown = True
+                chunk = encode(record)
+                if chunk:
+                    yield chunk
+        emit_progress(processing_id, "completed")
+    except Exception as e:
+        # 响应头已发送，只能在流中报告错误
+        print(f"PDF流式处理错误: {str(e)}")
+        emit_progress(processing_id, "failed", error=str(e))
+        if output_format == "ndjson":
+            yield encode({"type": "error", "detail": f"PDF处理失败: {str(e)}"})
+    finally:
+        admission_controller.release(admission_ticket)
+        if markdown_file:
+            await markdown_file.close()
+        cleanup_temp_directory(temp_work_dir)
+
+
+@router.post("/pdf/stream")
+async def upload_pdf_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    backend: str = Form(default="pipeline"),
+    method: str = Form(default="auto"),
+    use_cache: bool = Form(default=True),
+    artifact_policy: Optional[str] = Form(default=None),
+    output_format: str = Form(default="ndjson")
+):
+    """
+    上传PDF文件，边解析边逐页返回Markdown
+
+    pipeline 后端按 streaming.window_pages 页的窗口解析，每个窗口完成后立即输出其中各页，
+    下游可以在后面的页还在解析时开始处理前面的页。不做图片AI分析（需要时使用 /upload/pdf）。
+
+    Args:
+        file: 要上传的PDF文件
+        backend: 解析PDF所用后端 (pipeline, vlm-transformers, vlm-sglang-engine)
+        method: 解析PDF的方法 (auto, txt, ocr)
+        use_cache: 是否使用缓存功能，默认为True
+        artifact_policy: 辅助文件策略 (none, minimal, debug)，默认使用 config.json 中的 artifacts.default_policy
+        output_format: ndjson（每行一条JSON记录，默认）或 markdown（纯Markdown文本，页之间空一行）
+
+    Returns:
+        流式响应，响应头 X-Task-Id 为处理ID，可用于订阅 /progress/{task_id}
+    """
+    if output_format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"无效的输出格式: {output_format}，可选 {', '.join(STREAM_MEDIA_TYPES)}"
         )
-        
+    artifact_policy = validate_artifact_policy(artifact_policy)
+    schedule_key = resolve_schedule_key(request, PRIORITY_INTERACTIVE)
+
+    storage_paths = get_storage_paths()
+    processing_id = uuid.uuid4().hex
+    temp_work_dir = storage_paths["temp_dir"] / processing_id
+    pdf_path = None
+
+    try:
+        pdf_path, temp_pdf_path, content_sha256 = await save_pdf_to_work_dir(file, storage_paths, temp_work_dir)
+        admission_ticket = await admit_saved_pdfs([pdf_path], schedule_key)
+        emit_progress(processing_id, "stage", stage="saved")
     except Exception as e:
-        # 清理可能创建的文件
-        try:
-            if pdf_path and pdf_path.exists():
-                pdf_path.unlink()
-            cleanup_temp_directory(temp_work_dir)
-        except Exception as cleanup_inner_error: 
-            print(f"清理文件或目录时发生内部错误: {cleanup_inner_error}")
-        
+        cleanup_failed_processing([pdf_path], temp_work_dir)
         print(f"PDF处理错误: {str(e)}")
-        if isinstance(e, UnsupportedFileTypeError):
-            raise HTTPException(status_code=400, detail=e.message)
-        elif isinstance(e, FileSaveError):
-            raise HTTPException(status_code=500, detail=e.message)
-        else:
-            raise HTTPException(status_code=500, detail=f"PDF处理失败: {str(e)}")
+        http_error = to_http_exception(e, "PDF处理失败")
+        emit_progress(processing_id, "failed", error=http_error.detail)
+        raise http_error
+
+    return StreamingResponse(
+        stream_saved_pdf(
+            file=file,
+            pdf_path=pdf_path,
+            temp_pdf_path=temp_pdf_path,
+            processing_id=processing_id,
+            storage_paths=storage_paths,
+            backend=backend,
+            method=method,
+            use_cache=use_cache,
+            output_format=output_format,
+            content_sha256=content_sha256,
+            artifact_policy=artifact_policy,
+            admission_ticket=admission_ticket
+        ),
+        media_type=STREAM_MEDIA_TYPES[output_format],
+        headers={"X-Task-Id": processing_id},
+        # 客户端在流开始前断开时生成器不会执行，由后台任务兜底释放准入凭证
+        background=BackgroundTask(admission_controller.release, admission_ticket)
+    )
 
 
 async def save_uploaded_pdfs(
     files: List[UploadFile], 
     save_directory: Path,
     temp_work_dir: Path
-) -> tuple[List[Path], List[str]]:
-    """保存上传的PDF文件并返回路径列表"""
+) -> tuple[List[Path], List[str], List[str]]:
+    """保存上传的PDF文件，返回(存储路径列表, 临时路径列表, 全文件SHA256摘要列表)"""
     pdf_paths = []
     temp_pdf_paths = []
+    content_digests = []
     
     for file in files:
         uploaded_file_info = await FileHandler.save_uploaded_pdf_file(
@@ -237,14 +557,15 @@ async def save_uploaded_pdfs(
         pdf_filename = uploaded_file_info["saved_filename"]
         pdf_path = Path(uploaded_file_info["file_path"])
         pdf_paths.append(pdf_path)
+        content_digests.append(uploaded_file_info["sha256"])
         
         # 复制到临时目录
         temp_pdf_path = temp_work_dir / pdf_filename
-        shutil.copy2(pdf_path, temp_pdf_path)
+        await asyncio.to_thread(shutil.copy2, pdf_path, temp_pdf_path)
         temp_pdf_paths.append(str(temp_pdf_path))
     
     print(f"已保存 {len(pdf_paths)} 个PDF文件")
-    return pdf_paths, temp_pdf_paths
+    return pdf_paths, temp_pdf_paths, content_digests
 
 
 async def process_single_pdf_result(
@@ -257,7 +578,9 @@ async def process_single_pdf_result(
     idx: int,
     provider: str,
     max_concurrent: int,
-    parse_images: bool
+    parse_images: bool,
+    schedule_key: Optional[ScheduleKey] = None,
+    use_cache: bool = True
 ) -> Dict[str, Any]:
     """处理单个PDF结果，包括图片处理和保存Markdown"""
     markdown_content = result.get('md_content', '')
@@ -265,11 +588,15 @@ async def process_single_pdf_result(
     # 处理图片（如果需要）
     processed_markdown = markdown_content
     if parse_images and markdown_content:
+        emit_progress(processing_id, "document_images", document_index=idx, file_name=pdf_path.name)
         processed_markdown = await process_markdown_with_images(
             markdown_content,
             temp_work_dir,
             provider,
-            max_concurrent
+            max_concurrent,
+            processing_id,
+            schedule_key,
+            use_cache
         )
     
     # 保存Markdown文件
@@ -299,32 +626,133 @@ async def process_single_pdf_result(
             "path": str(markdown_path.relative_to(storage_paths["markdown_dir"].parent)) if storage_paths["keep_markdown_files"] and markdown_path else None,
             "has_images": "![](" in processed_markdown or "![" in processed_markdown,
             "images_processed": parse_images and "images" in processed_markdown.lower()
+        },
+        "page_routing": result.get("page_routing")
+    }
+
+
+async def process_saved_pdfs(
+    files: List[UploadFile],
+    pdf_paths: List[Path],
+    temp_pdf_paths: List[str],
+    temp_work_dir: Path,
+    processing_id: str,
+    storage_paths: Dict[str, Any],
+    provider: str,
+    max_concurrent: int,
+    parse_images: bool,
+    backend: str,
+    method: str,
+    use_cache: bool,
+    on_stage: Optional[Callable[[str], None]] = None,
+    content_digests: Optional[List[str]] = None,
+    artifact_policy: Optional[str] = None,
+    admission_ticket: Optional[AdmissionTicket] = None,
+    schedule_key: Optional[ScheduleKey] = None
+) -> Dict[str, Any]:
+    """
+    处理已保存的多个PDF：批量解析、逐个处理图片并保存Markdown，返回 /upload/pdfs 的响应内容
+
+    Args:
+        on_stage: 可选的阶段回调，参数为阶段名（parsing / analyzing_images）
+        content_digests: 上传时计算的全文件摘要列表，用作解析缓存key
+        artifact_policy: 辅助文件策略（none / minimal / debug），未指定时使用默认策略
+        admission_ticket: 解析准入凭证，解析前排队等待名额，解析结束后释放
+        schedule_key: 调度键（租户和优先级），图片分析按该键公平排队
+    """
+    on_stage = make_stage_reporter(processing_id, on_stage)
+    remote_base_url = f"{get_api_base_url()}/uploads/images/"
+
+    # 3. 使用mineru批量转换PDF为Markdown，支持缓存（在解析进程池中执行，不阻塞事件循环）
+    async with admission_controller.run(admission_ticket):
+        on_stage("parsing")
+        print("开始批量转换PDF...")
+        pdf_results = await parse_pdf_files(
+            pdf_file_paths=temp_pdf_paths,
+            md_output_path=str(temp_work_dir),
+            backend=backend,
+            method=method,
+            web_images_dir=str(storage_paths["images_dir"]),  # 传入web图片目录
+            use_cache=use_cache,  # 传入缓存参数
+            processing_id=processing_id,
+            content_sha256_list=content_digests,
+            materialize_files=False,  # 缓存命中时只发布图片，不在临时目录写出任何文件
+            artifact_policy=artifact_policy
+        )
+    
+    # 4. 处理每个PDF结果
+    if parse_images:
+        on_stage("analyzing_images")
+    processed_results = []
+    for idx, result in enumerate(pdf_results):
+        processed_result = await process_single_pdf_result(
+            result=result,
+            original_file=files[idx],
+            pdf_path=pdf_paths[idx],
+            temp_work_dir=str(temp_work_dir),
+            storage_paths=storage_paths,
+            processing_id=processing_id,
+            idx=idx,
+            provider=provider,
+            max_concurrent=max_concurrent,
+            parse_images=parse_images,
+            schedule_key=schedule_key,
+            use_cache=use_cache
+        )
+        processed_results.append(processed_result)
+    
+    # 5. 清理临时工作目录
+    directory_cleaned = cleanup_temp_directory(temp_work_dir)
+    
+    # 6. 返回处理结果
+    return {
+        "success": True,
+        "task_id": processing_id,
+        "summary": {
+            "total_documents": len(files),
+            "processed_count": len(processed_results),
+            "message": f"成功处理 {len(processed_results)} 个PDF文件"
+        },
+        "documents": processed_results,
+        "processing": {
+            "provider": provider,
+            "backend": backend,
+            "method": method,
+            "artifact_policy": resolve_artifact_policy(artifact_policy),
+            "image_analysis_enabled": parse_images,
+            "remote_base_url": remote_base_url,
+            "temp_directory_cleaned": directory_cleaned
         }
     }
 
 
 @router.post("/pdfs")
 async def upload_and_process_multiple_pdfs(
+    request: Request,
     files: List[UploadFile] = File(...),
     provider: str = Form(default=DEFAULT_IMAGE_PROVIDER), 
     max_concurrent: int = Form(default=DEFAULT_MAX_CONCURRENT_AI),
     parse_images: bool = Form(default=True),
     backend: str = Form(default="pipeline"),
     method: str = Form(default="auto"),
-    use_cache: bool = Form(default=True)  
+    use_cache: bool = Form(default=True),
+    artifact_policy: Optional[str] = Form(default=None)
 ):
     """
     上传多个PDF文件，批量转换为Markdown，并可选择性处理图片
     
     Args:
         files: 要上传的PDF文件列表
-        provider: AI视觉模型提供商 (guiji, zhipu, volces, openai)
+        provider: AI视觉模型提供商 (guiji, zhipu, volces, openai, local_mock)
         max_concurrent: 最大并发处理数
         parse_images: 是否对Markdown中的图片进行AI分析和处理
         backend: 解析PDF所用后端 (pipeline, vlm-transformers, vlm-sglang-engine)
         method: 解析PDF的方法 (auto, txt, ocr)
         use_cache: 是否使用缓存功能，默认为True
+        artifact_policy: 辅助文件策略 (none, minimal, debug)，默认使用 config.json 中的 artifacts.default_policy
         
+    请求头 X-API-Key / X-Client-Id 标识租户，默认按批量优先级调度，可用 X-Priority 覆盖。
+
     Returns:
         包含处理后的Markdown内容列表的JSON响应
     """
@@ -334,92 +762,72 @@ async def upload_and_process_multiple_pdfs(
     print(f"上传的文件数量: {len(files)}")
     print(f"provider: {provider}, backend: {backend}, method: {method}")
     print(f"use_cache: {use_cache}")
+    artifact_policy = validate_artifact_policy(artifact_policy)
+    schedule_key = resolve_schedule_key(request, PRIORITY_BULK)
     
-    remote_base_url = f"{get_api_base_url()}/uploads/images/"
     storage_paths = get_storage_paths()
     processing_id = uuid.uuid4().hex
     temp_work_dir = storage_paths["temp_dir"] / processing_id
     pdf_paths = []
+    admission_ticket = None
     
     try:
         # 1. 创建临时工作目录
         temp_work_dir.mkdir(parents=True, exist_ok=True)
         
-        # 2. 保存上传的PDF文件
-        pdf_paths, temp_pdf_paths = await save_uploaded_pdfs(files, storage_paths["pdf_dir"], temp_work_dir)
+        # 2. 保存上传的PDF文件，并申请解析准入
+        pdf_paths, temp_pdf_paths, content_digests = await save_uploaded_pdfs(files, storage_paths["pdf_dir"], temp_work_dir)
+        admission_ticket = await admit_saved_pdfs(pdf_paths, schedule_key)
+        emit_progress(processing_id, "stage", stage="saved")
         
-        # 3. 使用mineru批量转换PDF为Markdown，支持缓存
-        print("开始批量转换PDF...")
-        pdf_results = mineru_multi_pdf2md(
-            pdf_file_paths=temp_pdf_paths,
-            md_output_path=str(temp_work_dir),
-            return_content=True,
+        content = await process_saved_pdfs(
+            files=files,
+            pdf_paths=pdf_paths,
+            temp_pdf_paths=temp_pdf_paths,
+            temp_work_dir=temp_work_dir,
+            processing_id=processing_id,
+            storage_paths=storage_paths,
+            provider=provider,
+            max_concurrent=max_concurrent,
+            parse_images=parse_images,
             backend=backend,
             method=method,
-            web_images_dir=str(storage_paths["images_dir"]),  # 传入web图片目录
-            use_cache=use_cache  # 传入缓存参数
-        )
-        
-        # 4. 处理每个PDF结果
-        processed_results = []
-        for idx, result in enumerate(pdf_results):
-            processed_result = await process_single_pdf_result(
-                result=result,
-                original_file=files[idx],
-                pdf_path=pdf_paths[idx],
-                temp_work_dir=str(temp_work_dir),
-                storage_paths=storage_paths,
-                processing_id=processing_id,
-                idx=idx,
-                provider=provider,
-                max_concurrent=max_concurrent,
-                parse_images=parse_images
-            )
-            processed_results.append(processed_result)
-        
-        # 5. 清理临时工作目录
-        directory_cleaned = cleanup_temp_directory(temp_work_dir)
-        
-        # 6. 返回处理结果
-        return JSONResponse(
-            status_code=200,
-            content={
-                "success": True,
-                "task_id": processing_id,
-                "summary": {
-                    "total_documents": len(files),
-                    "processed_count": len(processed_results),
-                    "message": f"成功处理 {len(processed_results)} 个PDF文件"
-                },
-                "documents": processed_results,
-                "processing": {
-                    "provider": provider,
-                    "backend": backend,
-                    "method": method,
-                    "image_analysis_enabled": parse_images,
-                    "remote_base_url": remote_base_url,
-                    "temp_directory_cleaned": directory_cleaned
-                }
-            }
+            use_cache=use_cache,
+            content_digests=content_digests,
+            artifact_policy=artifact_policy,
+            admission_ticket=admission_ticket,
+            schedule_key=schedule_key
         )
+        emit_progress(processing_id, "completed")
+        return JSONResponse(status_code=200, content=content)
         
     except Exception as e:
         # 清理可能创建的文件
-        try:
-            for pdf_path in pdf_paths:
-                if pdf_path.exists():
-                    pdf_path.unlink()
-            cleanup_temp_directory(temp_work_dir)
-        except Exception as cleanup_inner_error: 
-            print(f"清理文件或目录时发生内部错误: {cleanup_inner_error}")
-        
+        admission_controller.release(admission_ticket)
+        cleanup_failed_processing(pdf_paths, temp_work_dir)
         print(f"批量PDF处理错误: {str(e)}")
-        if isinstance(e, UnsupportedFileTypeError):
-            raise HTTPException(status_code=400, detail=e.message)
-        elif isinstance(e, FileSaveError):
-            raise HTTPException(status_code=500, detail=e.message)
-        else:
-            raise HTTPException(status_code=500, detail=f"批量PDF处理失败: {str(e)}")
+        http_error = to_http_exception(e, "批量PDF处理失败")
+        emit_progress(processing_id, "failed", error=http_error.detail)
+        raise http_error
+
+
+@router.get("/queue/stats")
+async def get_queue_statistics():
+    """
+    获取解析队列的深度、资源占用和准入限额
+
+    Returns:
+        包含排队请求数、排队页数、解析中文档数、预估内存等信息的JSON响应
+    """
+    return JSONResponse(content={
+        "message": "解析队列统计信息获取成功",
+        "queue_stats": admission_controller.get_stats(),
+        "image_analysis": image_scheduler.get_stats(),
+        "vision_clients": get_client_registry_stats(),
+        "image_batching": get_batching_stats(),
+        "image_resilience": get_resilience_stats(),
+        "provider_routing": get_router_stats()
+    })
 
 
 # 缓存管理路由
@@ -432,10 +840,14 @@ async def get_cache_statistics():
         包含缓存统计信息的JSON响应
     """
     try:
-        stats = get_cache_stats()
+        # 统计需要遍历缓存文件目录，放到线程中执行
+        stats = await asyncio.to_thread(get_cache_stats)
+        image_analysis_stats = await asyncio.to_thread(get_analysis_cache_stats)
         return JSONResponse(content={
             "message": "缓存统计信息获取成功",
-            "cache_stats": stats
+            "cache_stats": stats,
+            "image_analysis_cache_stats": image_analysis_stats,
+            "image_dedup_stats": get_image_dedup_stats()
         })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取缓存统计信息失败: {str(e)}")
@@ -450,7 +862,7 @@ async def clear_cache():
         包含清理结果的JSON响应
     """
     try:
-        success = clear_pdf_cache()
+        success = await asyncio.to_thread(clear_pdf_cache)
         if success:
             return JSONResponse(content={
                 "message": "缓存清理成功",
@@ -466,3 +878,21 @@ async def clear_cache():
             )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"清理缓存失败: {str(e)}")
+
+
+@router.delete("/cache/image-analysis/clear")
+async def clear_image_analysis_cache():
+    """
+    清理图片分析结果缓存（PDF解析缓存不受影响）
+
+    Returns:
+        包含清理结果的JSON响应
+    """
+    success = await asyncio.to_thread(clear_analysis_cache)
+    return JSONResponse(
+        status_code=200 if success else 500,
+        content={
+            "message": "图片分析缓存清理成功" if success else "图片分析缓存清理失败",
+            "success": success
+        }
+    )
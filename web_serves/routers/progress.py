@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+处理进度相关路由
+
+通过 Server-Sent Events 推送某个 processing_id（即 task_id）的处理进度：
+阶段变化、页数、每张图片的分析完成情况，收到 completed / failed 事件后连接关闭。
+"""
+import json
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from web_serves.utils.progress import progress_broker
+
+router = APIRouter(prefix="/progress", tags=["处理进度"])
+
+# 没有新事件时发送心跳的间隔（秒），避免代理因连接空闲而断开
+KEEPALIVE_SECONDS = 15
+
+
+def format_sse(event: dict) -> str:
+    """将事件格式化为SSE消息"""
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@router.get("/{processing_id}")
+async def stream_progress(processing_id: str):
+    """
+    订阅处理进度（text/event-stream）
+
+    连接时先回放已发生的事件，再推送实时事件。
+    事件类型: stage / pages / images_found / image_analyzed / image_uploaded / document_images / completed / failed
+
+    Returns:
+        SSE 流；processing_id 不存在或已过期时返回404
+    """
+    if not progress_broker.exists(processing_id):
+        raise HTTPException(status_code=404, detail=f"处理任务不存在或已过期: {processing_id}")
+
+    async def event_stream():
+        async for event in progress_broker.subscribe(processing_id, keepalive=KEEPALIVE_SECONDS):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+解析队列准入控制 - 限制同时解析的文档数、排队页数和预估内存
+
+每个解析请求（单个PDF、批量PDF、流式请求或异步任务）保存上传文件后先申请准入：
+1. 已受理请求（排队中 + 解析中）的预估内存超过 max_estimated_memory_gb 时返回503，
+   避免一批突发的 /upload/pdfs 把进程内存推到 PM2 的 max_memory_restart 而被整体重启；
+2. 排队中的页数超过 max_queued_pages 时返回429；
+3. 受理后由公平调度器（见 scheduler.py）按优先级和租户排队，同时解析的文档数不超过 max_concurrent_documents，
+   且不超过解析进程数：放行的请求都能立即拿到解析进程，不会在进程池的队列中排在其他请求后面。
+
+拒绝时附带 Retry-After，由排在前面的页数和最近的解析速度估算。
+当前没有任何已受理的请求时总是受理，单个超出限额的大文档也能被处理。
+"""
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional
+
+from web_serves.config import (
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_CONCURRENT_DOCUMENTS,
+    ADMISSION_MAX_QUEUED_PAGES,
+    ADMISSION_MAX_ESTIMATED_MEMORY_MB,
+    ADMISSION_BASE_MEMORY_MB,
+    ADMISSION_MEMORY_PER_PAGE_MB,
+    ADMISSION_INITIAL_SECONDS_PER_PAGE,
+    ADMISSION_MAX_RETRY_AFTER,
+    SCHEDULER_TENANT_MAX_CONCURRENT_DOCUMENTS,
+    PARSE_MAX_WORKERS
+)
+from web_serves.utils.logger import get_logger
+from web_serves.utils.scheduler import FairScheduler, ScheduleGrant, ScheduleKey
+
+logger = get_logger(__name__)
+
+# 解析速度（每页秒数）指数滑动平均的权重
+SPEED_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """解析队列已满或预估内存超出预算，请求被拒绝"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdmissionTicket:
+    """一次已受理的解析请求"""
+    documents: int
+    pages: int
+    memory_mb: float
+    key: Optional[ScheduleKey] = None
+    admitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    grant: Optional[ScheduleGrant] = None
+    released: bool = False
+
+
+class AdmissionController:
+    """解析队列准入控制器，只在事件循环线程中使用"""
+
+    def __init__(
+        self,
+        enabled: bool = ADMISSION_ENABLED,
+        max_concurrent_documents: int = ADMISSION_MAX_CONCURRENT_DOCUMENTS,
+        max_queued_pages: int = ADMISSION_MAX_QUEUED_PAGES,
+        max_memory_mb: float = ADMISSION_MAX_ESTIMATED_MEMORY_MB,
+        parse_workers: int = PARSE_MAX_WORKERS
+    ):
+        """
+        初始化准入控制器
+
+        Args:
+            enabled: 是否启用，关闭时所有请求直接受理、不排队
+            max_concurrent_documents: 同时解析的最大文档数
+            max_queued_pages: 排队等待解析的最大页数
+            max_memory_mb: 已受理请求的预估内存上限（MB）
+            parse_workers: 解析进程数，同时放行的名额数不超过该值
+        """
+        self.enabled = enabled
+        self.max_concurrent_documents = max(1, min(max_concurrent_documents, parse_workers))
+        self.parse_workers = max(1, parse_workers)
+        self.max_queued_pages = max_queued_pages
+        self.max_memory_mb = max_memory_mb
+        self.seconds_per_page = ADMISSION_INITIAL_SECONDS_PER_PAGE
+        self.scheduler = FairScheduler(
+            "parse",
+            self.max_concurrent_documents,
+            "max_concurrent_documents",
+            SCHEDULER_TENANT_MAX_CONCURRENT_DOCUMENTS
+        )
+        self._running_documents = 0
+        self._running_pages = 0
+        self._queued_pages = 0
+        self._memory_mb = 0.0
+        self._admitted = 0
+        self._counters = {"admitted": 0, "rejected_queue_full": 0, "rejected_memory": 0, "completed": 0}
+
+    @staticmethod
+    def estimate_memory_mb(documents: int, pages: int) -> float:
+        """按文档数和页数估算解析所需内存（MB）"""
+        return documents * ADMISSION_BASE_MEMORY_MB + pages * ADMISSION_MEMORY_PER_PAGE_MB
+
+    def _retry_after(self) -> int:
+        """按排在前面的页数和最近的解析速度估算多久后再试"""
+        pages_ahead = self._queued_pages + self._running_pages
+        seconds = pages_ahead * self.seconds_per_page / self.parse_workers
+        return int(min(ADMISSION_MAX_RETRY_AFTER, max(1, math.ceil(seconds))))
+
+    def admit(self, documents: int, pages: int, key: Optional[ScheduleKey] = None) -> AdmissionTicket:
+        """
+        申请受理一个解析请求
+
+        Args:
+            documents: 请求中的文档数
+            pages: 请求中所有文档的总页数
+            key: 调度键（租户和优先级），为None时使用默认键
+
+        Returns:
+            准入凭证，解析时传给 run，失败时传给 release
+
+        Raises:
+            AdmissionRejected: 排队页数超限（429）或预估内存超出预算（503）
+        """
+        pages = max(1, pages)
+        ticket = AdmissionTicket(documents=documents, pages=pages,
+                                 memory_mb=self.estimate_memory_mb(documents, pages), key=key)
+        if self.enabled and self._admitted > 0:
+            if self._memory_mb + ticket.memory_mb > self.max_memory_mb:
+                self._counters["rejected_memory"] += 1
+                raise AdmissionRejected(
+                    503,
+                    f"服务器繁忙：已受理请求预估占用 {self._memory_mb:.0f}MB 内存，"
+                    f"再受理 {pages} 页将超出 {self.max_memory_mb:.0f}MB 的预算",
+                    self._retry_after()
+                )
+            if self._queued_pages + pages > self.max_queued_pages:
+                self._counters["rejected_queue_full"] += 1
+                raise AdmissionRejected(
+                    429,
+                    f"解析队列已满：排队中 {self._queued_pages} 页，上限 {self.max_queued_pages} 页",
+                    self._retry_after()
+                )
+        self._admitted += 1
+        self._queued_pages += pages
+        self._memory_mb += ticket.memory_mb
+        self._counters["admitted"] += 1
+        return ticket
+
+    @staticmethod
+    def _running_slots(ticket: AdmissionTicket) -> int:
+        """凭证实际占用的名额数：批量请求的名额按上限截断，未启用调度时按文档数计"""
+        return ticket.grant.slots if ticket.grant is not None else ticket.documents
+
+    def _start(self, ticket: AdmissionTicket) -> None:
+        ticket.started_at = time.monotonic()
+        self._queued_pages -= ticket.pages
+        self._running_pages += ticket.pages
+        self._running_documents += self._running_slots(ticket)
+
+    @asynccontextmanager
+    async def run(self, ticket: Optional[AdmissionTicket]) -> AsyncIterator[None]:
+        """
+        按调度键排队等待解析名额，退出时释放凭证并更新解析速度
+
+        Args:
+            ticket: admit 返回的凭证，为None时不做任何限制
+        """
+        if ticket is None:
+            yield
+            return
+        try:
+            if self.enabled:
+                # 批量请求按文档数占用名额，代价为页数
+                ticket.grant = await self.scheduler.acquire(ticket.key, slots=ticket.documents, cost=ticket.pages)
+            self._start(ticket)
+            yield
+            elapsed = time.monotonic() - ticket.started_at
+            self.seconds_per_page += SPEED_EWMA_ALPHA * (elapsed / ticket.pages - self.seconds_per_page)
+            self._counters["completed"] += 1
+        finally:
+            self.release(ticket)
+
+    def release(self, ticket: Optional[AdmissionTicket]) -> None:
+        """释放凭证占用的排队页数、解析名额和预估内存，可重复调用"""
+        if ticket is None or ticket.released:
+            return
+        ticket.released = True
+        self._admitted -= 1
+        self._memory_mb -= ticket.memory_mb
+        if ticket.started_at is None:
+            self._queued_pages -= ticket.pages
+        else:
+            self._running_pages -= ticket.pages
+            self._running_documents -= self._running_slots(ticket)
+        self.scheduler.release(ticket.grant)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列深度、资源占用、限额和调度器状态"""
+        scheduler_stats = self.scheduler.get_stats()
+        return {
+            "enabled": self.enabled,
+            "queued_requests": scheduler_stats["queued"],
+            "queued_pages": self._queued_pages,
+            "running_documents": self._running_documents,
+            "running_pages": self._running_pages,
+            "estimated_memory_mb": round(self._memory_mb, 1),
+            "seconds_per_page": round(self.seconds_per_page, 3),
+            "retry_after_estimate": self._retry_after(),
+            "limits": {
+                "max_concurrent_documents": self.max_concurrent_documents,
+                "max_queued_pages": self.max_queued_pages,
+                "max_estimated_memory_mb": self.max_memory_mb,
+            },
+            **self._counters,
+            "scheduler": scheduler_stats,
+        }
+
+
+# 全局准入控制器
+admission_controller = AdmissionController()
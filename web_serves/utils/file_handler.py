@@ -6,6 +6,7 @@
 import os
 import uuid
 import shutil
+import hashlib
 from typing import Dict, Any, Optional
 from pathlib import Path
 from fastapi import UploadFile
@@ -16,6 +17,9 @@ from web_serves.config import app_config # Import app_config
 
 logger = get_logger(__name__)
 
+# 流式写入上传文件时每次读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 class FileHandler:
     """文件处理工具类"""
@@ -136,7 +140,7 @@ class FileHandler:
             custom_filename: 自定义文件名，如果为None则自动生成
             
         Returns:
-            包含文件信息的字典
+            包含文件信息的字典，其中 sha256 为写入过程中计算的全文件摘要（用作解析缓存key）
             
         Raises:
             UnsupportedFileTypeError: 文件类型不支持或文件名为空
@@ -158,10 +162,14 @@ class FileHandler:
             filename_to_save = custom_filename or FileHandler.generate_unique_filename(file.filename)
             file_path = save_directory / filename_to_save
             
+            # 边写入边计算摘要，避免解析前再次完整读取文件
+            digest = hashlib.sha256()
+            file_size = 0
             with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            file_size = os.path.getsize(file_path)
+                while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    buffer.write(chunk)
+                    file_size += len(chunk)
             
             logger.info(f"PDF文件保存成功: {file.filename} -> {file_path}")
             
@@ -170,6 +178,7 @@ class FileHandler:
                 "saved_filename": filename_to_save, # Return the actual saved name
                 "file_path": str(file_path),
                 "file_size": file_size,
+                "sha256": digest.hexdigest(),
                 "content_type": file.content_type or "application/pdf" # Fallback content type
             }
             
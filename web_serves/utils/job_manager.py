@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步任务管理 - 提交后立即返回 task_id，后台执行并可轮询状态和结果
+
+任务状态只保存少量元数据在内存中；任务结果（可能包含很大的Markdown内容）
+写入 diskcache，避免成千上万个任务的结果同时占用内存。
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import diskcache as dc
+
+from web_serves.config import JOB_RESULT_TTL, JOB_MAX_RECORDS
+from web_serves.utils.logger import get_logger
+from web_serves.utils.progress import emit_progress, progress_broker
+
+logger = get_logger(__name__)
+
+# 任务结果缓存目录，与PDF解析缓存分开，清理解析缓存不会影响任务结果
+JOB_CACHE_DIR = os.path.join(os.path.expanduser("."), ".cache", "remote_pdf_parse_serve_jobs")
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# 各阶段对应的大致进度，用于 progress 字段
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "saved": 0.05,
+    "parsing": 0.1,
+    "analyzing_images": 0.7,
+    "saving_markdown": 0.95,
+    "done": 1.0,
+}
+
+
+class JobManager:
+    """异步任务管理器"""
+
+    def __init__(self, result_ttl: int = JOB_RESULT_TTL, max_records: int = JOB_MAX_RECORDS):
+        """
+        初始化任务管理器
+
+        Args:
+            result_ttl: 任务完成后结果保留的时间（秒）
+            max_records: 内存中最多保留的任务记录数
+        """
+        self.result_ttl = result_ttl
+        self.max_records = max_records
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._results = dc.Cache(JOB_CACHE_DIR)
+
+    def create_job(self, task_id: str, kind: str, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        创建任务记录
+
+        Args:
+            task_id: 任务ID（即 processing_id）
+            kind: 任务类型，如 "pdf" / "pdfs"
+            meta: 附加信息，如文件名、解析参数
+
+        Returns:
+            任务状态字典
+        """
+        self._evict_expired()
+        job = {
+            "task_id": task_id,
+            "kind": kind,
+            "status": JOB_PENDING,
+            "stage": "queued",
+            "progress": STAGE_PROGRESS["queued"],
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "meta": meta or {},
+        }
+        self._jobs[task_id] = job
+        # 登记进度通道，客户端拿到 task_id 后即可订阅 /progress/{task_id}
+        progress_broker.open(task_id)
+        return self.get_status(task_id)
+
+    def submit(self, task_id: str, runner: Callable[[Callable[[str], None]], Awaitable[Dict[str, Any]]]) -> None:
+        """
+        在后台执行任务
+
+        Args:
+            task_id: 任务ID
+            runner: 接收阶段回调 on_stage 的协程函数，返回任务结果（响应内容）
+        """
+        self._tasks[task_id] = asyncio.create_task(self._run(task_id, runner))
+
+    async def _run(self, task_id: str, runner) -> None:
+        job = self._jobs[task_id]
+        job["status"] = JOB_RUNNING
+        job["started_at"] = time.time()
+        try:
+            result = await runner(lambda stage: self.update_stage(task_id, stage))
+            self._results.set(task_id, result, expire=self.result_ttl)
+            job["status"] = JOB_SUCCEEDED
+            self.update_stage(task_id, "done")
+            emit_progress(task_id, "completed")
+        except asyncio.CancelledError:
+            job["status"] = JOB_FAILED
+            job["error"] = "任务已取消"
+            emit_progress(task_id, "failed", error=job["error"])
+            raise
+        except Exception as e:
+            job["status"] = JOB_FAILED
+            job["error"] = getattr(e, "detail", None) or str(e)
+            logger.error(f"任务执行失败: {task_id}, 错误: {job['error']}")
+            emit_progress(task_id, "failed", error=job["error"])
+        finally:
+            job["finished_at"] = time.time()
+            self._tasks.pop(task_id, None)
+
+    def update_stage(self, task_id: str, stage: str, progress: Optional[float] = None) -> None:
+        """更新任务所处阶段和进度"""
+        job = self._jobs.get(task_id)
+        if not job:
+            return
+        job["stage"] = stage
+        job["progress"] = progress if progress is not None else STAGE_PROGRESS.get(stage, job["progress"])
+
+    def get_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，任务不存在时返回None"""
+        job = self._jobs.get(task_id)
+        if not job:
+            return None
+        return {key: value for key, value in job.items()}
+
+    def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取已完成任务的结果，结果不存在或已过期时返回None"""
+        return self._results.get(task_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取各状态的任务数量"""
+        stats = {JOB_PENDING: 0, JOB_RUNNING: 0, JOB_SUCCEEDED: 0, JOB_FAILED: 0}
+        for job in self._jobs.values():
+            stats[job["status"]] = stats.get(job["status"], 0) + 1
+        return stats
+
+    def _evict_expired(self) -> None:
+        """清理过期的已完成任务记录，并限制记录总数"""
+        now = time.time()
+        finished = [
+            job for job in self._jobs.values()
+            if job["finished_at"] is not None
+        ]
+        for job in finished:
+            if now - job["finished_at"] > self.result_ttl:
+                self._jobs.pop(job["task_id"], None)
+
+        overflow = len(self._jobs) - self.max_records
+        if overflow > 0:
+            finished = sorted(
+                (job for job in self._jobs.values() if job["finished_at"] is not None),
+                key=lambda job: job["finished_at"]
+            )
+            for job in finished[:overflow]:
+                self._jobs.pop(job["task_id"], None)
+
+    async def shutdown(self) -> None:
+        """取消仍在运行的任务并关闭结果缓存"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._results.close()
+
+
+# 全局任务管理器实例
+job_manager = JobManager()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+处理进度事件 - 按 processing_id 发布解析和图片分析的进度，供 SSE 接口订阅
+
+事件来源有两类：
+1. 主进程中的路由和图片处理器，直接调用 emit_progress 发布到 progress_broker；
+2. 解析进程池中的子进程（get_parsed_pdf_results），emit_progress 会把事件写入
+   跨进程队列，由主进程的转发线程投递回事件循环再发布。
+
+每个 processing_id 保留最近的一段事件历史，订阅者连接时先回放历史再接收实时事件，
+因此在任务提交后稍晚才连接的客户端也能看到完整的阶段变化。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from web_serves.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 结束事件，订阅者收到后关闭连接
+TERMINAL_EVENTS = ("completed", "failed")
+# 每个 processing_id 保留的事件数量（图片较多时只保留最近的事件）
+MAX_HISTORY_EVENTS = 500
+# 结束后的事件历史保留时间（秒），超过后清理
+FINISHED_RETENTION_SECONDS = 600
+# 没有结束事件的通道（如客户端断开的同步请求）的最长保留时间（秒）
+IDLE_RETENTION_SECONDS = 6 * 3600
+
+# 当前进程中事件的去向：主进程为 progress_broker.publish_threadsafe，解析子进程为跨进程队列
+_sink: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+def set_progress_sink(sink: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+    """设置当前进程的事件去向"""
+    global _sink
+    _sink = sink
+
+
+def emit_progress(processing_id: Optional[str], event: str, **data: Any) -> None:
+    """
+    发布一条进度事件，没有 processing_id 或未设置事件去向时直接忽略
+
+    Args:
+        processing_id: 处理ID（即 task_id）
+        event: 事件类型，如 stage / pages / image_analyzed / completed / failed
+        **data: 事件附带的数据，必须可以JSON序列化
+    """
+    if not processing_id or _sink is None:
+        return
+    try:
+        _sink({"processing_id": processing_id, "event": event, "timestamp": time.time(), **data})
+    except Exception as e:
+        # 进度上报失败不能影响解析本身
+        logger.warning(f"进度事件发布失败: {e}")
+
+
+class ProgressBroker:
+    """进度事件中心，在主进程的事件循环中运行"""
+
+    def __init__(self):
+        self._history: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._updated_at: Dict[str, float] = {}
+        self._finished_at: Dict[str, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """绑定事件循环，其他线程发布的事件会投递到该循环中"""
+        self._loop = loop
+
+    def open(self, processing_id: str) -> None:
+        """登记一个 processing_id，登记后即可订阅（即使还没有事件）"""
+        self._evict_expired()
+        self._history.setdefault(processing_id, deque(maxlen=MAX_HISTORY_EVENTS))
+        self._updated_at[processing_id] = time.time()
+
+    def exists(self, processing_id: str) -> bool:
+        """processing_id 是否已登记或产生过事件"""
+        return processing_id in self._history
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """发布事件（必须在事件循环线程中调用）"""
+        processing_id = event["processing_id"]
+        if processing_id in self._finished_at:
+            # 已结束的通道不再接收迟到的事件
+            return
+        self.open(processing_id)
+        self._history[processing_id].append(event)
+        if event["event"] in TERMINAL_EVENTS:
+            self._finished_at[processing_id] = time.time()
+        for queue in self._subscribers.get(processing_id, []):
+            queue.put_nowait(event)
+
+    def publish_threadsafe(self, event: Dict[str, Any]) -> None:
+        """从任意线程发布事件"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            if _running_loop() is loop:
+                self.publish(event)
+            else:
+                loop.call_soon_threadsafe(self.publish, event)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    async def subscribe(
+        self, processing_id: str, keepalive: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        订阅某个 processing_id 的事件：先回放历史，再持续产出实时事件，收到结束事件后停止
+
+        Args:
+            processing_id: 处理ID
+            keepalive: 超过该秒数没有新事件时产出一次None，便于调用方发送心跳
+
+        Yields:
+            事件字典，心跳时为None
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(processing_id, []).append(queue)
+        try:
+            for event in list(self._history.get(processing_id, [])):
+                yield event
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            subscribers = self._subscribers.get(processing_id, [])
+            if queue in subscribers:
+                subscribers.remove(queue)
+            if not subscribers:
+                self._subscribers.pop(processing_id, None)
+
+    def _evict_expired(self) -> None:
+        """清理已结束或长时间无更新的通道"""
+        now = time.time()
+        expired = [
+            processing_id for processing_id, finished_at in self._finished_at.items()
+            if now - finished_at > FINISHED_RETENTION_SECONDS
+        ]
+        expired += [
+            processing_id for processing_id, updated_at in self._updated_at.items()
+            if processing_id not in self._finished_at and now - updated_at > IDLE_RETENTION_SECONDS
+        ]
+        for processing_id in expired:
+            if processing_id in self._subscribers:
+                continue
+            self._history.pop(processing_id, None)
+            self._updated_at.pop(processing_id, None)
+            self._finished_at.pop(processing_id, None)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class ProgressQueueForwarder:
+    """把解析子进程写入跨进程队列的事件转发到 progress_broker"""
+
+    def __init__(self, queue, broker: ProgressBroker):
+        self._queue = queue
+        self._broker = broker
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._forward, name="progress-forwarder", daemon=True)
+            self._thread.start()
+
+    def _forward(self) -> None:
+        while True:
+            try:
+                event = self._queue.get()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            self._broker.publish_threadsafe(event)
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(None)
+            except Exception:
+                pass
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# 全局进度事件中心
+progress_broker = ProgressBroker()
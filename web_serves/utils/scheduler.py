@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+公平调度 - 在解析和图片分析前按优先级和租户做加权公平排队
+
+每个请求由 ScheduleKey（租户, 优先级）标识，租户取自 X-API-Key（只保留摘要）或 X-Client-Id 请求头，
+都没有时按客户端IP区分。同一 (租户, 优先级) 的请求组成一个流，调度器按开始时间公平排队（SFQ）
+为每个请求打上虚拟完成时间 = max(虚拟时间, 流的上一个完成时间) + 代价 / 权重，
+有空闲名额时优先放行完成时间最小的请求：
+
+1. 代价为页数（解析）或1（图片分析），单页的交互请求不会排在两百个文档的批量请求后面；
+2. 权重 = 优先级权重 × 租户权重，同优先级的多个租户按权重平分名额；
+3. 每个租户同时占用的名额不超过其并发上限，超出的请求跳过、让其他租户先走；
+4. 每个优先级可以保留一部分名额（reserved_ratio），其他优先级不能占用，
+   批量导入占满解析进程时交互请求仍有名额可用，延迟有上界。
+"""
+import asyncio
+import hashlib
+import math
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from fastapi import Request
+
+from web_serves.config import (
+    SCHEDULER_ENABLED,
+    SCHEDULER_ALLOW_PRIORITY_HEADER,
+    SCHEDULER_PRIORITY_CLASSES,
+    SCHEDULER_TENANTS,
+    SCHEDULER_TENANT_MAX_CONCURRENT_IMAGES,
+    SCHEDULER_IMAGE_ANALYSIS_SLOTS
+)
+
+# 优先级：交互请求（单个PDF、流式输出、图片上传）和批量请求（批量PDF、异步任务）
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+
+# 每个优先级保留最近多少次排队等待时间，用于统计 p50/p99
+WAIT_SAMPLES = 500
+
+
+@dataclass(frozen=True)
+class ScheduleKey:
+    """调度键：租户和优先级"""
+    tenant: str
+    priority: str
+
+
+DEFAULT_SCHEDULE_KEY = ScheduleKey("anonymous", PRIORITY_INTERACTIVE)
+
+
+def resolve_schedule_key(request: Request, default_priority: str) -> ScheduleKey:
+    """
+    从请求头解析调度键
+
+    Args:
+        request: FastAPI请求
+        default_priority: 接口的默认优先级，X-Priority 请求头可以在配置允许时覆盖
+
+    Returns:
+        调度键
+    """
+    api_key = request.headers.get("X-API-Key")
+    client_id = request.headers.get("X-Client-Id")
+    if api_key:
+        # 不在统计和日志中暴露原始密钥
+        tenant = "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    elif client_id:
+        tenant = "client:" + client_id.strip()[:64]
+    else:
+        tenant = "ip:" + (request.client.host if request.client else "unknown")
+
+    priority = default_priority
+    requested = request.headers.get("X-Priority")
+    if SCHEDULER_ALLOW_PRIORITY_HEADER and requested in SCHEDULER_PRIORITY_CLASSES:
+        priority = requested
+    return ScheduleKey(tenant, priority)
+
+
+@dataclass(eq=False)
+class ScheduleGrant:
+    """一次排队请求，放行后占用 slots 个名额直到 release"""
+    key: ScheduleKey
+    slots: int
+    start_tag: float
+    finish_tag: float
+    enqueued_at: float = field(default_factory=time.monotonic)
+    future: Optional[asyncio.Future] = None
+    granted: bool = False
+    released: bool = False
+
+
+class FairScheduler:
+    """加权公平调度器，只在事件循环线程中使用"""
+
+    def __init__(self, name: str, capacity: int, tenant_limit_field: str, default_tenant_limit: int):
+        """
+        初始化调度器
+
+        Args:
+            name: 调度器名称，用于统计
+            capacity: 总名额数
+            tenant_limit_field: scheduler.tenants 中单个租户并发上限的字段名
+            default_tenant_limit: 未单独配置的租户的并发上限
+        """
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.tenant_limit_field = tenant_limit_field
+        self.default_tenant_limit = max(1, default_tenant_limit)
+        self._queues: Dict[ScheduleKey, Deque[ScheduleGrant]] = {}
+        self._last_finish: Dict[ScheduleKey, float] = {}
+        self._virtual_time = 0.0
+        self._running_slots = 0
+        self._running_by_tenant: Counter = Counter()
+        self._running_by_priority: Counter = Counter()
+        self._waits: Dict[str, Deque[float]] = {}
+        self._granted = 0
+
+    def _tenant_limit(self, tenant: str) -> int:
+        if not SCHEDULER_ENABLED:
+            return self.capacity
+        limit = SCHEDULER_TENANTS.get(tenant, {}).get(self.tenant_limit_field, self.default_tenant_limit)
+        return min(self.capacity, max(1, int(limit)))
+
+    def _weight(self, key: ScheduleKey) -> float:
+        class_weight = SCHEDULER_PRIORITY_CLASSES.get(key.priority, {}).get("weight", 1)
+        tenant_weight = SCHEDULER_TENANTS.get(key.tenant, {}).get("weight", 1)
+        return max(1e-6, float(class_weight) * float(tenant_weight))
+
+    def _reserved(self, priority: str) -> int:
+        if not SCHEDULER_ENABLED:
+            return 0
+        ratio = SCHEDULER_PRIORITY_CLASSES.get(priority, {}).get("reserved_ratio", 0)
+        return min(self.capacity - 1, math.ceil(self.capacity * float(ratio)))
+
+    def _reserved_by_others(self, priority: str, running_only: bool = False) -> int:
+        """其他优先级保留且尚未使用的名额数"""
+        total = 0
+        for other in SCHEDULER_PRIORITY_CLASSES:
+            if other != priority:
+                reserved = self._reserved(other)
+                total += max(0, reserved - self._running_by_priority[other]) if running_only else reserved
+        return total
+
+    def _normalize(self, key: Optional[ScheduleKey]) -> ScheduleKey:
+        key = key or DEFAULT_SCHEDULE_KEY
+        if not SCHEDULER_ENABLED:
+            # 关闭时所有请求属于同一个流，退化为先来先服务
+            return ScheduleKey("", "")
+        if key.priority not in SCHEDULER_PRIORITY_CLASSES:
+            key = ScheduleKey(key.tenant, PRIORITY_BULK)
+        return key
+
+    def _blocked_by(self, grant: ScheduleGrant) -> Optional[str]:
+        """返回请求当前不能放行的原因：tenant / priority / capacity，可以放行时返回None"""
+        if self._running_slots == 0:
+            return None
+        if self._running_by_tenant[grant.key.tenant] + grant.slots > self._tenant_limit(grant.key.tenant):
+            return "tenant"
+        free_slots = self.capacity - self._running_slots
+        if grant.slots > free_slots:
+            return "capacity"
+        if grant.slots > free_slots - self._reserved_by_others(grant.key.priority, running_only=True):
+            return "priority"
+        return None
+
+    def _dispatch(self) -> None:
+        """按虚拟完成时间放行请求，直到没有可以放行的请求"""
+        while True:
+            heads = sorted((queue[0] for queue in self._queues.values() if queue), key=lambda g: g.finish_tag)
+            chosen = None
+            for grant in heads:
+                reason = self._blocked_by(grant)
+                if reason is None:
+                    chosen = grant
+                    break
+                if reason == "capacity":
+                    # 名额不够时为完成时间最小的请求保留，不让后面占用名额更少的请求插队
+                    break
+            if chosen is None:
+                break
+            self._queues[chosen.key].popleft()
+            self._virtual_time = max(self._virtual_time, chosen.start_tag)
+            self._grant(chosen)
+            chosen.future.set_result(None)
+        # 调度器完全空闲时虚拟时间追上所有流，之前的用量不再计入；否则只清理不再影响公平性的空闲流
+        if self._running_slots == 0 and not any(self._queues.values()):
+            self._virtual_time = max([self._virtual_time, *self._last_finish.values()])
+        for key in [k for k, q in self._queues.items() if not q and self._last_finish[k] <= self._virtual_time]:
+            del self._queues[key]
+            del self._last_finish[key]
+
+    def _grant(self, grant: ScheduleGrant) -> None:
+        grant.granted = True
+        self._running_slots += grant.slots
+        self._running_by_tenant[grant.key.tenant] += grant.slots
+        self._running_by_priority[grant.key.priority] += grant.slots
+        self._granted += 1
+        waits = self._waits.setdefault(grant.key.priority, deque(maxlen=WAIT_SAMPLES))
+        waits.append(time.monotonic() - grant.enqueued_at)
+
+    async def acquire(self, key: Optional[ScheduleKey], slots: int = 1, cost: float = 1.0) -> ScheduleGrant:
+        """
+        排队等待名额
+
+        Args:
+            key: 调度键，为None时使用默认键
+            slots: 需要的名额数，超过租户上限或可用名额时按上限计
+            cost: 请求的代价（如页数），决定虚拟完成时间
+
+        Returns:
+            放行凭证，用完后传给 release
+        """
+        key = self._normalize(key)
+        slots = max(1, min(slots, self._tenant_limit(key.tenant), self.capacity - self._reserved_by_others(key.priority)))
+        start_tag = max(self._virtual_time, self._last_finish.get(key, 0.0))
+        finish_tag = start_tag + max(cost, 1e-6) / self._weight(key)
+        self._last_finish[key] = finish_tag
+        grant = ScheduleGrant(key=key, slots=slots, start_tag=start_tag, finish_tag=finish_tag,
+                              future=asyncio.get_running_loop().create_future())
+        queue = self._queues.setdefault(key, deque())
+        queue.append(grant)
+        self._dispatch()
+        try:
+            await grant.future
+        except asyncio.CancelledError:
+            if grant.granted:
+                self.release(grant)
+            else:
+                queue.remove(grant)
+                self._dispatch()
+            raise
+        return grant
+
+    def release(self, grant: Optional[ScheduleGrant]) -> None:
+        """归还名额，可重复调用"""
+        if grant is None or grant.released or not grant.granted:
+            return
+        grant.released = True
+        self._running_slots -= grant.slots
+        self._running_by_tenant[grant.key.tenant] -= grant.slots
+        self._running_by_priority[grant.key.priority] -= grant.slots
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, key: Optional[ScheduleKey], slots: int = 1, cost: float = 1.0) -> AsyncIterator[ScheduleGrant]:
+        """排队获取名额，退出时归还"""
+        grant = await self.acquire(key, slots=slots, cost=cost)
+        try:
+            yield grant
+        finally:
+            self.release(grant)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取名额占用、各优先级和租户的排队数以及排队等待时间分位数"""
+        queued_by_priority: Counter = Counter()
+        queued_by_tenant: Counter = Counter()
+        for key, queue in self._queues.items():
+            if not queue:
+                continue
+            queued_by_priority[key.priority] += len(queue)
+            queued_by_tenant[key.tenant] += len(queue)
+
+        def percentile(samples: List[float], q: float) -> float:
+            return round(samples[min(len(samples) - 1, int(len(samples) * q))], 3)
+
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[priority] = {"p50": percentile(ordered, 0.5), "p99": percentile(ordered, 0.99)} if ordered else None
+        return {
+            "name": self.name,
+            "capacity": self.capacity,
+            "running_slots": self._running_slots,
+            "queued": sum(queued_by_priority.values()),
+            "queued_by_priority": dict(queued_by_priority),
+            "running_by_priority": {k: v for k, v in self._running_by_priority.items() if v},
+            "tenants": {
+                tenant: {"running": self._running_by_tenant[tenant], "queued": queued_by_tenant[tenant]}
+                for tenant in set(queued_by_tenant) | {t for t, v in self._running_by_tenant.items() if v}
+            },
+            "wait_seconds": waits,
+            "granted": self._granted,
+        }
+
+
+# 全局图片分析调度器，所有请求的视觉模型调用共享 image_analysis_slots 个名额
+image_scheduler = FairScheduler(
+    "image_analysis",
+    SCHEDULER_IMAGE_ANALYSIS_SLOTS,
+    "max_concurrent_images",
+    SCHEDULER_TENANT_MAX_CONCURRENT_IMAGES
+)